@@ -1,123 +1,61 @@
 import os
 import time
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-
-# Control table address
-ADDR_MX_TORQUE_ENABLE = 24  # Control table address is different for Dynamixel model
-ADDR_MX_GOAL_POSITION = 30
-ADDR_MX_PRESENT_POSITION = 36
-ADDR_MX_TORQUE_MAX = 14
-
-# Protocol version
-PROTOCOL_VERSION = 1.0  # See which protocol version is used in the Dynamixel
+from mx64 import make_bus
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default setting
 DXL_RUNNING_IDS = [6] #, 4, 6]  # Dynamixel IDs that will run
 DXL_IDS = [1, 2, 3, 4, 5, 6]  # List of all Dynamixel IDs
-BAUDRATE = 1000000  # Dynamixel default baudrate : 57600
+BAUDRATE = None     # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'  # Check which port is being used on your controller
 # ex) Windows: "COM1"   Linux: "/dev/ttyUSB0" Mac: "/dev/tty.usbserial-*"
-TORQUE_ENABLE = 1  # Value for enabling the torque
-TORQUE_DISABLE = 0  # Value for disabling the torque
 DXL_MINIMUM_POSITION_VALUE = 2048  # Start position
 DXL_MAXIMUM_POSITION_VALUE = 2557  # End position
 DXL_MOVING_STATUS_THRESHOLD = 20  # Dynamixel moving status threshold
 STEP_SIZE = 10  # Position increment step size (positive for incrementing towards max position)
 TORQUE_MAX_LEVEL = 512  # Maximum torque level (adjust as needed, 0-1023 for MX series)
+TORQUE_PROFILE = {dxl_id: TORQUE_MAX_LEVEL for dxl_id in DXL_IDS}  # Per-motor torque limits, can change between steps
+
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
-
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Dynamixel#%d has been successfully connected" % dxl_id)
-
-def set_torque_level(dxl_id, torque_level):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_MAX, torque_level)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Torque level set to %d for Dynamixel#%d" % (torque_level, dxl_id))
-
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per arrival, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
 def main():
-    open_port()
-    set_baudrate()
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
     
-    # Enable torque and set max torque level for all Dynamixels
-    for dxl_id in DXL_IDS:
-        enable_torque(dxl_id)
-        set_torque_level(dxl_id, TORQUE_MAX_LEVEL)
+        # Enable torque for all Dynamixels and limit it with the RAM Torque Limit (one SyncWrite)
+        for dxl_id in DXL_IDS:
+            bus.enable_torque(dxl_id)
+        bus.set_torque_limits(TORQUE_PROFILE)
     
-    # Read the present position of all Dynamixels to hold them in place
-    current_positions = {}
-    for dxl_id in DXL_IDS:
-        current_positions[dxl_id] = read_present_position(dxl_id)
+        # Read the present position of all Dynamixels to hold them in place
+        current_positions = {}
+        for dxl_id in DXL_IDS:
+            current_positions[dxl_id] = bus.read_present_position(dxl_id)
     
-    # Lock all Dynamixels except the ones running
-    for dxl_id in DXL_IDS:
-        if dxl_id not in DXL_RUNNING_IDS:
-            set_goal_position(dxl_id, current_positions[dxl_id])
+        # Lock all Dynamixels except the ones running
+        bus.set_goal_positions({dxl_id: current_positions[dxl_id] for dxl_id in DXL_IDS if dxl_id not in DXL_RUNNING_IDS})
     
-    for running_id in DXL_RUNNING_IDS:
-        goal_position = DXL_MINIMUM_POSITION_VALUE
-        while goal_position <= DXL_MAXIMUM_POSITION_VALUE:
-            set_goal_position(running_id, goal_position)
-
-            while True:
-                present_position = read_present_position(running_id)
-                print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (running_id, goal_position, present_position))
-
-                if abs(goal_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-                    break
+        for running_id in DXL_RUNNING_IDS:
+            goal_position = DXL_MINIMUM_POSITION_VALUE
+            while goal_position <= DXL_MAXIMUM_POSITION_VALUE:
+                bus.set_goal_position(running_id, goal_position)
 
-                time.sleep(0.1)
+                present_position = bus.wait_arrived(running_id, goal_position, DXL_MOVING_STATUS_THRESHOLD)
+                display.update(running_id, 'GoalPos', goal_position, present_position)
             
-            goal_position += STEP_SIZE  # Increment position
-            time.sleep(1)  # Wait for 1 second before moving to the next step
+                goal_position += STEP_SIZE  # Increment position
+                time.sleep(1)  # Wait for 1 second before moving to the next step
 
-    close_port()
+        bus.close()
 
 if __name__ == "__main__":
     main()
@@ -3,32 +3,25 @@
 
 import time
 import matplotlib.pyplot as plt
-from dynamixel_sdk import *                    # Uses Dynamixel SDK library
-
-# Control table address
-ADDR_MX_TORQUE_ENABLE      = 24               # Control table address is different in Dynamixel model
-ADDR_MX_GOAL_POSITION      = 30
-ADDR_MX_PRESENT_POSITION   = 36
-ADDR_MX_PRESENT_LOAD       = 40               # Address for present load
-
-# Data Byte Length
-LEN_MX_GOAL_POSITION       = 4
-LEN_MX_PRESENT_POSITION    = 4
-LEN_MX_PRESENT_LOAD        = 2                # Length for present load data
-
-# Protocol version
-PROTOCOL_VERSION            = 1.0               # See which protocol version is used in the Dynamixel
+from mx64 import make_bus
+from mx64.bus import ARRIVAL_STALL_TIME, ARRIVAL_TIMEOUT
+from mx64.trajectory import compile_trajectory
+from mx64.control_loop import ControlLoop
 
 # Default setting
 DXL_IDs                     = [1, 2, 3, 4, 5, 6]
-BAUDRATE                    = 1000000           # Dynamixel default baudrate : 57600
+BAUDRATE                    = None              # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME                  = '/dev/ttyUSB0'    # Check which port is being used on your controller
 
-TORQUE_ENABLE               = 1                 # Value for enabling the torque
-TORQUE_DISABLE              = 0                 # Value for disabling the torque
 DXL_MINIMUM_POSITION_VALUE  = 0                 # Dynamixel will rotate between this value
 DXL_MAXIMUM_POSITION_VALUE  = 1000              # and this value (note that the Dynamixel would not move when the position value is out of movable range. Check e-manual about the range of the Dynamixel you use.)
 DXL_MOVING_STATUS_THRESHOLD = 20                # Dynamixel moving status threshold
+SAMPLE_RATE                 = None              # Position/load samples per second while the motors move (None: as fast as
+                                                # the measured BulkRead round trip allows, see measure_sample_rate())
+SAMPLE_HEADROOM             = 1.5               # Sample period = this many times the measured round trip
+SAMPLE_RATE_MAX             = 1000              # Upper bound for the measured rate
+CONTROL_CPU                 = None              # CPU to pin the sampling loop to (None: any)
+REALTIME_PRIORITY           = None              # SCHED_FIFO priority 1-99 (None: normal; needs root or CAP_SYS_NICE)
 
 # Goal positions for each motor
 dxl_goal_positions = [
@@ -40,101 +33,86 @@ dxl_goal_positions = [
     [1706, 2048, 2350, 1700, 3072, 2560, 3072, 2560, 3072]
 ]
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
-
-# Initialize GroupSyncWrite instance
-groupSyncWrite = GroupSyncWrite(portHandler, packetHandler, ADDR_MX_GOAL_POSITION, LEN_MX_GOAL_POSITION)
+# The whole plan as prebuilt SyncWrite frames, one per step (columns of the table above)
+trajectory = compile_trajectory(DXL_IDs, list(zip(*dxl_goal_positions)))
 
-# Open port
-if not portHandler.openPort():
-    print("Failed to open the port")
-    quit()
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDs)
 
-# Set port baudrate
-if not portHandler.setBaudRate(BAUDRATE):
-    print("Failed to change the baudrate")
+# Open port and set port baudrate
+if not bus.open():
     quit()
 
 # Enable Dynamixel Torque for each motor
-for DXL_ID in DXL_IDs:
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Dynamixel#%d has been successfully connected" % DXL_ID)
+bus.enable_torque_all()
 
 # Initialize data storage
 positions = {DXL_ID: [] for DXL_ID in DXL_IDs}
 loads = {DXL_ID: [] for DXL_ID in DXL_IDs}
+settled = set()         # Motors in position (or stalled) in the current step
+stopped_since = {}      # {DXL_ID: time its Moving flag was first seen 0 outside the threshold}
+
+def measure_sample_rate():
+    # Time a few reads of the sampling block and run the loop at the rate they allow
+    durations = []
+    for _ in range(5):
+        start = time.monotonic()
+        bus.read_arrival(DXL_IDs)
+        durations.append(time.monotonic() - start)
+    round_trip = sorted(durations)[len(durations) // 2]
+    rate = min(SAMPLE_RATE_MAX, 1.0 / (round_trip * SAMPLE_HEADROOM))
+    print("Sample round trip %.2f ms, sampling at %.0f Hz" % (round_trip * 1000.0, rate))
+    return rate
+
+def sample(tick_index):
+    # One BulkRead of 36-46 returns position, speed, load and the Moving flag of every motor,
+    # load already signed (CCW positive, CW negative) in bus.present_states. A motor is done once
+    # in position, or once stopped outside the threshold for ARRIVAL_STALL_TIME (blocked, torque
+    # limited) as in the bus arrival waits. Returns True when all are done.
+    now = time.monotonic()
+    arrival = bus.read_arrival(DXL_IDs)
+    for i, DXL_ID in enumerate(DXL_IDs):
+        if DXL_ID not in arrival:
+            continue
+        dxl_present_position, dxl_moving = arrival[DXL_ID]
+        positions[DXL_ID].append(dxl_present_position)
+        loads[DXL_ID].append(bus.present_states[DXL_ID][2])
+
+        if DXL_ID in settled:
+            continue
+        distance = abs(dxl_goal_positions[i][index] - dxl_present_position)
+        if distance <= DXL_MOVING_STATUS_THRESHOLD:
+            settled.add(DXL_ID)
+        elif dxl_moving:
+            stopped_since.pop(DXL_ID, None)
+        elif now - stopped_since.setdefault(DXL_ID, now) >= ARRIVAL_STALL_TIME:
+            print("[ID:%03d] Stopped at %d, %d from goal %d" % (DXL_ID, dxl_present_position, distance, dxl_goal_positions[i][index]))
+            settled.add(DXL_ID)
+    return len(settled) == len(DXL_IDs)
+
+sample_rate = SAMPLE_RATE if SAMPLE_RATE is not None else measure_sample_rate()
+loop = ControlLoop(sample_rate, CONTROL_CPU, REALTIME_PRIORITY)
 
 # Main loop for goal position commands
-for index in range(len(dxl_goal_positions[0])):
-    param_goal_positions = []
-    for i, DXL_ID in enumerate(DXL_IDs):
-        param_goal_positions.append([
-            DXL_LOBYTE(DXL_LOWORD(dxl_goal_positions[i][index])),
-            DXL_HIBYTE(DXL_LOWORD(dxl_goal_positions[i][index])),
-            DXL_LOBYTE(DXL_HIWORD(dxl_goal_positions[i][index])),
-            DXL_HIBYTE(DXL_HIWORD(dxl_goal_positions[i][index]))
-        ])
-        # Add goal position to syncwrite parameter storage
-        dxl_addparam_result = groupSyncWrite.addParam(DXL_ID, param_goal_positions[-1])
-        if not dxl_addparam_result:
-            print("[ID:%03d] groupSyncWrite addparam failed" % DXL_ID)
-            quit()
-
-    # Syncwrite goal position
-    dxl_comm_result = groupSyncWrite.txPacket()
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-
-    # Clear syncwrite parameter storage
-    groupSyncWrite.clearParam()
-
-    time.sleep(0.1)  # Delay for the motors to start moving
-
-    # Read present position and load for each motor
-    while True:
-        moving = False
-        for DXL_ID in DXL_IDs:
-            dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read4ByteTxRx(portHandler, DXL_ID, ADDR_MX_PRESENT_POSITION)
-            dxl_present_load, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, DXL_ID, ADDR_MX_PRESENT_LOAD)
-            if dxl_comm_result != COMM_SUCCESS:
-                print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-            elif dxl_error != 0:
-                print("%s" % packetHandler.getRxPacketError(dxl_error))
-
-            # Convert load value to signed value (11 bits)
-            if dxl_present_load > 1023:
-                dxl_present_load -= 1024
-
-            positions[DXL_ID].append(dxl_present_position)
-            loads[DXL_ID].append(dxl_present_load)
-
-            if abs(dxl_goal_positions[DXL_IDs.index(DXL_ID)][index] - dxl_present_position) > DXL_MOVING_STATUS_THRESHOLD:
-                moving = True
-
-        if not moving:
-            break
+for index in range(len(trajectory)):
+    # Syncwrite goal position (one prebuilt packet for all motors)
+    bus.send_step(trajectory, index)
+
+    # Read present position and load for each motor at sample_rate until all are done, for at most ARRIVAL_TIMEOUT
+    settled.clear()
+    stopped_since.clear()
+    loop.run(sample, int(ARRIVAL_TIMEOUT * sample_rate))
+    if len(settled) < len(DXL_IDs):
+        print("Timed out waiting for Dynamixel(s) %s" % [DXL_ID for DXL_ID in DXL_IDs if DXL_ID not in settled])
+    print("Step %d: %s" % (index, loop.report()))
 
     time.sleep(0.1)
 
 # Disable Dynamixel Torque for each motor
-for DXL_ID in DXL_IDs:
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, DXL_ID, ADDR_MX_TORQUE_ENABLE, TORQUE_DISABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
+bus.disable_torque_all()
 
 # Close port
-portHandler.closePort()
+bus.close()
 
 # Plot position vs. load for each motor
 plt.figure(figsize=(12, 8))
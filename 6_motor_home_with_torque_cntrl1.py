@@ -1,20 +1,9 @@
-import time
-from dynamixel_sdk import *
-
-# Control table addresses for MX series Dynamixel
-ADDR_MX_TORQUE_ENABLE = 24           # Address for enabling/disabling torque
-ADDR_MX_TORQUE_LIMIT = 34            # Address for torque limit
-ADDR_MX_GOAL_POSITION = 30           # Address for goal position
-ADDR_MX_PRESENT_POSITION = 36        # Address for present position
-
-# Protocol version
-PROTOCOL_VERSION = 1.0               # Protocol version used in the Dynamixel
+from mx64 import make_bus
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default settings
-BAUDRATE = 1000000                   # Dynamixel default baudrate
+BAUDRATE = None                      # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'          # Serial port name, check your device name
-TORQUE_ENABLE = 1                    # Value for enabling torque
-TORQUE_DISABLE = 0                   # Value for disabling torque
 TORQUE_LIMIT = 500                   # Torque limit value (0 to 1023 for MX series)
 
 # Goal positions
@@ -24,102 +13,43 @@ GOAL_POSITION_1536 = 1710           # Goal position for motors 2, 4, 6
 # Dynamixel IDs
 DXL_IDS = [1, 2, 3, 4, 5, 6]         # Dynamixel IDs: 1 to 6
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
-
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to enable torque for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in enabling torque for ID {dxl_id}: {dxl_error}")
-    else:
-        print(f"Torque enabled for Dynamixel ID: {dxl_id}")
-
-def set_torque_limit(dxl_id, torque_limit):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_LIMIT, torque_limit)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to set torque limit for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in setting torque limit for ID {dxl_id}: {dxl_error}")
-    else:
-        print(f"Set torque limit to {torque_limit} for Dynamixel ID: {dxl_id}")
-
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to set goal position for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in setting goal position for ID {dxl_id}: {dxl_error}")
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
 
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to read present position for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in reading present position for ID {dxl_id}: {dxl_error}")
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per motor, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
 def main():
-    open_port()
-    set_baudrate()
-
-    # Enable torque and set torque limits for all motors
-    for dxl_id in DXL_IDS:
-        enable_torque(dxl_id)
-        set_torque_limit(dxl_id, TORQUE_LIMIT)
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
 
-    # Set goal positions for motors 1, 3, 5 to 2560 and motors 2, 4, 6 to 1536
-    set_goal_position(1, GOAL_POSITION_2560)
-    set_goal_position(3, GOAL_POSITION_2560)
-    set_goal_position(5, GOAL_POSITION_2560)
-    set_goal_position(2, GOAL_POSITION_1536)
-    set_goal_position(4, GOAL_POSITION_1536)
-    set_goal_position(6, GOAL_POSITION_1536)
-
-    while True:
-        # Read and print present positions
-        all_in_position = True
+        # Enable torque for all motors and set their torque limits with one SyncWrite
         for dxl_id in DXL_IDS:
-            present_position = read_present_position(dxl_id)
-            goal_position = GOAL_POSITION_2560 if dxl_id in [1, 3, 5] else GOAL_POSITION_1536
-            print(f"[ID:{dxl_id:03d}] GoalPos:{goal_position:03d}  PresPos:{present_position:03d}")
-            
-            # Check if motor is within tolerance to goal position
-            if abs(goal_position - present_position) > 20:
-                all_in_position = False
-
-        # Check if all motors have reached their goal positions within a tolerance
-        if all_in_position:
-            break
-
-        time.sleep(0.1)
+            bus.enable_torque(dxl_id)
+        bus.set_torque_limits({dxl_id: TORQUE_LIMIT for dxl_id in DXL_IDS})
+
+        # Set goal positions for motors 1, 3, 5 to 2560 and motors 2, 4, 6 to 1536
+        goal_positions = {
+            1: GOAL_POSITION_2560, 3: GOAL_POSITION_2560, 5: GOAL_POSITION_2560,
+            2: GOAL_POSITION_1536, 4: GOAL_POSITION_1536, 6: GOAL_POSITION_1536,
+        }
+        bus.set_goal_positions(goal_positions)
+
+        # Wait until all motors are within 20 of their goal positions, then show where they are
+        present_positions = bus.wait_arrived_all(goal_positions, 20)
+        for dxl_id in DXL_IDS:
+            display.update(dxl_id, 'GoalPos', goal_positions[dxl_id], present_positions.get(dxl_id))
 
-    # Disable torque for all motors after reaching goal positions
-    for dxl_id in DXL_IDS:
-        disable_torque(dxl_id)
+        # Disable torque for all motors after reaching goal positions
+        for dxl_id in DXL_IDS:
+            bus.disable_torque(dxl_id)
 
-    close_port()
+        bus.close()
 
 if __name__ == "__main__":
     main()
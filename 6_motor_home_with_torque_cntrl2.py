@@ -1,20 +1,10 @@
 import time
-from dynamixel_sdk import *
-
-# Control table addresses for MX series Dynamixel
-ADDR_MX_TORQUE_ENABLE = 24           # Address for enabling/disabling torque
-ADDR_MX_TORQUE_LIMIT = 34            # Address for torque limit
-ADDR_MX_GOAL_POSITION = 30           # Address for goal position
-ADDR_MX_PRESENT_POSITION = 36        # Address for present position
-
-# Protocol version
-PROTOCOL_VERSION = 1.0               # Protocol version used in the Dynamixel
+from mx64 import make_bus
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default settings
-BAUDRATE = 1000000                   # Dynamixel default baudrate
+BAUDRATE = None                      # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'          # Serial port name, check your device name
-TORQUE_ENABLE = 1                    # Value for enabling torque
-TORQUE_DISABLE = 0                   # Value for disabling torque
 TORQUE_LIMIT = 500                   # Torque limit value (0 to 1023 for MX series)
 
 # Goal positions (2048 for all motors)
@@ -23,103 +13,48 @@ GOAL_POSITION = 2048
 # Dynamixel IDs
 DXL_IDS = [1, 2, 3, 4, 5, 6]         # Dynamixel IDs: 1 to 6
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
-
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to enable torque for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in enabling torque for ID {dxl_id}: {dxl_error}")
-    else:
-        print(f"Torque enabled for Dynamixel ID: {dxl_id}")
-
-def set_torque_limit(dxl_id, torque_limit):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_LIMIT, torque_limit)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to set torque limit for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in setting torque limit for ID {dxl_id}: {dxl_error}")
-    else:
-        print(f"Set torque limit to {torque_limit} for Dynamixel ID: {dxl_id}")
-
-def disable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_DISABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to disable torque for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in disabling torque for ID {dxl_id}: {dxl_error}")
-    else:
-        print(f"Torque disabled for Dynamixel ID: {dxl_id}")
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
 
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to set goal position for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in setting goal position for ID {dxl_id}: {dxl_error}")
-
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print(f"Failed to read present position for ID {dxl_id}. Error code: {dxl_comm_result}")
-    elif dxl_error != 0:
-        print(f"Error in reading present position for ID {dxl_id}: {dxl_error}")
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per poll, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
 def main():
-    open_port()
-    set_baudrate()
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
 
-    # Enable torque and set torque limits for all motors
-    for dxl_id in DXL_IDS:
-        enable_torque(dxl_id)
-        set_torque_limit(dxl_id, TORQUE_LIMIT)
+        # Enable torque for all motors and set their torque limits with one SyncWrite
+        for dxl_id in DXL_IDS:
+            bus.enable_torque(dxl_id)
+        bus.set_torque_limits({dxl_id: TORQUE_LIMIT for dxl_id in DXL_IDS})
 
-    try:
-        while True:
-            # Set goal positions continuously to 2048 for all motors
-            for dxl_id in DXL_IDS:
-                set_goal_position(dxl_id, GOAL_POSITION)
+        try:
+            while True:
+                # Set goal positions continuously to 2048 for all motors
+                bus.set_goal_positions({dxl_id: GOAL_POSITION for dxl_id in DXL_IDS})
 
-            # Read and print present positions
-            for dxl_id in DXL_IDS:
-                present_position = read_present_position(dxl_id)
-                print(f"[ID:{dxl_id:03d}] GoalPos:{GOAL_POSITION:03d}  PresPos:{present_position:03d}")
+                # Read present positions of all motors with one BulkRead and show them
+                snapshot = bus.read_snapshot(DXL_IDS)
+                for dxl_id, present_position in zip(DXL_IDS, snapshot['position'].tolist()):
+                    display.update(dxl_id, 'GoalPos', GOAL_POSITION, present_position)
 
-            # Pause briefly before the next iteration
-            time.sleep(0.1)
+                # Pause briefly before the next iteration
+                time.sleep(0.1)
 
-    except KeyboardInterrupt:
-        print("Interrupted by user")
+        except KeyboardInterrupt:
+            display.message("Interrupted by user")
 
-    finally:
-        # Disable torque for all motors
-        for dxl_id in DXL_IDS:
-            disable_torque(dxl_id)
+        finally:
+            # Disable torque for all motors
+            for dxl_id in DXL_IDS:
+                bus.disable_torque(dxl_id)
 
-        close_port()
+            bus.close()
 
 if __name__ == "__main__":
     main()
@@ -1,23 +1,14 @@
 import os
 import time
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-
-# Control table address
-ADDR_MX_TORQUE_ENABLE = 24  # Control table address is different for Dynamixel model
-ADDR_MX_GOAL_POSITION = 30
-ADDR_MX_PRESENT_POSITION = 36
-ADDR_MX_TORQUE_MAX = 14
-
-# Protocol version
-PROTOCOL_VERSION = 1.0  # See which protocol version is used in the Dynamixel
+from mx64 import make_bus
+from mx64.trajectory import compile_sweep
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default setting
 DXL_MAIN_ID = 4  # Dynamixel ID that will increment in steps
 DXL_IDS = [1, 2, 3, 4, 5, 6]  # List of all Dynamixel IDs
-BAUDRATE = 1000000  # Dynamixel default baudrate
+BAUDRATE = None     # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'  # Check which port is being used on your controller
-TORQUE_ENABLE = 1  # Value for enabling the torque
-TORQUE_DISABLE = 0  # Value for disabling the torque
 DXL_MINIMUM_POSITION_VALUE = 2048  # Start position
 DXL_ODD_MAX_POSITION_VALUE = 1540  # End position for odd motors
 DXL_EVEN_MAX_POSITION_VALUE = 2557  # End position for even motors
@@ -25,141 +16,72 @@ DXL_MOVING_STATUS_THRESHOLD = 20  # Dynamixel moving status threshold
 STEP_SIZE_MAIN = 50  # Main motor increment step size
 STEP_SIZE = 50  # Position increment step size for other motors
 TORQUE_MAX_LEVEL = 150  # Maximum torque level (adjust as needed, 0-1023 for MX series)
+TORQUE_PROFILE = {dxl_id: TORQUE_MAX_LEVEL for dxl_id in DXL_IDS}  # Per-motor torque limits, can change between steps
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
-
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Dynamixel#%d has been successfully connected" % dxl_id)
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
 
-def set_torque_level(dxl_id, torque_level):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_MAX, torque_level)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Torque level set to %d for Dynamixel#%d" % (torque_level, dxl_id))
-
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per arrival, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
 def move_motor(dxl_id, start_position, end_position, step_size):
-    goal_position = start_position
-
-    while (goal_position >= end_position if step_size < 0 else goal_position <= end_position):
-        set_goal_position(dxl_id, goal_position)
-
-        while True:
-            present_position = read_present_position(dxl_id)
-            print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (dxl_id, goal_position, present_position))
+    # Goal sequence prebuilt as SyncWrite frames, compiled once per sweep (mx64/trajectory.py)
+    sweep = compile_sweep(dxl_id, start_position, end_position, step_size)
 
-            if abs(goal_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-                break
+    for step, goal_position in enumerate(sweep.goals[:, 0].tolist()):
+        bus.send_step(sweep, step)
 
-            time.sleep(0.1)
-
-        goal_position += step_size
+        present_position = bus.wait_arrived(dxl_id, goal_position, DXL_MOVING_STATUS_THRESHOLD)
+        display.update(dxl_id, 'GoalPos', goal_position, present_position)
 
     # Reset to home position
-    set_goal_position(dxl_id, start_position)
-    while True:
-        present_position = read_present_position(dxl_id)
-        print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (dxl_id, start_position, present_position))
-
-        if abs(start_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-            break
-
-        time.sleep(0.1)
+    bus.set_goal_position(dxl_id, start_position)
+    present_position = bus.wait_arrived(dxl_id, start_position, DXL_MOVING_STATUS_THRESHOLD)
+    display.update(dxl_id, 'ResetPos', start_position, present_position)
 
 def main():
-    open_port()
-    set_baudrate()
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
     
-    # Enable torque and set max torque level for all Dynamixels
-    for dxl_id in DXL_IDS:
-        enable_torque(dxl_id)
-        set_torque_level(dxl_id, TORQUE_MAX_LEVEL)
+        # Enable torque for all Dynamixels and limit it with the RAM Torque Limit (one SyncWrite)
+        for dxl_id in DXL_IDS:
+            bus.enable_torque(dxl_id)
+        bus.set_torque_limits(TORQUE_PROFILE)
     
-    # Read the present position of all Dynamixels to hold them in place
-    current_positions = {}
-    for dxl_id in DXL_IDS:
-        current_positions[dxl_id] = read_present_position(dxl_id)
+        # Read the present position of all Dynamixels to hold them in place
+        current_positions = {}
+        for dxl_id in DXL_IDS:
+            current_positions[dxl_id] = bus.read_present_position(dxl_id)
     
-    goal_position_main = DXL_MINIMUM_POSITION_VALUE
-
-    while True:
-        # Increment the main motor (motor 2) in steps of 50
-        for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE + 1, STEP_SIZE_MAIN):
-            set_goal_position(DXL_MAIN_ID, goal_position_main)
-
-            while True:
-                present_position_main = read_present_position(DXL_MAIN_ID)
-                print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, goal_position_main, present_position_main))
-
-                if abs(goal_position_main - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                    break
+        goal_position_main = DXL_MINIMUM_POSITION_VALUE
 
-                time.sleep(0.1)
-
-            # For each step of motor 2, move all other motors
-            for dxl_id in [4, 6]:
-                move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE)
-            for dxl_id in [1, 3, 5]:
-                move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE, -STEP_SIZE)
-        
-        # Reset motor 2 to home position
-        set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
         while True:
-            present_position_main = read_present_position(DXL_MAIN_ID)
-            print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, present_position_main))
-
-            if abs(DXL_MINIMUM_POSITION_VALUE - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                break
-
-            time.sleep(0.1)
+            # Increment the main motor (motor 2) in steps of 50
+            for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE + 1, STEP_SIZE_MAIN):
+                bus.set_goal_position(DXL_MAIN_ID, goal_position_main)
+
+                present_position_main = bus.wait_arrived(DXL_MAIN_ID, goal_position_main, DXL_MOVING_STATUS_THRESHOLD)
+                display.update(DXL_MAIN_ID, 'GoalPos', goal_position_main, present_position_main)
+
+                # For each step of motor 2, move all other motors
+                for dxl_id in [4, 6]:
+                    move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE)
+                for dxl_id in [1, 3, 5]:
+                    move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE, -STEP_SIZE)
+        
+            # Reset motor 2 to home position
+            bus.set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
+            present_position_main = bus.wait_arrived(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, DXL_MOVING_STATUS_THRESHOLD)
+            display.update(DXL_MAIN_ID, 'ResetPos', DXL_MINIMUM_POSITION_VALUE, present_position_main)
 
-        time.sleep(1)  # Wait for 1 second before the next loop iteration
+            time.sleep(1)  # Wait for 1 second before the next loop iteration
 
-    close_port()
+        bus.close()
 
 if __name__ == "__main__":
     main()
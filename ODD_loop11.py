@@ -1,24 +1,15 @@
 import os
 import time
-import csv  # Add CSV module
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-
-# Control table address
-ADDR_MX_TORQUE_ENABLE = 24  # Control table address is different for Dynamixel model
-ADDR_MX_GOAL_POSITION = 30
-ADDR_MX_PRESENT_POSITION = 36
-ADDR_MX_TORQUE_MAX = 14
-
-# Protocol version
-PROTOCOL_VERSION = 1.0  # See which protocol version is used in the Dynamixel
+from mx64 import make_bus
+from mx64.trajectory import compile_sweep
+from mx64.session_log import SessionLog
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default setting
 DXL_MAIN_ID = 1  # Dynamixel ID that will decrement in small steps
 DXL_IDS = [1, 2, 3, 4, 5, 6]  # List of all Dynamixel IDs
-BAUDRATE = 1000000  # Dynamixel default baudrate
+BAUDRATE = None     # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'  # Check which port is being used on your controller
-TORQUE_ENABLE = 1  # Value for enabling the torque
-TORQUE_DISABLE = 0  # Value for disabling the torque
 DXL_MINIMUM_POSITION_VALUE = 2048  # Start position
 DXL_ODD_MAX_POSITION_VALUE = 1540  # End position for odd motors
 DXL_EVEN_MAX_POSITION_VALUE = 2557  # End position for even motors
@@ -26,161 +17,93 @@ DXL_MOVING_STATUS_THRESHOLD = 20  # Dynamixel moving status threshold
 STEP_SIZE_MAIN = -5  # Main motor decrement step size
 STEP_SIZE = 5  # Position increment step size for other motors
 TORQUE_MAX_LEVEL = 300  # Maximum torque level (adjust as needed, 0-1023 for MX series)
+TORQUE_PROFILE = {dxl_id: TORQUE_MAX_LEVEL for dxl_id in DXL_IDS}  # Per-motor torque limits, can change between steps
 
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
 
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per arrival, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
-# CSV file name
+# CSV file name; each run logs to a new motor_positions_<start time>.csv
 CSV_FILE = 'motor_positions.csv'
-
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Dynamixel#%d has been successfully connected" % dxl_id)
-
-def set_torque_level(dxl_id, torque_level):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_MAX, torque_level)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Torque level set to %d for Dynamixel#%d" % (torque_level, dxl_id))
-
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
+CHECKPOINT_ITERATIONS = 10  # fsync the log every this many iterations (and when the run ends)
 
 def move_motor(dxl_id, start_position, end_position, step_size):
-    goal_position = start_position
-
-    while (goal_position >= end_position if step_size < 0 else goal_position <= end_position):
-        set_goal_position(dxl_id, goal_position)
-
-        while True:
-            present_position = read_present_position(dxl_id)
-            print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (dxl_id, goal_position, present_position))
+    # Goal sequence prebuilt as SyncWrite frames, compiled once per sweep (mx64/trajectory.py)
+    sweep = compile_sweep(dxl_id, start_position, end_position, step_size)
 
-            if abs(goal_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-                break
+    for step, goal_position in enumerate(sweep.goals[:, 0].tolist()):
+        bus.send_step(sweep, step)
 
-            time.sleep(0.1)
-
-        goal_position += step_size
+        present_position = bus.wait_arrived(dxl_id, goal_position, DXL_MOVING_STATUS_THRESHOLD)
+        display.update(dxl_id, 'GoalPos', goal_position, present_position)
 
     # Reset to home position
-    set_goal_position(dxl_id, start_position)
-    while True:
-        present_position = read_present_position(dxl_id)
-        print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (dxl_id, start_position, present_position))
-
-        if abs(start_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-            break
-
-        time.sleep(0.1)
+    bus.set_goal_position(dxl_id, start_position)
+    present_position = bus.wait_arrived(dxl_id, start_position, DXL_MOVING_STATUS_THRESHOLD)
+    display.update(dxl_id, 'ResetPos', start_position, present_position)
 
 def initialize_csv():
-    with open(CSV_FILE, 'w', newline='') as csvfile:
-        fieldnames = ['Iteration', 'Motor1', 'Motor2', 'Motor3', 'Motor4', 'Motor5', 'Motor6']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
+    # Open this run's log once, with its header; rows are buffered (mx64/session_log.py)
+    return SessionLog(CSV_FILE, ['Iteration', 'Motor1', 'Motor2', 'Motor3', 'Motor4', 'Motor5', 'Motor6'],
+                      message=display.message)
 
-def write_to_csv(iteration, positions):
-    with open(CSV_FILE, 'a', newline='') as csvfile:
-        writer = csv.writer(csvfile)
-        writer.writerow([iteration] + positions)
+def write_to_csv(log, iteration, positions):
+    log.writerow([iteration] + positions)
+    if iteration % CHECKPOINT_ITERATIONS == 0:
+        log.checkpoint()
 
 def main():
-    open_port()
-    set_baudrate()
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
     
-    initialize_csv()  # Initialize CSV file with header
+        # New log file for this run, checkpointed and closed however the loop ends
+        with initialize_csv() as log:
     
-    # Enable torque and set max torque level for all Dynamixels
-    for dxl_id in DXL_IDS:
-        enable_torque(dxl_id)
-        set_torque_level(dxl_id, TORQUE_MAX_LEVEL)
+            # Enable torque for all Dynamixels and limit it with the RAM Torque Limit (one SyncWrite)
+            for dxl_id in DXL_IDS:
+                bus.enable_torque(dxl_id)
+            bus.set_torque_limits(TORQUE_PROFILE)
     
-    iteration_count = 1
-
-    while True:
-        motor_positions = []
-
-        # Decrement the main motor (motor 1) in steps of -5
-        for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE - 1, STEP_SIZE_MAIN):
-            set_goal_position(DXL_MAIN_ID, goal_position_main)
+            iteration_count = 1
 
             while True:
-                present_position_main = read_present_position(DXL_MAIN_ID)
-                print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, goal_position_main, present_position_main))
-
-                if abs(goal_position_main - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                    break
-
-                time.sleep(0.1)
-
-            # For each step of motor 1, move all other motors
-            for dxl_id in DXL_IDS:
-                if dxl_id == DXL_MAIN_ID:
-                    motor_positions.append(goal_position_main)
-                else:
-                    move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE if dxl_id % 2 == 0 else DXL_ODD_MAX_POSITION_VALUE, STEP_SIZE)
-                    present_position = read_present_position(dxl_id)
-                    motor_positions.append(present_position)
+                motor_positions = []
+
+                # Decrement the main motor (motor 1) in steps of -5
+                for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE - 1, STEP_SIZE_MAIN):
+                    bus.set_goal_position(DXL_MAIN_ID, goal_position_main)
+
+                    present_position_main = bus.wait_arrived(DXL_MAIN_ID, goal_position_main, DXL_MOVING_STATUS_THRESHOLD)
+                    display.update(DXL_MAIN_ID, 'GoalPos', goal_position_main, present_position_main)
+
+                    # For each step of motor 1, move all other motors
+                    for dxl_id in DXL_IDS:
+                        if dxl_id == DXL_MAIN_ID:
+                            motor_positions.append(goal_position_main)
+                        else:
+                            move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE if dxl_id % 2 == 0 else DXL_ODD_MAX_POSITION_VALUE, STEP_SIZE)
+                            present_position = bus.read_present_position(dxl_id)
+                            motor_positions.append(present_position)
         
-        # Write to CSV for current iteration
-        write_to_csv(iteration_count, motor_positions)
+                # Write to CSV for current iteration
+                write_to_csv(log, iteration_count, motor_positions)
         
-        # Reset motor 1 to home position
-        set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
-        while True:
-            present_position_main = read_present_position(DXL_MAIN_ID)
-            print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, present_position_main))
-
-            if abs(DXL_MINIMUM_POSITION_VALUE - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                break
-
-            time.sleep(0.1)
+                # Reset motor 1 to home position
+                bus.set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
+                present_position_main = bus.wait_arrived(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, DXL_MOVING_STATUS_THRESHOLD)
+                display.update(DXL_MAIN_ID, 'ResetPos', DXL_MINIMUM_POSITION_VALUE, present_position_main)
 
-        iteration_count += 1
-        time.sleep(1)  # Wait for 1 second before the next loop iteration
+                iteration_count += 1
+                time.sleep(1)  # Wait for 1 second before the next loop iteration
 
-    close_port()
+        bus.close()
 
 if __name__ == "__main__":
     main()
@@ -3,204 +3,266 @@
 
 import os
 import time
-import csv
 import keyboard
-from dynamixel_sdk import *  # Uses Dynamixel SDK library
-
-# Control table address
-ADDR_MX_TORQUE_ENABLE = 24  # Control table address is different for Dynamixel model
-ADDR_MX_GOAL_POSITION = 30
-ADDR_MX_PRESENT_POSITION = 36
-ADDR_MX_TORQUE_MAX = 14
-
-# Protocol version
-PROTOCOL_VERSION = 1.0  # See which protocol version is used in the Dynamixel
+from mx64 import make_bus, move_timeout, moving_speed_for, STATUS_RETURN_READ
+from mx64.streaming import plan_path, stream
+from mx64.control_loop import ControlLoop
+from mx64.telemetry import BackgroundRecorder, CsvRecorder, TelemetryRecorder
+from mx64.compressed_log import CompressedRecorder
+from mx64.session_log import SESSION_TIME_FORMAT
+from mx64.scheduler import estimate_grid_time, plan_grid, run_sweeps, sweep_goals, sweeps_time
+from mx64.status import StatusDisplay, VERBOSITY_TABLE
 
 # Default setting
 DXL_MAIN_ID = 1  # Dynamixel ID that will decrement in small steps
 DXL_IDS = [1, 2, 3, 4, 5, 6]  # List of all Dynamixel IDs
-BAUDRATE = 1000000  # Dynamixel default baudrate
+BAUDRATE = None     # None: rate cached for this adapter, or scanned for (python3 -m mx64.discovery)
 DEVICENAME = '/dev/ttyUSB0'  # Check which port is being used on your controller
-TORQUE_ENABLE = 1  # Value for enabling the torque
-TORQUE_DISABLE = 0  # Value for disabling the torque
 DXL_MINIMUM_POSITION_VALUE = 2048  # Start position
 DXL_ODD_MAX_POSITION_VALUE = 1540  # End position for odd motors
 DXL_EVEN_MAX_POSITION_VALUE = 2557  # End position for even motors
 DXL_MOVING_STATUS_THRESHOLD = 20  # Dynamixel moving status threshold
 STEP_SIZE_MAIN = -5  # Main motor decrement step size
 STEP_SIZE = 5  # Position increment step size for other motors
+SECONDARY_SWEEPS = [(2, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE), (4, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE),
+                    (6, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE), (3, DXL_ODD_MAX_POSITION_VALUE, -STEP_SIZE),
+                    (5, DXL_ODD_MAX_POSITION_VALUE, -STEP_SIZE)]  # (ID, end position, step) swept for each main motor step
+CONCURRENT_SWEEPS = True  # Sweep the other motors all at once (True) or one after another (False) in 'step' mode
+SWEEP_ORDER = 'serpentine'  # 'step' mode grid order: 'naive' returns every sweep home, 'serpentine' samples on the way back
 TORQUE_MAX_LEVEL = 300  # Maximum torque level (adjust as needed, 0-1023 for MX series)
-
-# Initialize PortHandler instance
-portHandler = PortHandler(DEVICENAME)
-
-# Initialize PacketHandler instance
-packetHandler = PacketHandler(PROTOCOL_VERSION)
+TORQUE_PROFILE = {dxl_id: TORQUE_MAX_LEVEL for dxl_id in DXL_IDS}  # Per-motor torque limits, can change between steps
+STATUS_RETURN_LEVEL = STATUS_RETURN_READ  # Servos answer READ only, writes go out without waiting for a reply
+RESTORE_STATUS_RETURN_LEVEL = False  # Put each motor's previous level back on exit (costs a second EEPROM write per motor
+                                     # and run); MX64Bus reads the level at open(), so the other scripts work either way
+MOTION_MODE = 'step'  # 'step': step the goal, wait for arrival; 'stream': stream the sweep path at STREAM_RATE;
+                      # 'servo': one goal and moving speed per sweep segment, the servo interpolates
+STREAM_RATE = 100  # Goal updates per second in streaming mode
+CONTROL_CPU = None  # CPU to pin the streaming loop to (None: any)
+REALTIME_PRIORITY = None  # SCHED_FIFO priority 1-99 for the streaming loop (None: normal; needs root or CAP_SYS_NICE)
+MOTION_SPEED = 3000  # Peak speed in 'stream' and 'servo' mode (position ticks per second, MX-64 no-load max ~4300)
+STREAM_PROFILE = 'scurve'  # Velocity profile per segment: 'linear', 'trapezoid' or 'scurve'
+TELEMETRY_FORMAT = 'binary'  # 'binary': columnar recording with time, load and speed (mx64/telemetry.py,
+                             # CSV export: python3 -m mx64.telemetry <name>.telemetry <name>.csv); 'csv': one text row per sample;
+                             # 'compressed': delta-encoded chunks for multi-hour runs, one <name>_<start time> log per run
+                             # (mx64/compressed_log.py, CSV export: python3 -m mx64.compressed_log <name> --csv <name>.csv)
+DATA_NAME = "mocapHexa_mot11_data_trail1"  # Recording name, without the .telemetry/.csv/.NNN.mxlog extension
+BACKGROUND_LOGGING = True  # Samples and console lines go through a ring buffer to a writer thread, off the bus loop
+
+# Initialize the shared MX-64 bus (owns the PortHandler and PacketHandler)
+bus = make_bus(DEVICENAME, BAUDRATE, DXL_IDS)
+
+# Console status: latest goal/present per motor redrawn in place at 10 Hz (mx64/status.py).
+# VERBOSITY_QUIET, VERBOSITY_EVENTS, VERBOSITY_TABLE or VERBOSITY_SAMPLES (a line per arrival, as before)
+VERBOSITY = VERBOSITY_TABLE
+display = StatusDisplay(DXL_IDS, VERBOSITY)
+bus.message = display.message  # Bus warnings (stalls, timeouts, comm errors) go above the table
 
 # Global flag to control pause and resume
 paused = False
 
-def open_port():
-    if portHandler.openPort():
-        print("Succeeded to open the port")
-    else:
-        print("Failed to open the port")
-        quit()
-
-def set_baudrate():
-    if portHandler.setBaudRate(BAUDRATE):
-        print("Succeeded to change the baudrate")
-    else:
-        print("Failed to change the baudrate")
-        quit()
-
-def enable_torque(dxl_id):
-    dxl_comm_result, dxl_error = packetHandler.write1ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Dynamixel#%d has been successfully connected" % dxl_id)
-
-def set_torque_level(dxl_id, torque_level):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_TORQUE_MAX, torque_level)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    else:
-        print("Torque level set to %d for Dynamixel#%d" % (torque_level, dxl_id))
-
-def set_goal_position(dxl_id, goal_position):
-    dxl_comm_result, dxl_error = packetHandler.write2ByteTxRx(portHandler, dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-
-def read_present_position(dxl_id):
-    dxl_present_position, dxl_comm_result, dxl_error = packetHandler.read2ByteTxRx(portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
-    if dxl_comm_result != COMM_SUCCESS:
-        print("%s" % packetHandler.getTxRxResult(dxl_comm_result))
-    elif dxl_error != 0:
-        print("%s" % packetHandler.getRxPacketError(dxl_error))
-    return dxl_present_position
-
-def close_port():
-    portHandler.closePort()
-
-def move_motor(dxl_id, start_position, end_position, step_size, writer, iteration):
-    goal_position = start_position
-
-    while (goal_position >= end_position if step_size < 0 else goal_position <= end_position):
-        set_goal_position(dxl_id, goal_position)
-
-        while True:
-            present_position = read_present_position(dxl_id)
-            print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (dxl_id, goal_position, present_position))
-
-            writer.writerow([iteration, dxl_id, goal_position, present_position])  # Record position values
-
-            if abs(goal_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-                break
-
+def record_sample(recorder, iteration, dxl_id, goal_position, present_position):
+    # Record one goal/present pair with the load and speed read in the same arrival poll
+    speed, load = bus.present_states.get(dxl_id, (present_position, 0, 0))[1:]
+    recorder.append(iteration, dxl_id, goal_position, present_position, load, speed)
+
+def record_arrival(recorder, iteration):
+    # on_arrival callback for run_sweeps(): print and record one goal/present pair
+    def on_arrival(dxl_id, label, goal_position, present_position):
+        display.update(dxl_id, label, goal_position, present_position)
+        record_sample(recorder, iteration, dxl_id, goal_position, present_position)  # Record position values
+    return on_arrival
+
+def sweep_secondaries(sweeps, recorder, iteration):
+    # Run one row of the grid plan: {dxl_id: [(label, goal)]} for the secondary motors. The
+    # sweeps do not depend on each other, so by default they run together (mx64/scheduler.py);
+    # each motor's rows come out in the same order as when they run one after another.
+    if CONCURRENT_SWEEPS:
+        run_sweeps(bus, sweeps, DXL_MOVING_STATUS_THRESHOLD, record_arrival(recorder, iteration))
+        return
+    for dxl_id, steps in sweeps.items():
+        run_sweeps(bus, {dxl_id: steps}, DXL_MOVING_STATUS_THRESHOLD, record_arrival(recorder, iteration))
+
+def grid_plans():
+    # The 'step' mode grid (main motor steps x secondary sweeps) in SWEEP_ORDER, as plan_grid()
+    # (rows, finish) pairs: one per iteration, or a forward and a backward one for 'serpentine',
+    # where the main motor also sweeps back on every other iteration instead of returning home
+    main_goals = sweep_goals(DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE, STEP_SIZE_MAIN)
+    secondary_goals = {dxl_id: sweep_goals(DXL_MINIMUM_POSITION_VALUE, end_position, step_size)
+                       for dxl_id, end_position, step_size in SECONDARY_SWEEPS}
+    home_positions = {dxl_id: DXL_MINIMUM_POSITION_VALUE for dxl_id in DXL_IDS}
+
+    plans = [plan_grid(main_goals, secondary_goals, home_positions, SWEEP_ORDER)]
+    if SWEEP_ORDER == 'serpentine':
+        plans.append(plan_grid(main_goals[::-1], secondary_goals, home_positions, SWEEP_ORDER))
+
+    # Estimated time per iteration against the naive order (which also returns the main motor home)
+    def iteration_time(order_plans):
+        duration = 0.0
+        for rows, finish in order_plans:
+            duration += estimate_grid_time(DXL_MAIN_ID, rows, finish, home_positions)
+        return duration / len(order_plans)
+    main_return = sweeps_time({DXL_MAIN_ID: [('ResetPos', DXL_MINIMUM_POSITION_VALUE)]}, {DXL_MAIN_ID: main_goals[-1]})
+    naive = iteration_time([plan_grid(main_goals, secondary_goals, home_positions, 'naive')]) + main_return
+    planned = iteration_time(plans) + (main_return if SWEEP_ORDER == 'naive' else 0.0)
+    display.message("Sweep order '%s': about %.0f s per iteration, %.0f s (%.0f%%) less than the naive order"
+                    % (SWEEP_ORDER, planned, naive - planned, 100.0 * (naive - planned) / naive))
+    return plans
+
+def sweep_waypoints():
+    # The goals the stepped sweep passes through, one motor moving per waypoint.
+    # Returns ({dxl_id: goal} waypoints, ID of the motor moving towards each waypoint).
+    waypoints = [{dxl_id: DXL_MINIMUM_POSITION_VALUE for dxl_id in DXL_IDS}]
+    moving = [DXL_MAIN_ID]
+    for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE - 1, STEP_SIZE_MAIN):
+        waypoints.append({DXL_MAIN_ID: goal_position_main})
+        moving.append(DXL_MAIN_ID)
+        for dxl_id, end_position, step_size in SECONDARY_SWEEPS:
+            last_goal = sweep_goals(DXL_MINIMUM_POSITION_VALUE, end_position, step_size)[-1]
+            waypoints += [{dxl_id: last_goal}, {dxl_id: DXL_MINIMUM_POSITION_VALUE}]
+            moving += [dxl_id, dxl_id]
+    waypoints.append({DXL_MAIN_ID: DXL_MINIMUM_POSITION_VALUE})
+    moving.append(DXL_MAIN_ID)
+    return waypoints, moving
+
+def stream_sweep(trajectory, segment_of_step, moving, recorder, iteration):
+    # Streamed version of one iteration: goals go out every 1/STREAM_RATE s along the
+    # sweep path; the moving motor's position is read and recorded once per step
+    def record(step):
+        dxl_id = moving[segment_of_step[step]]
+        goal_position = int(trajectory.goals[step, DXL_IDS.index(dxl_id)])
+        state = bus.read_snapshot1(dxl_id)  # Position, speed and load in one READ
+        recorder.append(iteration, dxl_id, goal_position, int(state['position']), int(state['load']), int(state['speed']))
+        while paused:
             time.sleep(0.1)
 
-        goal_position += step_size
-
-    # Reset to home position
-    set_goal_position(dxl_id, start_position)
-    while True:
-        present_position = read_present_position(dxl_id)
-        print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (dxl_id, start_position, present_position))
-
-        writer.writerow([iteration, dxl_id, start_position, present_position])  # Record reset position values
-
-        if abs(start_position - present_position) <= DXL_MOVING_STATUS_THRESHOLD:
-            break
-
-        time.sleep(0.1)
+    loop = ControlLoop(STREAM_RATE, CONTROL_CPU, REALTIME_PRIORITY, 'resync', message=display.message)
+    stream(bus, trajectory, STREAM_RATE, record, loop)
+    display.message("Iteration %d streamed: %s" % (iteration, loop.report()))
+
+def servo_sweep(waypoints, moving, recorder, iteration):
+    # Same sweep path with one SyncWrite (goal + moving speed) per segment; the Moving flag
+    # tells when the servo has finished interpolating, then the end position is recorded
+    moving_speed = moving_speed_for(MOTION_SPEED, 1.0)
+    positions = bus.read_present_positions(DXL_IDS)
+    for waypoint in waypoints:
+        bus.set_goals_with_speed({dxl_id: (goal_position, moving_speed) for dxl_id, goal_position in waypoint.items()})
+        # Time limit from the longest move at that speed, so a blocked motor cannot hang the sweep
+        distance = max(abs(goal_position - positions[dxl_id]) for dxl_id, goal_position in waypoint.items())
+        bus.wait_stopped(list(waypoint), move_timeout(distance, moving_speed), goal_positions=waypoint,
+                         threshold=DXL_MOVING_STATUS_THRESHOLD)
+        positions.update(waypoint)
+        snapshot = bus.read_snapshot(list(waypoint))
+        for state, (dxl_id, goal_position) in zip(snapshot, waypoint.items()):
+            present_position = int(state['position'])
+            display.update(dxl_id, 'GoalPos', goal_position, present_position)
+            recorder.append(iteration, dxl_id, goal_position, present_position, int(state['load']), int(state['speed']))
+        while paused:
+            time.sleep(0.1)
+    bus.clear_moving_speed()
 
 def toggle_pause(event):
     global paused
     paused = not paused
     if paused:
-        print("Paused")
+        display.message("Paused")
     else:
-        print("Resumed")
+        display.message("Resumed")
 
 def main():
-    open_port()
-    set_baudrate()
-
-    # Register the 's' key event to toggle pause/resume
-    keyboard.on_press_key("s", toggle_pause)
-
-    csv_filename = "mocapHexa_mot11_data_trail1.csv"
-
-    # Open CSV file to record data
-    with open(csv_filename, mode='w', newline='') as file:
-        writer = csv.writer(file)
-        writer.writerow(['Iteration', 'Motor ID', 'Goal Position', 'Present Position'])
-
-        # Enable torque and set max torque level for all Dynamixels
-        for dxl_id in DXL_IDS:
-            enable_torque(dxl_id)
-            set_torque_level(dxl_id, TORQUE_MAX_LEVEL)
+    # Closed however main() ends (Ctrl-C included), so queued messages and the final table are shown
+    with display:
+        if not bus.open():
+            quit()
+
+        # Stop the servos replying to writes. Address 16 is EEPROM: motors already at the level
+        # (read in bus.open()) are not written, so only the first run after a change writes it.
+        original_levels = dict(bus.status_return_levels)
+        bus.set_status_return_level(STATUS_RETURN_LEVEL)
+        try:
+            # Register the 's' key event to toggle pause/resume
+            keyboard.on_press_key("s", toggle_pause)
+
+            # Open the recording (binary telemetry, CSV or compressed log) to record data
+            if TELEMETRY_FORMAT == 'csv':
+                recorder = CsvRecorder(DATA_NAME + ".csv", message=display.message)
+            elif TELEMETRY_FORMAT == 'compressed':
+                # A new <name>_<start time> recording per run, so earlier runs are kept
+                recorder = CompressedRecorder(DATA_NAME + time.strftime('_' + SESSION_TIME_FORMAT), message=display.message)
+                display.message("Recording to %s.NNN.mxlog" % recorder.path)
+            else:
+                recorder = TelemetryRecorder(DATA_NAME + ".telemetry", message=display.message)
+            if BACKGROUND_LOGGING:
+                recorder = BackgroundRecorder(recorder, message=display.message)
+            with recorder:
+
+                # Enable torque for all Dynamixels and limit it with the RAM Torque Limit (one SyncWrite)
+                for dxl_id in DXL_IDS:
+                    bus.enable_torque(dxl_id)
+                bus.set_torque_limits(TORQUE_PROFILE)
         
-        # Read the present position of all Dynamixels to hold them in place
-        current_positions = {}
-        for dxl_id in DXL_IDS:
-            current_positions[dxl_id] = read_present_position(dxl_id)
+                # Read the present position of all Dynamixels to hold them in place
+                current_positions = {}
+                for dxl_id in DXL_IDS:
+                    current_positions[dxl_id] = bus.read_present_position(dxl_id)
         
-        goal_position_main = DXL_MINIMUM_POSITION_VALUE
-        iteration = 0
-
-        while True:
-            if paused:
-                time.sleep(0.1)  # Small delay to prevent busy-waiting
-                continue
-
-            iteration += 1
+                goal_position_main = DXL_MINIMUM_POSITION_VALUE
+                iteration = 0
 
-            # Decrement the main motor (motor 1) in steps of -5
-            for goal_position_main in range(DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE - 1, STEP_SIZE_MAIN):
-                set_goal_position(DXL_MAIN_ID, goal_position_main)
+                if MOTION_MODE == 'step':
+                    plans = grid_plans()
+                else:
+                    waypoints, moving = sweep_waypoints()
+                if MOTION_MODE == 'stream':
+                    trajectory, segment_of_step = plan_path(DXL_IDS, waypoints, MOTION_SPEED, STREAM_RATE, STREAM_PROFILE)
 
                 while True:
-                    present_position_main = read_present_position(DXL_MAIN_ID)
-                    print("[ID:%03d] GoalPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, goal_position_main, present_position_main))
-
-                    writer.writerow([iteration, DXL_MAIN_ID, goal_position_main, present_position_main])  # Record main motor position values
-
-                    if abs(goal_position_main - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                        break
-
-                    time.sleep(0.1)
-
-                # For each step of motor 1, move all other motors
-                for dxl_id in [2, 4, 6]:
-                    move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_EVEN_MAX_POSITION_VALUE, STEP_SIZE, writer, iteration)
-                for dxl_id in [3, 5]:
-                    move_motor(dxl_id, DXL_MINIMUM_POSITION_VALUE, DXL_ODD_MAX_POSITION_VALUE, -STEP_SIZE, writer, iteration)
-            
-            # Reset motor 1 to home position
-            set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
-            while True:
-                present_position_main = read_present_position(DXL_MAIN_ID)
-                print("[ID:%03d] ResetPos:%03d  PresPos:%03d" % (DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, present_position_main))
-
-                writer.writerow([iteration, DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, present_position_main])  # Record reset position values
-
-                if abs(DXL_MINIMUM_POSITION_VALUE - present_position_main) <= DXL_MOVING_STATUS_THRESHOLD:
-                    break
-
-                time.sleep(0.1)
-
-            time.sleep(1)  # Wait for 1 second before the next loop iteration
-
-    close_port()
+                    if paused:
+                        time.sleep(0.1)  # Small delay to prevent busy-waiting
+                        continue
+
+                    iteration += 1
+                    display.set_status("Iteration %d, %s mode" % (iteration, MOTION_MODE))
+                    if BACKGROUND_LOGGING and iteration > 1:
+                        display.message("Telemetry after %d iteration(s): %s" % (iteration - 1, recorder.report()))
+
+                    if MOTION_MODE == 'stream':
+                        stream_sweep(trajectory, segment_of_step, moving, recorder, iteration)
+                        time.sleep(1)  # Wait for 1 second before the next loop iteration
+                        continue
+                    if MOTION_MODE == 'servo':
+                        servo_sweep(waypoints, moving, recorder, iteration)
+                        time.sleep(1)  # Wait for 1 second before the next loop iteration
+                        continue
+
+                    # Step the main motor (motor 1) in steps of -5 (and back up on every other 'serpentine' iteration)
+                    rows, finish = plans[(iteration - 1) % len(plans)]
+                    for goal_position_main, sweeps in rows:
+                        bus.set_goal_position(DXL_MAIN_ID, goal_position_main)
+
+                        present_position_main = bus.wait_arrived(DXL_MAIN_ID, goal_position_main, DXL_MOVING_STATUS_THRESHOLD)
+                        display.update(DXL_MAIN_ID, 'GoalPos', goal_position_main, present_position_main)
+                        record_sample(recorder, iteration, DXL_MAIN_ID, goal_position_main, present_position_main)  # Record main motor position values
+
+                        # For each step of motor 1, move all other motors
+                        sweep_secondaries(sweeps, recorder, iteration)
+
+                    # Bring secondaries left at the far end of their last sweep home
+                    if finish:
+                        sweep_secondaries(finish, recorder, iteration)
+
+                    # Reset motor 1 to home position
+                    if SWEEP_ORDER == 'naive':
+                        bus.set_goal_position(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE)
+                        present_position_main = bus.wait_arrived(DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, DXL_MOVING_STATUS_THRESHOLD)
+                        display.update(DXL_MAIN_ID, 'ResetPos', DXL_MINIMUM_POSITION_VALUE, present_position_main)
+                        record_sample(recorder, iteration, DXL_MAIN_ID, DXL_MINIMUM_POSITION_VALUE, present_position_main)  # Record reset position values
+
+                    time.sleep(1)  # Wait for 1 second before the next loop iteration
+        finally:
+            if RESTORE_STATUS_RETURN_LEVEL:
+                for dxl_id, level in original_levels.items():
+                    bus.set_status_return_level(level, [dxl_id])
+            bus.close()
 
 if __name__ == "__main__":
     main()
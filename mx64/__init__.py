@@ -0,0 +1,9 @@
+# Shared MX-64 bus driver for the hexapod scripts
+# Scripts run from the repository root, so "from mx64 import make_bus" works as-is.
+
+from .control_table import *
+from .bus import MX64Bus, PROTOCOL_VERSION, DXL_MOVING_STATUS_THRESHOLD, STATE_POSITION, STATE_SPEED, STATE_LOAD
+from .bus import SNAPSHOT_DTYPE, decode_signed, decode_snapshot, move_timeout, moving_speed_for
+from .sim import SimPortHandler, SimulatedBus, SimulatedMX64
+from .sharded import ShardedBus, make_bus
+from .aio import AsyncBus
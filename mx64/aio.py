@@ -0,0 +1,232 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# asyncio front end for MX64Bus / ShardedBus
+#
+# Every bus call runs on one worker thread (the scheduler), so coroutines never
+# touch the PortHandler themselves and port transactions never interleave. Goal
+# writes issued by several coroutines in the same event-loop step go out as one
+# SyncWrite, and all pending arrival waits share one BulkRead per poll. A wait ends
+# like MX64Bus.wait_arrived(): within the threshold, stalled (stopped outside it for
+# ARRIVAL_STALL_TIME) or timed out, resolving to the present position either way;
+# a failed poll raises its exception in every pending wait.
+#
+#   async def leg(abus, dxl_id):
+#       for goal in (2300, 2048):
+#           await abus.move(dxl_id, goal)
+#
+#   await asyncio.gather(*(leg(abus, dxl_id) for dxl_id in DXL_IDS))
+#
+# Demo, each motor sweeping on its own schedule:
+#   python3 -m mx64.aio --sim
+
+import argparse
+import asyncio
+import functools
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .bus import ARRIVAL_STALL_TIME, ARRIVAL_TIMEOUT, BAUDRATE, DEVICENAME, DXL_IDS, DXL_MOVING_STATUS_THRESHOLD
+from .sharded import make_bus
+from .sim import SIM_PREFIX
+from .status import StatusDisplay, VERBOSITY_TABLE
+
+ARRIVAL_POLL_INTERVAL = 0.02             # s between position polls while a wait is pending
+
+
+class AsyncBus(object):
+
+    def __init__(self, bus, poll_interval=ARRIVAL_POLL_INTERVAL):
+        self.bus = bus
+        self.dxl_ids = bus.dxl_ids
+        self.poll_interval = poll_interval
+
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._pending_goals = {}
+        self._goal_flush = None
+        self._waiters = {}                       # {dxl_id: [[goal, threshold, deadline, stopped since, future]]}
+        self._positions = {}                     # {dxl_id: latest polled present position}
+        self._poller = None
+
+    async def _run(self, method, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, functools.partial(getattr(self.bus, method), *args))
+
+    async def open(self):
+        return await self._run('open')
+
+    async def close(self):
+        if self._poller is not None:
+            self._poller.cancel()
+        for waiting in self._waiters.values():
+            for waiter in waiting:
+                waiter[4].cancel()
+        self._waiters = {}
+        await self._run('close')
+        self._executor.shutdown()
+
+    async def enable_torque(self, dxl_id):
+        await self._run('enable_torque', dxl_id)
+
+    async def disable_torque(self, dxl_id):
+        await self._run('disable_torque', dxl_id)
+
+    async def enable_torque_all(self, dxl_ids=None):
+        await self._run('enable_torque_all', dxl_ids)
+
+    async def disable_torque_all(self, dxl_ids=None):
+        await self._run('disable_torque_all', dxl_ids)
+
+    async def set_torque_limit(self, dxl_id, torque_limit):
+        await self._run('set_torque_limit', dxl_id, torque_limit)
+
+    async def set_torque_limits(self, torque_limits):
+        await self._run('set_torque_limits', torque_limits)
+
+    async def read_present_position(self, dxl_id):
+        return await self._run('read_present_position', dxl_id)
+
+    async def read_present_positions(self, dxl_ids=None):
+        return await self._run('read_present_positions', dxl_ids)
+
+    async def read_states(self, dxl_ids=None):
+        return await self._run('read_states', dxl_ids)
+
+    async def read_snapshot(self, dxl_ids=None):
+        return await self._run('read_snapshot', dxl_ids)
+
+    # Goal writes
+
+    async def set_goal_position(self, dxl_id, goal_position):
+        await self.set_goal_positions({dxl_id: goal_position})
+
+    async def set_goal_positions(self, goal_positions):
+        # Queued and sent after the current event-loop step, merged with the goals
+        # other coroutines queue in the same step
+        self._pending_goals.update(goal_positions)
+        if self._goal_flush is None:
+            self._goal_flush = asyncio.ensure_future(self._flush_goals())
+        await asyncio.shield(self._goal_flush)
+
+    async def _flush_goals(self):
+        await asyncio.sleep(0)
+        goals, self._pending_goals = self._pending_goals, {}
+        self._goal_flush = None
+        await self._run('set_goal_positions', goals)
+
+    # Arrival
+
+    def wait_arrived(self, dxl_id, goal_position, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        # Future resolved with the present position once it is within threshold of the goal,
+        # the motor has stalled, or timeout seconds have passed (0 if it never answered)
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(dxl_id, []).append([goal_position, threshold, time.monotonic() + timeout, None, future])
+        if self._poller is None or self._poller.done():
+            self._poller = asyncio.ensure_future(self._poll())
+        return future
+
+    async def _poll(self):
+        try:
+            while self._waiters:
+                await self._poll_once()
+                if self._waiters:
+                    await asyncio.sleep(self.poll_interval)
+        except Exception as error:
+            # The poller is gone: hand the error to every wait instead of leaving them pending
+            waiters, self._waiters = self._waiters, {}
+            for waiting in waiters.values():
+                for waiter in waiting:
+                    if not waiter[4].done():
+                        waiter[4].set_exception(error)
+
+    async def _poll_once(self):
+        dxl_ids = sorted(self._waiters)
+        arrival = await self._run('read_arrival', dxl_ids)
+        now = time.monotonic()
+        for dxl_id in dxl_ids:
+            if dxl_id in arrival:
+                self._positions[dxl_id] = arrival[dxl_id][0]
+            waiting = []
+            for waiter in self._waiters.get(dxl_id, []):
+                goal_position, threshold, deadline, stopped_since, future = waiter
+                if future.done():
+                    continue
+                if dxl_id in arrival:
+                    present_position, moving = arrival[dxl_id]
+                    distance = abs(goal_position - present_position)
+                    if distance <= threshold:
+                        future.set_result(present_position)
+                        continue
+                    if moving:
+                        waiter[3] = None
+                    elif stopped_since is None:
+                        waiter[3] = now
+                    elif now - stopped_since >= ARRIVAL_STALL_TIME:
+                        self.bus.message("[ID:%03d] Stopped at %d, %d from goal %d" % (dxl_id, present_position, distance, goal_position))
+                        future.set_result(present_position)
+                        continue
+                if now > deadline:
+                    self.bus.message("Timed out waiting for Dynamixel(s) %s" % [dxl_id])
+                    future.set_result(self._positions.get(dxl_id, 0))
+                    continue
+                waiting.append(waiter)
+            if waiting:
+                self._waiters[dxl_id] = waiting
+            else:
+                self._waiters.pop(dxl_id, None)
+
+    async def move(self, dxl_id, goal_position, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        await self.set_goal_position(dxl_id, goal_position)
+        return await self.wait_arrived(dxl_id, goal_position, threshold, timeout)
+
+    async def move_all(self, goal_positions, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        await self.set_goal_positions(goal_positions)
+        positions = await asyncio.gather(*(self.wait_arrived(dxl_id, goal_position, threshold, timeout)
+                                           for dxl_id, goal_position in goal_positions.items()))
+        return dict(zip(goal_positions, positions))
+
+
+async def sweep(abus, dxl_id, start_position, end_position, step_size, display):
+    # move_motor() of the ODD/EVEN loops as a coroutine: step to the end, then back home,
+    # showing each arrival on display (a StatusDisplay)
+    for goal_position in range(start_position, end_position + (1 if step_size > 0 else -1), step_size):
+        present_position = await abus.move(dxl_id, goal_position)
+        display.update(dxl_id, 'GoalPos', goal_position, present_position)
+    present_position = await abus.move(dxl_id, start_position)
+    display.update(dxl_id, 'ResetPos', start_position, present_position)
+
+
+async def demo(device, baudrate, dxl_ids, span, step_size, verbosity=VERBOSITY_TABLE):
+    abus = AsyncBus(make_bus(device, baudrate, dxl_ids))
+    with StatusDisplay(dxl_ids, verbosity) as display:
+        abus.bus.message = display.message
+        if not await abus.open():
+            return
+        try:
+            await abus.enable_torque_all()
+            # Odd motors sweep down, even motors up, each at its own pace
+            await asyncio.gather(*(sweep(abus, dxl_id, 2048, 2048 + (span if dxl_id % 2 == 0 else -span),
+                                         step_size * (1 if dxl_id % 2 == 0 else -1) * (1 + dxl_id % 3), display)
+                                   for dxl_id in dxl_ids))
+        finally:
+            await abus.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Move MX-64 servos concurrently with asyncio")
+    parser.add_argument('--device', default=DEVICENAME)
+    parser.add_argument('--sim', action='store_true', help="use the simulated bus")
+    parser.add_argument('--baudrate', type=int, default=BAUDRATE)
+    parser.add_argument('--ids', default=','.join(str(i) for i in DXL_IDS))
+    parser.add_argument('--span', type=int, default=200, help="sweep range in position ticks")
+    parser.add_argument('--step', type=int, default=50)
+    parser.add_argument('--verbosity', type=int, default=VERBOSITY_TABLE,
+                        help="0 quiet, 1 messages only, 2 status table, 3 a line per arrival")
+    args = parser.parse_args(argv)
+
+    device = SIM_PREFIX + 'aio' if args.sim else args.device
+    asyncio.run(demo(device, args.baudrate, [int(i) for i in args.ids.split(',')], args.span, args.step, args.verbosity))
+
+
+if __name__ == "__main__":
+    main()
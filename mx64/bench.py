@@ -0,0 +1,168 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Bus transaction benchmark
+#
+# Measures per-sample latency and transactions per second of the access patterns
+# the scripts use, across baud rates and motor counts, and writes a JSON report.
+#
+#   python3 -m mx64.bench --sim                      # simulated bus (mx64/sim.py)
+#   python3 -m mx64.bench --device /dev/ttyUSB0 --migrate --out bench_report.json
+#
+# On a real bus the servos stay at their current baud rate unless --migrate is
+# given; migration rewrites the EEPROM Baud Rate register and is undone at the end.
+
+import argparse
+import json
+import time
+
+import numpy as np
+
+from .bus import BAUDRATE, DEVICENAME, DXL_IDS, MX_BAUDRATES, MX64Bus
+from .control_table import *
+from .sim import SIM_PREFIX
+
+PATTERNS = ['sequential_read', 'bulk_read', 'sync_write', 'txonly_write']
+SAMPLES = 200                            # Timed samples per (baud rate, motor count, pattern)
+WARMUP_SAMPLES = 10
+
+
+def sample_sequential_read(bus, dxl_ids, goals):
+    # One read2ByteTxRx round trip per motor, as in the read_present_position poll loops
+    for dxl_id in dxl_ids:
+        bus.packetHandler.read2ByteTxRx(bus.portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
+    return len(dxl_ids)
+
+
+def sample_bulk_read(bus, dxl_ids, goals):
+    bus.read_states(dxl_ids)
+    return 1
+
+
+def sample_sync_write(bus, dxl_ids, goals):
+    bus.set_goal_positions(goals, force=True)
+    return 1
+
+
+def sample_txonly_write(bus, dxl_ids, goals):
+    # The bus's own no-reply write path (Status Return Level 1, ack=False)
+    for dxl_id in dxl_ids:
+        bus.write2(dxl_id, ADDR_MX_GOAL_POSITION, goals[dxl_id], ack=False, force=True)
+    return len(dxl_ids)
+
+
+SAMPLERS = {
+    'sequential_read': sample_sequential_read,
+    'bulk_read': sample_bulk_read,
+    'sync_write': sample_sync_write,
+    'txonly_write': sample_txonly_write,
+}
+
+
+def run_pattern(bus, pattern, dxl_ids, goals, samples=SAMPLES):
+    sampler = SAMPLERS[pattern]
+    for _ in range(WARMUP_SAMPLES):
+        sampler(bus, dxl_ids, goals)
+
+    latencies = np.empty(samples)
+    transactions = 0
+    start = time.perf_counter()
+    for i in range(samples):
+        t0 = time.perf_counter()
+        transactions += sampler(bus, dxl_ids, goals)
+        latencies[i] = time.perf_counter() - t0
+    elapsed = time.perf_counter() - start
+
+    return {
+        'pattern': pattern,
+        'baudrate': bus.baudrate,
+        'motors': len(dxl_ids),
+        'samples': samples,
+        'mean_ms': float(latencies.mean() * 1000.0),
+        'p50_ms': float(np.percentile(latencies, 50) * 1000.0),
+        'p95_ms': float(np.percentile(latencies, 95) * 1000.0),
+        'max_ms': float(latencies.max() * 1000.0),
+        'samples_per_s': samples / elapsed,
+        'transactions_per_s': transactions / elapsed,
+    }
+
+
+def run_benchmark(bus, baudrates, motor_counts, patterns=PATTERNS, samples=SAMPLES, migrate=False):
+    results = []
+    original_baudrate = bus.baudrate
+    original_levels = dict(bus.status_return_levels)
+
+    # TxOnly writes are only safe when the servos do not answer writes. Address 16 is EEPROM,
+    # so the level is set once for the whole sweep (the other patterns work at any level)
+    # and put back once at the end, also when the sweep fails part way.
+    if 'txonly_write' in patterns:
+        bus.set_status_return_level(STATUS_RETURN_READ)
+    try:
+        for baudrate in baudrates:
+            if baudrate != bus.baudrate:
+                if not migrate:
+                    print("Skipping %d bps (servos run at %d, use --migrate)" % (baudrate, bus.baudrate))
+                    continue
+                if not bus.set_baudrate_all(baudrate):
+                    continue
+
+            # Hold every motor where it is, so the write patterns do not move anything
+            goals = bus.read_present_positions()
+
+            for motor_count in motor_counts:
+                dxl_ids = bus.dxl_ids[:motor_count]
+                for pattern in patterns:
+                    result = run_pattern(bus, pattern, dxl_ids, {dxl_id: goals[dxl_id] for dxl_id in dxl_ids}, samples)
+                    results.append(result)
+                    print("%-16s %8d bps  %d motors  mean %7.3f ms  p95 %7.3f ms  %8.1f samples/s  %8.1f tx/s" % (
+                        pattern, result['baudrate'], result['motors'], result['mean_ms'], result['p95_ms'],
+                        result['samples_per_s'], result['transactions_per_s']))
+    finally:
+        if bus.baudrate != original_baudrate:
+            bus.set_baudrate_all(original_baudrate)
+        for dxl_id, level in original_levels.items():
+            bus.set_status_return_level(level, [dxl_id])
+    return results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark MX-64 bus access patterns")
+    parser.add_argument('--device', default=DEVICENAME)
+    parser.add_argument('--sim', action='store_true', help="use the simulated bus")
+    parser.add_argument('--baudrate', type=int, default=BAUDRATE, help="rate the servos run at now")
+    parser.add_argument('--baudrates', default=','.join(str(b) for b in MX_BAUDRATES))
+    parser.add_argument('--ids', default=','.join(str(i) for i in DXL_IDS))
+    parser.add_argument('--motors', default=None, help="motor counts to sweep, default 1..len(ids)")
+    parser.add_argument('--patterns', default=','.join(PATTERNS))
+    parser.add_argument('--samples', type=int, default=SAMPLES)
+    parser.add_argument('--migrate', action='store_true', help="move the servos to each tested baud rate")
+    parser.add_argument('--out', default='bench_report.json')
+    args = parser.parse_args(argv)
+
+    dxl_ids = [int(i) for i in args.ids.split(',')]
+    motor_counts = [int(n) for n in args.motors.split(',')] if args.motors else list(range(1, len(dxl_ids) + 1))
+    device = SIM_PREFIX + 'bench' if args.sim else args.device
+
+    bus = MX64Bus(device, args.baudrate, dxl_ids)
+    if not bus.open():
+        quit()
+    try:
+        results = run_benchmark(bus, [int(b) for b in args.baudrates.split(',')], motor_counts,
+                                args.patterns.split(','), args.samples, migrate=args.migrate or args.sim)
+    finally:
+        bus.close()
+
+    report = {
+        'device': device,
+        'ids': dxl_ids,
+        'metrics': bus.metrics,
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+    with open(args.out, 'w') as f:
+        json.dump(report, f, indent=2)
+    print("Report written to %s" % args.out)
+
+
+if __name__ == "__main__":
+    main()
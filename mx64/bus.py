@@ -0,0 +1,741 @@
+import math
+import time
+
+import numpy as np
+from dynamixel_sdk import COMM_PORT_BUSY, COMM_SUCCESS, COMM_TX_FAIL, DXL_HIBYTE, DXL_LOBYTE, DXL_MAKEWORD, GroupSyncWrite, PacketHandler
+
+from .control_table import *
+from .latency import ROUND_TRIP_WARNING_MS, measure_round_trip, tune_latency_timer
+from .sim import port_handler_for
+
+# Protocol version
+PROTOCOL_VERSION = 1.0                   # MX-64 runs Protocol 1.0
+
+# Default setting
+DXL_IDS = [1, 2, 3, 4, 5, 6]             # Dynamixel IDs of the hexapod
+BAUDRATE = 1000000                       # Dynamixel default baudrate : 57600
+DEVICENAME = '/dev/ttyUSB0'              # ex) Windows: "COM1"   Linux: "/dev/ttyUSB0" Mac: "/dev/tty.usbserial-*"
+DXL_MOVING_STATUS_THRESHOLD = 20         # Dynamixel moving status threshold
+
+# BulkRead block: present position, present speed and present load (36-41)
+STATE_START_ADDRESS = ADDR_MX_PRESENT_POSITION
+STATE_LENGTH = LEN_MX_PRESENT_POSITION + LEN_MX_PRESENT_SPEED + LEN_MX_PRESENT_LOAD
+STATE_POSITION = 0                       # Column indices of read_states() rows
+STATE_SPEED = 1
+STATE_LOAD = 2
+
+# Snapshot block: the whole present-state span 36-43 (position, speed, load, voltage, temperature)
+SNAPSHOT_START_ADDRESS = ADDR_MX_PRESENT_POSITION
+SNAPSHOT_LENGTH = ADDR_MX_PRESENT_TEMPERATURE + LEN_MX_PRESENT_TEMPERATURE - SNAPSHOT_START_ADDRESS
+# read_snapshot() record: speed and load signed (CCW positive, CW negative), voltage in 0.1 V,
+# temperature in degrees C; ok is False for a motor whose status packet was missing
+SNAPSHOT_DTYPE = np.dtype([
+    ('id', np.uint8),
+    ('position', np.int16),
+    ('speed', np.int16),
+    ('load', np.int16),
+    ('voltage', np.uint8),
+    ('temperature', np.uint8),
+    ('ok', np.bool_),
+])
+
+# Shadow of the writable registers in 14-35, seeded at open() with one BulkRead.
+# A write of the value already in the shadow is skipped unless the entry is older
+# than SHADOW_MAX_AGE, so a value the servo changed by itself (e.g. torque off after
+# an overload alarm) is rewritten within that time. EEPROM entries (below
+# SHADOW_EEPROM_END) do not age: the servo never changes them by itself and every
+# rewrite wears the EEPROM, so they are trusted until verify_shadow()/invalidate_shadow().
+# The arrival and snapshot polls re-read the block with verify_shadow() every
+# shadow_verify_interval seconds and report registers that drifted.
+SHADOW_START_ADDRESS = ADDR_MX_TORQUE_MAX
+SHADOW_LENGTH = ADDR_MX_TORQUE_LIMIT + LEN_MX_TORQUE_LIMIT - SHADOW_START_ADDRESS
+SHADOW_REGISTERS = {                     # {address: length}
+    ADDR_MX_TORQUE_MAX: 2,
+    ADDR_MX_TORQUE_ENABLE: 1,
+    ADDR_MX_LED: 1,
+    ADDR_MX_D_GAIN: 1,
+    ADDR_MX_I_GAIN: 1,
+    ADDR_MX_P_GAIN: 1,
+    ADDR_MX_GOAL_POSITION: LEN_MX_GOAL_POSITION,
+    ADDR_MX_MOVING_SPEED: LEN_MX_MOVING_SPEED,
+    ADDR_MX_TORQUE_LIMIT: LEN_MX_TORQUE_LIMIT,
+}
+SHADOW_MAX_AGE = 2.0                     # s
+SHADOW_EEPROM_END = ADDR_MX_TORQUE_ENABLE  # First RAM address; shadow entries below it never age
+SHADOW_VERIFY_INTERVAL = 5.0             # s between consistency checks from the polls (None: only at open())
+
+# Arrival waits: sleep through most of the predicted travel, then poll position and the
+# Moving flag (36-46 in one read) at an interval that shrinks with the remaining distance
+ARRIVAL_BLOCK_LENGTH = ADDR_MX_MOVING + LEN_MX_MOVING - ADDR_MX_PRESENT_POSITION
+ARRIVAL_SLEEP_FRACTION = 0.8             # Part of the predicted remaining travel time slept before the next poll
+ARRIVAL_POLL_MIN = 0.002                 # s
+ARRIVAL_POLL_MAX = 0.1                   # s, the old fixed poll interval
+ARRIVAL_STALL_TIME = 0.5                 # s stopped (Moving = 0) outside the threshold before giving up
+ARRIVAL_TIMEOUT = 30.0                   # s
+MOVE_TIMEOUT_FACTOR = 2.0                # wait_stopped() limit for servo-side moves: this many times
+MOVE_TIMEOUT_MARGIN = 1.0                # the nominal travel time, plus this many s (see move_timeout())
+
+STATUS_RETURN_WRITE_ATTEMPTS = 3         # Tries at writing the Status Return Level before giving up
+
+# Host baud rates the SDK PortHandler accepts that an MX-64 can also run at
+MX_BAUDRATES = [57600, 115200, 1000000, 2000000, 2500000, 3000000]
+
+
+def baud_register_value(baudrate):
+    # Baud Rate register (address 4) value for a bits-per-second rate
+    if baudrate == 2250000:
+        return 250
+    if baudrate == 2500000:
+        return 251
+    if baudrate == 3000000:
+        return 252
+    return int(round(2000000.0 / baudrate)) - 1
+
+
+def moving_speed_for(distance, duration):
+    # Moving Speed register value that covers distance ticks in duration seconds (at least 1,
+    # since 0 means no limit)
+    if duration <= 0:
+        return DXL_MAX_MOVING_SPEED
+    units = int(math.ceil(abs(distance) / (duration * SPEED_UNIT_TICKS)))
+    return min(max(units, 1), DXL_MAX_MOVING_SPEED)
+
+
+def move_timeout(distance, moving_speed):
+    # Time limit for a move of distance ticks at a Moving Speed register value (0: no limit):
+    # MOVE_TIMEOUT_FACTOR times the nominal travel time plus MOVE_TIMEOUT_MARGIN
+    speed = DXL_NO_LOAD_SPEED if moving_speed == 0 else min(moving_speed * SPEED_UNIT_TICKS, DXL_NO_LOAD_SPEED)
+    return abs(distance) / speed * MOVE_TIMEOUT_FACTOR + MOVE_TIMEOUT_MARGIN
+
+
+def decode_signed(raw):
+    # Sign-and-magnitude speed/load registers (bit 10 = CW) to CCW-positive values
+    raw = np.asarray(raw)
+    magnitude = (raw & (DXL_DIRECTION_BIT - 1)).astype(np.int16)
+    return np.where(raw & DXL_DIRECTION_BIT, -magnitude, magnitude)
+
+
+def decode_snapshot(dxl_ids, blocks, ok=None):
+    # (n, SNAPSHOT_LENGTH) uint8 register blocks to a SNAPSHOT_DTYPE record array
+    blocks = np.asarray(blocks, dtype=np.uint8).reshape(-1, SNAPSHOT_LENGTH)
+    words = blocks[:, 0:6].astype(np.uint16)
+    snapshot = np.zeros(len(blocks), dtype=SNAPSHOT_DTYPE)
+    snapshot['id'] = dxl_ids
+    snapshot['position'] = words[:, 0] | (words[:, 1] << 8)
+    snapshot['speed'] = decode_signed(words[:, 2] | (words[:, 3] << 8))
+    snapshot['load'] = decode_signed(words[:, 4] | (words[:, 5] << 8))
+    snapshot['voltage'] = blocks[:, 6]
+    snapshot['temperature'] = blocks[:, 7]
+    snapshot['ok'] = True if ok is None else ok
+    return snapshot
+
+
+class MX64Bus(object):
+    # One serial bus shared by several MX-64 servos.
+    #
+    # Owns the PortHandler/PacketHandler pair so every script goes through the
+    # same read/write path. Per-motor calls take a single ID, the plural calls
+    # take a {dxl_id: value} dict (or a list of IDs) and cover one control tick.
+    # baudrate=None finds the rate at open() from the per-adapter discovery cache.
+    # read_timeout > 0 (seconds) makes port reads block instead of spin, for buses
+    # driven from a worker thread next to other buses.
+
+    def __init__(self, device_name=DEVICENAME, baudrate=BAUDRATE, dxl_ids=DXL_IDS, read_timeout=0):
+        self.device_name = device_name
+        self.baudrate = baudrate
+        self.dxl_ids = list(dxl_ids)
+
+        # Where status and warning lines go; a script with a StatusDisplay sets display.message
+        # so they appear above its table instead of being drawn over
+        self.message = print
+
+        self.portHandler = port_handler_for(device_name, read_timeout)
+        self.packetHandler = PacketHandler(PROTOCOL_VERSION)
+
+        # Bus measurements taken in open(): 'latency_timer_ms' and 'round_trip_ms', plus counters
+        # of the writes sent and skipped by the shadow and of its periodic checks and their mismatches
+        self.metrics = {'writes_sent': 0, 'writes_skipped': 0, 'shadow_checks': 0, 'shadow_mismatches': 0}
+
+        # {dxl_id: {address: (value, time stored)}} of registers known to hold a value,
+        # checked against the servos every shadow_verify_interval seconds of polling
+        self.shadow = {}
+        self.shadow_verify_interval = SHADOW_VERIFY_INTERVAL
+        self._shadow_verified = None
+
+        # {dxl_id: (position, speed, load)} from the latest arrival-wait poll, speed and load signed
+        self.present_states = {}
+
+        # Status Return Level per motor, refreshed in open(); decides TxRx vs TxOnly writes
+        self.status_return_levels = {dxl_id: STATUS_RETURN_ALL for dxl_id in self.dxl_ids}
+
+        # SyncWrites of the 2-byte goal position and torque limit registers for any set of motors
+        self.groupSyncWriteGoal = GroupSyncWrite(self.portHandler, self.packetHandler,
+                                                 ADDR_MX_GOAL_POSITION, LEN_MX_GOAL_POSITION)
+        self.groupSyncWriteTorqueLimit = GroupSyncWrite(self.portHandler, self.packetHandler,
+                                                        ADDR_MX_TORQUE_LIMIT, LEN_MX_TORQUE_LIMIT)
+        # Goal position and moving speed (30-33) together, for servo-side interpolation
+        self.groupSyncWriteMove = GroupSyncWrite(self.portHandler, self.packetHandler,
+                                                 ADDR_MX_GOAL_POSITION, LEN_MX_GOAL_POSITION + LEN_MX_MOVING_SPEED)
+        self.groupSyncWriteMovingSpeed = GroupSyncWrite(self.portHandler, self.packetHandler,
+                                                        ADDR_MX_MOVING_SPEED, LEN_MX_MOVING_SPEED)
+
+        # BulkRead parameter lists, keyed by the tuple of IDs they cover
+        self._bulk_read_params = {}
+
+    def open(self):
+        if self.portHandler.openPort():
+            self.message("Succeeded to open the port")
+        else:
+            self.message("Failed to open the port")
+            return False
+
+        if self.baudrate is None:
+            # Rate cached for this adapter, or scanned for (see mx64/discovery.py)
+            from .discovery import discover
+            found = discover(self)
+            if not found:
+                self.message("Failed to find the Dynamixel baudrate")
+                return False
+            missing = [dxl_id for dxl_id in self.dxl_ids if dxl_id not in found]
+            if missing:
+                self.message("No reply from Dynamixel ID(s) %s" % missing)
+            self.message("Using baudrate %d" % self.baudrate)
+        elif self.portHandler.setBaudRate(self.baudrate):
+            self.message("Succeeded to change the baudrate")
+        else:
+            self.message("Failed to change the baudrate")
+            return False
+
+        self.read_status_return_levels()
+        self.check_latency()
+        self.verify_shadow()
+        return True
+
+    def check_latency(self):
+        # Lower the USB-serial latency timer where permitted and measure the read round trip
+        self.metrics['latency_timer_ms'] = tune_latency_timer(self.device_name, self.portHandler, message=self.message)
+        self.metrics['round_trip_ms'] = None
+        for dxl_id in self.dxl_ids:
+            round_trip = measure_round_trip(self, dxl_id)
+            if round_trip is not None:
+                self.metrics['round_trip_ms'] = round_trip
+                self.message("Round trip %.2f ms" % round_trip)
+                if round_trip > ROUND_TRIP_WARNING_MS:
+                    self.message("Warning: slow bus round trip, check the adapter latency timer")
+                break
+        return self.metrics['round_trip_ms']
+
+    def close(self):
+        self.portHandler.closePort()
+
+    # Raw register access
+
+    def check_result(self, dxl_comm_result, dxl_error):
+        if dxl_comm_result != COMM_SUCCESS:
+            self.message("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
+            return False
+        elif dxl_error != 0:
+            self.message("%s" % self.packetHandler.getRxPacketError(dxl_error))
+            return False
+        return True
+
+    def write1(self, dxl_id, address, value, ack=True, force=False):
+        return self._write(dxl_id, address, 1, value, ack, force)
+
+    def write2(self, dxl_id, address, value, ack=True, force=False):
+        return self._write(dxl_id, address, 2, value, ack, force)
+
+    def _write(self, dxl_id, address, length, value, ack, force=False):
+        # Unchanged values are not sent again (see SHADOW_MAX_AGE); force=True always sends
+        if not force and self.shadow_holds(dxl_id, address, value):
+            self.metrics['writes_skipped'] += 1
+            return True
+        self.metrics['writes_sent'] += 1
+        if self._send_write(dxl_id, address, length, value, ack):
+            self._shadow_store(dxl_id, address, value)
+            return True
+        self.shadow.get(dxl_id, {}).pop(address, None)
+        return False
+
+    def _send_write(self, dxl_id, address, length, value, ack):
+        # With Status Return Level 2 the servo always answers, so the write has to wait for it.
+        # Below that the servo stays silent: send TxOnly and, for setup writes (ack=True),
+        # confirm the value with a read-back instead of a status packet.
+        if self.status_return_levels.get(dxl_id, STATUS_RETURN_ALL) >= STATUS_RETURN_ALL:
+            if length == 1:
+                dxl_comm_result, dxl_error = self.packetHandler.write1ByteTxRx(self.portHandler, dxl_id, address, value)
+            else:
+                dxl_comm_result, dxl_error = self.packetHandler.write2ByteTxRx(self.portHandler, dxl_id, address, value)
+            return self.check_result(dxl_comm_result, dxl_error)
+
+        if length == 1:
+            dxl_comm_result = self.packetHandler.write1ByteTxOnly(self.portHandler, dxl_id, address, value)
+        else:
+            dxl_comm_result = self.packetHandler.write2ByteTxOnly(self.portHandler, dxl_id, address, value)
+        if not self.check_result(dxl_comm_result, 0):
+            return False
+        if not ack:
+            return True
+
+        read_back = self.read1(dxl_id, address) if length == 1 else self.read2(dxl_id, address)
+        if read_back != value:
+            self.message("[ID:%03d] Write to address %d not applied (read back %d, expected %d)" % (dxl_id, address, read_back, value))
+            return False
+        return True
+
+    # Control table shadow
+
+    def shadow_holds(self, dxl_id, address, value):
+        entry = self.shadow.get(dxl_id, {}).get(address)
+        if entry is None or entry[0] != value:
+            return False
+        return address < SHADOW_EEPROM_END or time.monotonic() - entry[1] < SHADOW_MAX_AGE
+
+    def _shadow_store(self, dxl_id, address, value):
+        if address in SHADOW_REGISTERS:
+            registers = self.shadow.setdefault(dxl_id, {})
+            registers[address] = (value, time.monotonic())
+            if address == ADDR_MX_GOAL_POSITION:
+                # A goal write turns the torque on, whatever the shadow says
+                registers.pop(ADDR_MX_TORQUE_ENABLE, None)
+
+    def invalidate_shadow(self, dxl_ids=None, address=None):
+        # Forget cached values (all registers, or one address) so the next write is sent
+        for dxl_id in self._ids(dxl_ids):
+            if address is None:
+                self.shadow.pop(dxl_id, None)
+            else:
+                self.shadow.get(dxl_id, {}).pop(address, None)
+
+    def verify_shadow(self, dxl_ids=None):
+        # Consistency check: read 14-35 of every motor in one BulkRead, report registers
+        # that differ from the shadow and reload it. Returns {dxl_id: [address, ...]}.
+        dxl_ids = tuple(self._ids(dxl_ids))
+        blocks = self.bulk_read(dxl_ids, SHADOW_START_ADDRESS, SHADOW_LENGTH)
+        mismatches = {}
+        now = self._shadow_verified = time.monotonic()
+        for dxl_id in dxl_ids:
+            data = blocks.get(dxl_id)
+            if data is None:
+                self.shadow.pop(dxl_id, None)
+                continue
+            cached = self.shadow.get(dxl_id, {})
+            fresh = {}
+            for address, length in SHADOW_REGISTERS.items():
+                offset = address - SHADOW_START_ADDRESS
+                value = data[offset] if length == 1 else DXL_MAKEWORD(data[offset], data[offset + 1])
+                if address in cached and cached[address][0] != value:
+                    mismatches.setdefault(dxl_id, []).append(address)
+                fresh[address] = (value, now)
+            self.shadow[dxl_id] = fresh
+        for dxl_id, addresses in sorted(mismatches.items()):
+            self.message("[ID:%03d] Control table differs from the shadow at address(es) %s" % (dxl_id, addresses))
+        return mismatches
+
+    def _verify_shadow_due(self):
+        # Called from the polls: run verify_shadow() once shadow_verify_interval has passed
+        if self.shadow_verify_interval is None:
+            return
+        if self._shadow_verified is None or time.monotonic() - self._shadow_verified >= self.shadow_verify_interval:
+            self.metrics['shadow_checks'] += 1
+            self.metrics['shadow_mismatches'] += len(self.verify_shadow())
+
+    def read1(self, dxl_id, address):
+        value, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(self.portHandler, dxl_id, address)
+        self.check_result(dxl_comm_result, dxl_error)
+        return value
+
+    def read2(self, dxl_id, address):
+        value, dxl_comm_result, dxl_error = self.packetHandler.read2ByteTxRx(self.portHandler, dxl_id, address)
+        self.check_result(dxl_comm_result, dxl_error)
+        return value
+
+    # Per-motor operations
+
+    def enable_torque(self, dxl_id):
+        if self.write1(dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_ENABLE):
+            self.message("Dynamixel#%d has been successfully connected" % dxl_id)
+
+    def disable_torque(self, dxl_id):
+        # Always sent: releasing the motor must not depend on the shadow being right
+        if self.write1(dxl_id, ADDR_MX_TORQUE_ENABLE, TORQUE_DISABLE, force=True):
+            self.message("Torque disabled for Dynamixel#%d" % dxl_id)
+
+    def persist_max_torque(self, dxl_id, max_torque):
+        # EEPROM Max Torque (address 14): the Torque Limit the servo starts with after power-on.
+        # Only for storing a new default; runtime limits go to the RAM register (set_torque_limits).
+        if self.write2(dxl_id, ADDR_MX_TORQUE_MAX, max_torque):
+            self.message("Max torque %d stored in EEPROM for Dynamixel#%d" % (max_torque, dxl_id))
+
+    def set_torque_limit(self, dxl_id, torque_limit):
+        if self.write2(dxl_id, ADDR_MX_TORQUE_LIMIT, torque_limit):
+            self.message("Torque limit set to %d for Dynamixel#%d" % (torque_limit, dxl_id))
+
+    def set_goal_position(self, dxl_id, goal_position):
+        # Streaming goal write: a servo that does not answer writes gets a plain TxOnly WRITE
+        # (shorter than a one-motor SyncWrite) with no read-back; otherwise a SyncWrite,
+        # which gets no reply either
+        if self.status_return_levels.get(dxl_id, STATUS_RETURN_ALL) < STATUS_RETURN_ALL:
+            return self.write2(dxl_id, ADDR_MX_GOAL_POSITION, goal_position, ack=False)
+        return self.set_goal_positions({dxl_id: goal_position})
+
+    def set_baudrate_all(self, baudrate, dxl_ids=None):
+        # Move the servos and then the port to a new baud rate. Address 4 is EEPROM and the
+        # servo switches before any reply could be read, so the writes go out TxOnly.
+        value = baud_register_value(baudrate)
+        for dxl_id in self._ids(dxl_ids):
+            self.packetHandler.write1ByteTxOnly(self.portHandler, dxl_id, ADDR_MX_BAUD_RATE, value)
+        time.sleep(0.05)
+
+        if not self.portHandler.setBaudRate(baudrate):
+            self.message("Failed to change the baudrate")
+            return False
+        self.baudrate = baudrate
+        self.portHandler.clearPort()
+        return True
+
+    def read_status_return_levels(self, dxl_ids=None):
+        # A servo at level 0 does not answer READ; treat a missing reply as that level
+        for dxl_id in self._ids(dxl_ids):
+            level, dxl_comm_result, dxl_error = self.packetHandler.read1ByteTxRx(self.portHandler, dxl_id,
+                                                                                  ADDR_MX_STATUS_RETURN_LEVEL)
+            self.status_return_levels[dxl_id] = level if dxl_comm_result == COMM_SUCCESS else STATUS_RETURN_PING_ONLY
+        return dict(self.status_return_levels)
+
+    def set_status_return_level(self, level, dxl_ids=None):
+        # Address 16 is EEPROM, so only motors not already at this level are written.
+        # The write is sent TxOnly because the reply (if any) follows the old or the new
+        # level depending on firmware; the new value is then confirmed by reading it back,
+        # and the write repeated if it was lost (e.g. sent into the tail of an interrupted read).
+        for dxl_id in self._ids(dxl_ids):
+            if self.status_return_levels.get(dxl_id) == level:
+                continue
+            for _ in range(STATUS_RETURN_WRITE_ATTEMPTS):
+                self.packetHandler.write1ByteTxOnly(self.portHandler, dxl_id, ADDR_MX_STATUS_RETURN_LEVEL, level)
+                time.sleep(0.01)
+                self.portHandler.clearPort()
+                self.read_status_return_levels([dxl_id])
+                if self.status_return_levels[dxl_id] == level:
+                    break
+            if self.status_return_levels[dxl_id] == level or level == STATUS_RETURN_PING_ONLY:
+                self.status_return_levels[dxl_id] = level
+                self.message("Status return level set to %d for Dynamixel#%d" % (level, dxl_id))
+            else:
+                self.message("Failed to set status return level for Dynamixel#%d" % dxl_id)
+
+    def read_present_position(self, dxl_id):
+        return self.read2(dxl_id, ADDR_MX_PRESENT_POSITION)
+
+    def read_present_load(self, dxl_id):
+        return self.read2(dxl_id, ADDR_MX_PRESENT_LOAD)
+
+    # Per-tick operations for several motors
+
+    def enable_torque_all(self, dxl_ids=None):
+        for dxl_id in self._ids(dxl_ids):
+            self.enable_torque(dxl_id)
+
+    def disable_torque_all(self, dxl_ids=None):
+        for dxl_id in self._ids(dxl_ids):
+            self.disable_torque(dxl_id)
+
+    def set_goal_positions(self, goal_positions, force=False):
+        return self._sync_write2(self.groupSyncWriteGoal, ADDR_MX_GOAL_POSITION, goal_positions, force)
+
+    def set_torque_limits(self, torque_limits, force=False):
+        # Torque profile {dxl_id: limit 0-1023} into the RAM Torque Limit register (address 34)
+        # with one SyncWrite; cheap enough to change between sweep steps. Not kept across power-off.
+        return self._sync_write2(self.groupSyncWriteTorqueLimit, ADDR_MX_TORQUE_LIMIT, torque_limits, force)
+
+    def set_goals_with_speed(self, goal_speeds):
+        # {dxl_id: (goal_position, moving_speed)} in one SyncWrite of 30-33: the servo itself
+        # runs to the goal at that speed, so a whole segment needs a single packet
+        for dxl_id, (goal_position, moving_speed) in goal_speeds.items():
+            param = [DXL_LOBYTE(goal_position), DXL_HIBYTE(goal_position), DXL_LOBYTE(moving_speed), DXL_HIBYTE(moving_speed)]
+            if not self.groupSyncWriteMove.addParam(dxl_id, param):
+                self.message("[ID:%03d] groupSyncWrite addparam failed" % dxl_id)
+
+        self.metrics['writes_sent'] += 1
+        dxl_comm_result = self.groupSyncWriteMove.txPacket()
+        self.groupSyncWriteMove.clearParam()
+        if dxl_comm_result != COMM_SUCCESS:
+            self.message("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
+            self.invalidate_shadow(list(goal_speeds), ADDR_MX_GOAL_POSITION)
+            self.invalidate_shadow(list(goal_speeds), ADDR_MX_MOVING_SPEED)
+            return False
+        for dxl_id, (goal_position, moving_speed) in goal_speeds.items():
+            self._shadow_store(dxl_id, ADDR_MX_GOAL_POSITION, goal_position)
+            self._shadow_store(dxl_id, ADDR_MX_MOVING_SPEED, moving_speed)
+        return True
+
+    def move_timed(self, goal_positions, duration, present_positions=None):
+        # Send every motor to its goal with a moving speed chosen so they all take about
+        # duration seconds. Returns {dxl_id: moving_speed}; wait with wait_stopped().
+        if present_positions is None:
+            present_positions = self.read_present_positions(list(goal_positions))
+        speeds = {dxl_id: moving_speed_for(goal_position - present_positions[dxl_id], duration)
+                  for dxl_id, goal_position in goal_positions.items()}
+        self.set_goals_with_speed({dxl_id: (goal_positions[dxl_id], speeds[dxl_id]) for dxl_id in goal_positions})
+        return speeds
+
+    def clear_moving_speed(self, dxl_ids=None):
+        # Back to no speed limit, for code that only writes goal positions
+        return self._sync_write2(self.groupSyncWriteMovingSpeed, ADDR_MX_MOVING_SPEED,
+                                 {dxl_id: 0 for dxl_id in self._ids(dxl_ids)}, False)
+
+    def _sync_write2(self, group, address, values, force):
+        # One SyncWrite packet to the broadcast ID, so no status packets to wait for.
+        # Motors whose value is unchanged are left out; nothing is sent if none changed.
+        sent = 0
+        for dxl_id, value in values.items():
+            if not force and self.shadow_holds(dxl_id, address, value):
+                continue
+            if not group.addParam(dxl_id, [DXL_LOBYTE(value), DXL_HIBYTE(value)]):
+                self.message("[ID:%03d] groupSyncWrite addparam failed" % dxl_id)
+            sent += 1
+        self.metrics['writes_skipped'] += len(values) - sent
+        if not sent:
+            return True
+
+        self.metrics['writes_sent'] += 1
+        dxl_comm_result = group.txPacket()
+        group.clearParam()
+        if dxl_comm_result != COMM_SUCCESS:
+            self.message("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
+            self.invalidate_shadow(list(values), address)
+            return False
+        for dxl_id, value in values.items():
+            self._shadow_store(dxl_id, address, value)
+        return True
+
+    def send_frame(self, frame):
+        # Write a prebuilt instruction packet that gets no reply (see mx64/trajectory.py)
+        if self.portHandler.is_using:
+            self.message("%s" % self.packetHandler.getTxRxResult(COMM_PORT_BUSY))
+            return False
+        self.portHandler.is_using = True
+        self.portHandler.clearPort()
+        written = self.portHandler.writePort(frame)
+        self.portHandler.is_using = False
+        if written != len(frame):
+            self.message("%s" % self.packetHandler.getTxRxResult(COMM_TX_FAIL))
+            return False
+        return True
+
+    def send_step(self, trajectory, step):
+        # Goal positions of one step of a compiled trajectory, as one SyncWrite.
+        # The frame is sent as-is, so the goal shadow of its motors is dropped.
+        for dxl_id in trajectory.dxl_ids:
+            registers = self.shadow.get(dxl_id, {})
+            registers.pop(ADDR_MX_GOAL_POSITION, None)
+            registers.pop(ADDR_MX_TORQUE_ENABLE, None)
+        return self.send_frame(trajectory.frame(step))
+
+    def read_moving(self, dxl_ids=None):
+        # {dxl_id: Moving flag (address 46)} from one BulkRead; a motor that did not answer
+        # is left out
+        blocks = self.bulk_read(self._ids(dxl_ids), ADDR_MX_MOVING, LEN_MX_MOVING)
+        return {dxl_id: bool(data[0]) for dxl_id, data in blocks.items()}
+
+    def read_arrival(self, dxl_ids=None):
+        # {dxl_id: (present position, Moving flag)} from one BulkRead of 36-46, also refreshing
+        # present_states; a motor that did not answer is left out
+        self._verify_shadow_due()
+        arrival = {}
+        for dxl_id, data in self.bulk_read(self._ids(dxl_ids), ADDR_MX_PRESENT_POSITION, ARRIVAL_BLOCK_LENGTH).items():
+            position = DXL_MAKEWORD(data[0], data[1])
+            self.present_states[dxl_id] = (position, int(decode_signed(DXL_MAKEWORD(data[2], data[3]))),
+                                           int(decode_signed(DXL_MAKEWORD(data[4], data[5]))))
+            arrival[dxl_id] = (position, bool(data[ADDR_MX_MOVING - ADDR_MX_PRESENT_POSITION]))
+        return arrival
+
+    def wait_stopped(self, dxl_ids=None, timeout=ARRIVAL_TIMEOUT, poll_interval=0.01, goal_positions=None,
+                     threshold=DXL_MOVING_STATUS_THRESHOLD):
+        # Poll the Moving flags until every motor has finished its move: Moving = 0 within
+        # threshold of its goal (goal_positions, default the goals in the shadow). Just after the
+        # goal write the flag can still read 0, so a motor stopped away from its goal (blocked,
+        # torque limited) is only reported as stalled after ARRIVAL_STALL_TIME, as in the arrival
+        # waits. Returns True once all have arrived, False after a stall or on timeout.
+        dxl_ids = list(self._ids(dxl_ids))
+        if goal_positions is None:
+            goal_positions = dict((dxl_id, self.shadow[dxl_id][ADDR_MX_GOAL_POSITION][0]) for dxl_id in dxl_ids
+                                  if ADDR_MX_GOAL_POSITION in self.shadow.get(dxl_id, {}))
+        start = time.monotonic()
+        pending = list(dxl_ids)
+        stopped_since = {}
+        arrived = True
+        while True:
+            now = time.monotonic()
+            arrival = self.read_arrival(pending)
+            for dxl_id in list(pending):
+                if dxl_id not in arrival:
+                    continue
+                position, moving = arrival[dxl_id]
+                if moving:
+                    stopped_since.pop(dxl_id, None)
+                    continue
+                distance = abs(goal_positions.get(dxl_id, position) - position)
+                if distance <= threshold:
+                    pending.remove(dxl_id)
+                    continue
+                stopped_since.setdefault(dxl_id, now)
+                if now - stopped_since[dxl_id] >= ARRIVAL_STALL_TIME:
+                    self.message("[ID:%03d] Stopped at %d, %d from goal %d" % (dxl_id, position, distance, goal_positions[dxl_id]))
+                    pending.remove(dxl_id)
+                    arrived = False
+            if not pending:
+                return arrived
+            if now - start > timeout:
+                self.message("Timed out waiting for Dynamixel(s) %s" % pending)
+                return False
+            time.sleep(poll_interval)
+
+    def wait_arrived(self, dxl_id, goal_position, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        # Present position once the motor is within threshold of goal_position
+        return self.wait_arrived_all({dxl_id: goal_position}, threshold, timeout)[dxl_id]
+
+    def wait_arrived_all(self, goal_positions, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        # Wait until every motor is within threshold of its goal and return {dxl_id: present position}
+        return self._wait_arrivals(goal_positions, threshold, timeout, True)[0]
+
+    def wait_arrived_any(self, goal_positions, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        # Wait until at least one motor is within threshold of its goal and return
+        # {dxl_id: present position} of the motors that have arrived (all of them on timeout)
+        positions, finished = self._wait_arrivals(goal_positions, threshold, timeout, False)
+        return dict((dxl_id, positions[dxl_id]) for dxl_id in goal_positions if dxl_id in finished)
+
+    def _wait_arrivals(self, goal_positions, threshold, timeout, wait_all):
+        # Between polls it sleeps ARRIVAL_SLEEP_FRACTION of the time still needed (by the slowest
+        # motor when waiting for all, the fastest otherwise), predicted from the remaining distance
+        # and the measured (or nominal) speed, so it sleeps through the travel and polls faster as
+        # the motors close in (never slower than ARRIVAL_POLL_MAX). A motor whose Moving flag stays
+        # 0 outside the threshold (blocked, torque limited) counts as finished after ARRIVAL_STALL_TIME.
+        # Returns ({dxl_id: present position}, set of finished IDs).
+        dxl_ids = list(goal_positions)
+        start = last_poll = time.monotonic()
+        positions = {}
+        previous = {}
+        stopped_since = {}
+        stalled = set()
+        while True:
+            now = time.monotonic()
+            arrival = self.read_arrival(dxl_ids)
+            finished = set(stalled)
+            remaining_times = []
+            for dxl_id in dxl_ids:
+                if dxl_id not in arrival or dxl_id in stalled:
+                    continue
+                positions[dxl_id], moving = arrival[dxl_id]
+                distance = abs(goal_positions[dxl_id] - positions[dxl_id])
+                if distance <= threshold:
+                    finished.add(dxl_id)
+                    continue
+                if not moving:
+                    stopped_since.setdefault(dxl_id, now)
+                    if now - stopped_since[dxl_id] >= ARRIVAL_STALL_TIME:
+                        self.message("[ID:%03d] Stopped at %d, %d from goal %d" % (dxl_id, positions[dxl_id], distance, goal_positions[dxl_id]))
+                        stalled.add(dxl_id)
+                        finished.add(dxl_id)
+                        continue
+                else:
+                    stopped_since.pop(dxl_id, None)
+
+                # Measured speed while the servo reports itself moving, the nominal one otherwise
+                speed = self._expected_speed(dxl_id)
+                if dxl_id in previous and moving:
+                    covered = previous[dxl_id] - distance
+                    if covered > threshold:
+                        speed = covered / (now - last_poll)
+                previous[dxl_id] = distance
+                remaining_times.append((distance - threshold) / speed)
+
+            if len(finished) == len(dxl_ids) or (finished and not wait_all):
+                return positions, finished
+            if now - start > timeout:
+                self.message("Timed out waiting for Dynamixel(s) %s" % [dxl_id for dxl_id in dxl_ids if dxl_id not in finished])
+                for dxl_id in dxl_ids:
+                    positions.setdefault(dxl_id, 0)      # Never answered: 0, as read2() returns
+                return positions, set(dxl_ids)
+            last_poll = now
+            remaining_time = (max if wait_all else min)(remaining_times) if remaining_times else 0.0
+            time.sleep(min(ARRIVAL_POLL_MAX, max(ARRIVAL_POLL_MIN, remaining_time * ARRIVAL_SLEEP_FRACTION)))
+
+    def _expected_speed(self, dxl_id):
+        # Nominal speed in ticks/s: the Moving Speed held in the shadow, or the no-load speed
+        entry = self.shadow.get(dxl_id, {}).get(ADDR_MX_MOVING_SPEED)
+        if entry is None or entry[0] == 0:
+            return DXL_NO_LOAD_SPEED
+        return min(entry[0] * SPEED_UNIT_TICKS, DXL_NO_LOAD_SPEED)
+
+    def read_present_positions(self, dxl_ids=None):
+        return {dxl_id: self.read_present_position(dxl_id) for dxl_id in self._ids(dxl_ids)}
+
+    def bulk_read(self, dxl_ids, address, length):
+        # One BulkRead instruction for the same register span of every motor.
+        # Returns {dxl_id: data} of the motors whose status packet arrived.
+        dxl_ids = tuple(dxl_ids)
+        blocks = {}
+
+        key = (dxl_ids, address, length)
+        param = self._bulk_read_params.get(key)
+        if param is None:
+            param = []
+            for dxl_id in dxl_ids:
+                param.extend([length, dxl_id, address])
+            self._bulk_read_params[key] = param
+
+        dxl_comm_result = self.packetHandler.bulkReadTx(self.portHandler, param, len(param))
+        if dxl_comm_result != COMM_SUCCESS:
+            self.message("%s" % self.packetHandler.getTxRxResult(dxl_comm_result))
+            return blocks
+
+        # Status packets come back in the order the IDs were listed
+        for dxl_id in dxl_ids:
+            data, dxl_comm_result, dxl_error = self.packetHandler.readRx(self.portHandler, dxl_id, length)
+            self.check_result(dxl_comm_result, dxl_error)
+            if dxl_comm_result != COMM_SUCCESS:
+                break
+            if len(data) >= length:
+                blocks[dxl_id] = data
+        return blocks
+
+    def read_states(self, dxl_ids=None):
+        # One BulkRead instruction for present position, speed and load of every motor.
+        # Returns an (n, 3) array with one row per ID, columns STATE_POSITION/SPEED/LOAD.
+        # Raw register values; a motor whose status packet is missing reads as zeros.
+        dxl_ids = tuple(self._ids(dxl_ids))
+        states = np.zeros((len(dxl_ids), 3), dtype=np.int32)
+
+        blocks = self.bulk_read(dxl_ids, STATE_START_ADDRESS, STATE_LENGTH)
+        for row, dxl_id in enumerate(dxl_ids):
+            data = blocks.get(dxl_id)
+            if data is None:
+                continue
+            states[row, STATE_POSITION] = DXL_MAKEWORD(data[0], data[1])
+            states[row, STATE_SPEED] = DXL_MAKEWORD(data[2], data[3])
+            states[row, STATE_LOAD] = DXL_MAKEWORD(data[4], data[5])
+
+        return states
+
+    def read_snapshot(self, dxl_ids=None):
+        # Present position, speed, load, voltage and temperature of every motor from one
+        # BulkRead of addresses 36-43, decoded into a SNAPSHOT_DTYPE record per ID
+        self._verify_shadow_due()
+        dxl_ids = tuple(self._ids(dxl_ids))
+        blocks = self.bulk_read(dxl_ids, SNAPSHOT_START_ADDRESS, SNAPSHOT_LENGTH)
+        raw = np.zeros((len(dxl_ids), SNAPSHOT_LENGTH), dtype=np.uint8)
+        for row, dxl_id in enumerate(dxl_ids):
+            if dxl_id in blocks:
+                raw[row] = blocks[dxl_id][:SNAPSHOT_LENGTH]
+        return decode_snapshot(dxl_ids, raw, [dxl_id in blocks for dxl_id in dxl_ids])
+
+    def read_snapshot1(self, dxl_id):
+        # Same record for one motor from a single READ of addresses 36-43
+        data, dxl_comm_result, dxl_error = self.packetHandler.readTxRx(self.portHandler, dxl_id,
+                                                                       SNAPSHOT_START_ADDRESS, SNAPSHOT_LENGTH)
+        ok = self.check_result(dxl_comm_result, dxl_error) and len(data) >= SNAPSHOT_LENGTH
+        raw = data[:SNAPSHOT_LENGTH] if ok else [0] * SNAPSHOT_LENGTH
+        return decode_snapshot([dxl_id], raw, ok)[0]
+
+    def _ids(self, dxl_ids):
+        return self.dxl_ids if dxl_ids is None else dxl_ids
@@ -0,0 +1,362 @@
+# Streaming compressed telemetry log
+#
+# For runs that go on for hours: samples (the TELEMETRY_COLUMNS records of
+# mx64/telemetry.py) are written in chunks of up to CHUNK_RECORDS, each compressed on
+# its own (zstd when the zstandard package is installed, gzip otherwise), so any
+# chunk can be decompressed without the ones before it. Inside a chunk the columns
+# are stored one after another and delta encoded - time against the previous sample,
+# goal/position/load/speed/iteration against the previous sample of the same motor -
+# zigzag mapped (0, -1, 1, -2, ... -> 0, 1, 2, 3, ...) and with the bytes of each value
+# split into planes, so the high bytes of the small deltas are all zero and compress away.
+#
+# File layout (<name>.000.mxlog, <name>.001.mxlog, ... rotating at max_bytes):
+#   b'MX64LOG1', u32 header length, JSON header (schema, codec, clock origin)
+#   per chunk: b'CHNK', u32 records, u32 payload bytes, f64 first time, f64 last time, payload
+# The chunk headers double as the time index: read_log(name, start, end) skips the
+# payload of every chunk outside the window.
+#
+# Opening a recorder on a name that already has parts raises FileExistsError unless
+# overwrite=True, so a re-run cannot delete an earlier recording.
+#
+#   with CompressedRecorder('sweep') as recorder:
+#       recorder.append(iteration, dxl_id, goal_position, present_position, load, speed)
+#   records = read_log('sweep', start, end)      # RECORD_DTYPE array
+#
+# From the command line (times in seconds from the first sample):
+#   python3 -m mx64.compressed_log sweep --start 600 --end 660 --csv minute10.csv
+
+import argparse
+import glob
+import gzip
+import json
+import os
+import struct
+import time
+
+import numpy as np
+
+from .telemetry import RECORD_DTYPE, TELEMETRY_COLUMNS, write_csv
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+LOG_MAGIC = b'MX64LOG1'
+CHUNK_MAGIC = b'CHNK'
+CHUNK_HEADER = struct.Struct('<4sIIdd')
+LOG_EXTENSION = '.mxlog'
+CHUNK_RECORDS = 8192                     # Records per compressed chunk
+CHUNK_INTERVAL = 10.0                    # s; flush() seals a part-filled chunk once it is this old
+ROTATE_BYTES = 64 << 20                  # Start a new part file past this size
+TIME_RESOLUTION = 1e-4                   # s; times are stored as multiples of this
+LOG_VERSION = 2                          # 2: per-motor columns stored at twice their width
+ZSTD_LEVEL = 9
+GZIP_LEVEL = 6
+CODECS = ['zstd', 'gzip']
+MODE_RAW = 0
+MODE_DELTA = 1
+
+# Encoded columns: (name, stored dtype, delta per motor); time deltas run over all samples.
+# Each chunk stores per column whether it holds values or per-motor deltas (MODE_*). A
+# zigzagged delta of an n-bit column needs n + 2 bits (e.g. -32768 to 32767 in the signed
+# load), so the per-motor columns are stored at twice their recorded width; the extra
+# high-byte planes are all zero and compress to almost nothing.
+ENCODED_COLUMNS = [('time', '<u8', False), ('id', 'u1', False), ('iteration', '<u8', True), ('goal', '<u4', True),
+                   ('position', '<u4', True), ('load', '<u4', True), ('speed', '<u4', True)]
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'gzip'
+
+
+def compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+    return gzip.compress(data, GZIP_LEVEL, mtime=0)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        if zstandard is None:
+            raise RuntimeError("This log is zstd compressed; install the zstandard package to read it")
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+def _group_order(ids):
+    # Stable order grouping samples by motor, and the first position of each group in it
+    order = np.argsort(ids, kind='stable')
+    sorted_ids = ids[order]
+    starts = np.flatnonzero(np.r_[True, sorted_ids[1:] != sorted_ids[:-1]])
+    return order, starts
+
+
+def zigzag(values):
+    return (values << 1) ^ (values >> 63)
+
+
+def unzigzag(values):
+    return (values >> 1) ^ -(values & 1)
+
+
+def encode_chunk(records, codec):
+    # RECORD_DTYPE records to (first time, last time, compressed payload)
+    first_time = float(records['time'][0])
+    ticks = np.rint((records['time'] - first_time) / TIME_RESOLUTION).astype(np.int64)
+    order, starts = _group_order(records['id'])
+    modes = bytearray()
+    planes = []
+    for name, dtype, per_motor in ENCODED_COLUMNS:
+        mode = MODE_RAW
+        if name == 'time':
+            values = zigzag(np.diff(ticks, prepend=0))
+        elif name == 'id':
+            values = records['id']
+        else:
+            grouped = records[name].astype(np.int64)[order]
+            deltas = np.diff(grouped, prepend=0)
+            deltas[starts] = grouped[starts]                 # Each motor's first sample is stored whole
+            values = zigzag(grouped)
+            # Deltas unless the column is noise around a fixed level (speed, load at rest)
+            if zigzag(deltas).sum() < values.sum():
+                values = zigzag(deltas)
+                mode = MODE_DELTA
+        modes.append(mode)
+        values = np.ascontiguousarray(values.astype(dtype))
+        # Byte planes: all low bytes, then all next bytes, ...
+        planes.append(values.view(np.uint8).reshape(len(values), -1).T.tobytes())
+    return first_time, float(records['time'][-1]), compress(codec, bytes(modes) + b''.join(planes))
+
+
+def decode_chunk(payload, count, first_time, codec):
+    data = decompress(codec, payload)
+    records = np.zeros(count, dtype=RECORD_DTYPE)
+    modes = data[:len(ENCODED_COLUMNS)]
+    columns = {}
+    offset = len(ENCODED_COLUMNS)
+    for name, dtype, per_motor in ENCODED_COLUMNS:
+        itemsize = np.dtype(dtype).itemsize
+        plane = np.frombuffer(data, dtype=np.uint8, count=count * itemsize, offset=offset)
+        columns[name] = np.ascontiguousarray(plane.reshape(itemsize, count).T).view(dtype).reshape(count)
+        offset += count * itemsize
+
+    records['time'] = first_time + np.cumsum(unzigzag(columns['time'].astype(np.int64))) * TIME_RESOLUTION
+    records['id'] = columns['id']
+    order, starts = _group_order(columns['id'])
+    lengths = np.diff(np.r_[starts, count])
+    for mode, (name, dtype, per_motor) in zip(modes, ENCODED_COLUMNS):
+        if not per_motor:
+            continue
+        grouped = unzigzag(columns[name].astype(np.int64))
+        if mode == MODE_DELTA:
+            grouped = np.cumsum(grouped)
+            grouped -= np.repeat(np.r_[0, grouped[starts[1:] - 1]], lengths)     # Restart the sum at each motor
+        values = np.empty(count, dtype=np.int64)
+        values[order] = grouped
+        records[name] = values
+    return records
+
+
+class CompressedRecorder(object):
+    # Same append()/append_many()/flush()/close() interface as TelemetryRecorder
+
+    def __init__(self, path, codec=None, chunk_records=CHUNK_RECORDS, chunk_interval=CHUNK_INTERVAL,
+                 max_bytes=ROTATE_BYTES, message=print, overwrite=False):
+        # An existing recording of the same name is only replaced with overwrite=True
+        stale = log_parts(path)
+        if stale and not overwrite:
+            raise FileExistsError("%s already exists; pick a new name or pass overwrite=True" % stale[0])
+        self.path = path
+        self.message = message           # Where log() lines go, e.g. a StatusDisplay's message()
+        self.codec = default_codec() if codec is None else codec
+        if self.codec not in CODECS:
+            raise ValueError("Unknown codec %r, expected one of %s" % (self.codec, CODECS))
+        if self.codec == 'zstd' and zstandard is None:
+            raise RuntimeError("zstd needs the zstandard package (pip install zstandard), or use codec='gzip'")
+        self.chunk_records = chunk_records
+        self.chunk_interval = chunk_interval
+        self.max_bytes = max_bytes
+        self.header = {
+            'version': LOG_VERSION,
+            'columns': TELEMETRY_COLUMNS,
+            'codec': self.codec,
+            'time_resolution': TIME_RESOLUTION,
+            'started_monotonic': time.monotonic(),
+            'started_wall': time.time(),
+        }
+
+        self.count = 0
+        self.chunks = 0
+        self.raw_bytes = 0
+        self.parts = []
+        self._pending = np.zeros(chunk_records, dtype=RECORD_DTYPE)
+        self._filled = 0
+        self._chunk_started = None
+        self._file = None
+        for part in stale:
+            os.remove(part)
+        self._open_part()
+
+    def _open_part(self):
+        if self._file is not None:
+            self._file.close()
+        part = '%s.%03d%s' % (self.path, len(self.parts), LOG_EXTENSION)
+        header = json.dumps(self.header).encode()
+        self._file = open(part, 'xb')                    # 'x': never write over a part another run has just created
+        self._file.write(LOG_MAGIC + struct.pack('<I', len(header)) + header)
+        self.parts.append(part)
+
+    def log(self, line):
+        self.message(line)
+
+    def append(self, iteration, dxl_id, goal_position, present_position, load=0, speed=0, timestamp=None):
+        if not self._filled:
+            self._chunk_started = time.monotonic()
+        self._pending[self._filled] = (time.monotonic() if timestamp is None else timestamp,
+                                       iteration, dxl_id, goal_position, present_position, load, speed)
+        self._filled += 1
+        self.count += 1
+        if self._filled == self.chunk_records:
+            self._write_chunk()
+
+    def append_many(self, records):
+        start = 0
+        while start < len(records):
+            take = min(len(records) - start, self.chunk_records - self._filled)
+            if not self._filled:
+                self._chunk_started = time.monotonic()
+            self._pending[self._filled:self._filled + take] = records[start:start + take]
+            self._filled += take
+            self.count += take
+            start += take
+            if self._filled == self.chunk_records:
+                self._write_chunk()
+
+    def _write_chunk(self):
+        if not self._filled:
+            return
+        records = self._pending[:self._filled]
+        first_time, last_time, payload = encode_chunk(records, self.codec)
+        self._file.write(CHUNK_HEADER.pack(CHUNK_MAGIC, len(records), len(payload), first_time, last_time) + payload)
+        self.raw_bytes += records.nbytes
+        self.chunks += 1
+        self._filled = 0
+        if self._file.tell() >= self.max_bytes:
+            self._open_part()
+
+    def flush(self):
+        # Hand the written chunks to the OS. A part-filled chunk is sealed only once it is
+        # chunk_interval old, so frequent flushes (BackgroundRecorder) do not shrink chunks
+        # and hurt the compression; at most chunk_interval of samples is lost in a crash.
+        if self._filled and time.monotonic() - self._chunk_started >= self.chunk_interval:
+            self._write_chunk()
+        self._file.flush()
+
+    def close(self):
+        if self._file is None:
+            return
+        self._write_chunk()
+        self._file.close()
+        self._file = None
+
+    def stats(self):
+        written = sum(os.path.getsize(part) for part in self.parts if os.path.exists(part))
+        return {'records': self.count, 'chunks': self.chunks, 'parts': len(self.parts), 'bytes': written,
+                'bytes_per_record': written / float(max(self.count - self._filled, 1))}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def log_parts(path):
+    # Part files of a recording, in order
+    return sorted(glob.glob(glob.escape(path) + '.[0-9][0-9][0-9]' + LOG_EXTENSION))
+
+
+def read_log_header(part):
+    with open(part, 'rb') as log_file:
+        return _read_header(log_file)
+
+
+def _read_header(log_file):
+    if log_file.read(len(LOG_MAGIC)) != LOG_MAGIC:
+        raise ValueError("%s is not an MX-64 log" % log_file.name)
+    length, = struct.unpack('<I', log_file.read(4))
+    header = json.loads(log_file.read(length).decode())
+    if header.get('version') != LOG_VERSION:
+        raise ValueError("%s is a version %s log, this reader handles version %d"
+                         % (log_file.name, header.get('version'), LOG_VERSION))
+    return header
+
+
+def read_index(path):
+    # [(part, payload offset, records, payload bytes, first time, last time)] from the chunk
+    # headers alone; a chunk cut short by a crash ends the part
+    index = []
+    for part in log_parts(path):
+        with open(part, 'rb') as log_file:
+            _read_header(log_file)
+            while True:
+                raw = log_file.read(CHUNK_HEADER.size)
+                if len(raw) < CHUNK_HEADER.size:
+                    break
+                magic, count, length, first_time, last_time = CHUNK_HEADER.unpack(raw)
+                if magic != CHUNK_MAGIC:
+                    break
+                offset = log_file.tell()
+                log_file.seek(length, os.SEEK_CUR)
+                if log_file.tell() > os.path.getsize(part):
+                    break
+                index.append((part, offset, count, length, first_time, last_time))
+    return index
+
+
+def read_log(path, start=None, end=None):
+    # Records with start <= time <= end (monotonic seconds, None for open ends), decompressing
+    # only the chunks that overlap the window
+    chunks = []
+    codecs = {}
+    for part, offset, count, length, first_time, last_time in read_index(path):
+        if (start is not None and last_time < start) or (end is not None and first_time > end):
+            continue
+        if part not in codecs:
+            codecs[part] = read_log_header(part)['codec']
+        with open(part, 'rb') as log_file:
+            log_file.seek(offset)
+            records = decode_chunk(log_file.read(length), count, first_time, codecs[part])
+        keep = np.ones(count, dtype=bool)
+        if start is not None:
+            keep &= records['time'] >= start - TIME_RESOLUTION / 2
+        if end is not None:
+            keep &= records['time'] <= end + TIME_RESOLUTION / 2
+        chunks.append(records[keep])
+    return np.concatenate(chunks) if chunks else np.zeros(0, dtype=RECORD_DTYPE)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Summarise or export a compressed MX-64 log")
+    parser.add_argument('log', help="recording name, without the .NNN.mxlog suffix")
+    parser.add_argument('--start', type=float, help="seconds from the first sample")
+    parser.add_argument('--end', type=float, help="seconds from the first sample")
+    parser.add_argument('--csv', help="write the records in the window to this CSV file")
+    args = parser.parse_args(argv)
+
+    parts = log_parts(args.log)
+    if not parts:
+        parser.error("no %s.NNN%s files" % (args.log, LOG_EXTENSION))
+    index = read_index(args.log)
+    origin = index[0][4] if index else 0.0
+    print("%d part(s), %d chunk(s), %d records, %d bytes" % (len(parts), len(index), sum(entry[2] for entry in index),
+                                                              sum(os.path.getsize(part) for part in parts)))
+    if args.csv:
+        records = read_log(args.log, None if args.start is None else origin + args.start,
+                           None if args.end is None else origin + args.end)
+        print("%d records written to %s" % (write_csv(records, args.csv), args.csv))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+# Deadline-scheduled control loop
+#
+# Ticks fire at absolute deadlines start + k * period on the monotonic clock, so
+# the sample rate does not drift with how long each tick's bus traffic, logging or
+# printing takes. When a tick overruns past later deadlines the loop either skips
+# them ('skip': counted as missed, the schedule keeps its phase) or restarts the
+# schedule from now ('resync': nothing is dropped, e.g. for streamed goal frames).
+#
+# The loop can pin the thread running it (the one doing the bus I/O) to one CPU and
+# ask for SCHED_FIFO real-time priority. SCHED_FIFO needs root, CAP_SYS_NICE or an
+# rtprio limit (/etc/security/limits.conf); without it the loop warns and runs at
+# normal priority. Both are undone when run() returns.
+#
+# Timing statistics are kept as running sums and a fixed lateness histogram
+# (LATENESS_BINS bins of LATENESS_BIN_MS), so a loop can run for days in constant
+# memory; each run() starts them afresh.
+#
+#   loop = ControlLoop(rate=100, cpu=2, realtime_priority=50)
+#   loop.run(tick)               # tick(index) once per period, return True to stop
+#   print(loop.report())
+
+import math
+import os
+import time
+
+import numpy as np
+
+SPIN_MARGIN = 0.0005                     # s before a deadline where sleeping stops and the loop spins
+OVERRUN_POLICIES = ['skip', 'resync']
+LATENESS_BIN_MS = 0.01                   # Jitter percentile resolution
+LATENESS_BINS = 10000                    # Histogram span LATENESS_BINS * LATENESS_BIN_MS; later ticks go in the last bin
+
+
+class ControlLoop(object):
+
+    def __init__(self, rate, cpu=None, realtime_priority=None, overrun='skip', spin_margin=SPIN_MARGIN, message=print):
+        if overrun not in OVERRUN_POLICIES:
+            raise ValueError("Unknown overrun policy %r, expected one of %s" % (overrun, OVERRUN_POLICIES))
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.cpu = cpu
+        self.realtime_priority = realtime_priority
+        self.overrun = overrun
+        self.spin_margin = spin_margin
+        self.message = message           # Where the CPU/priority warnings go
+
+        self._reset()
+
+    def _reset(self):
+        self.ticks = 0
+        self.first_tick = None           # monotonic time of the first and latest tick
+        self.last_tick = None
+        self.period_sum = 0.0            # s, sum and sum of squares of the tick-to-tick periods
+        self.period_sum_sq = 0.0
+        self.max_lateness = 0.0          # s a tick started after its deadline
+        self.lateness_histogram = np.zeros(LATENESS_BINS, dtype=np.int64)
+        self.missed = 0                  # deadlines skipped ('skip') or schedule restarts ('resync')
+
+    # Thread placement
+
+    def _apply(self):
+        # Pin and raise the calling thread, returning what to restore afterwards
+        saved = {}
+        if self.cpu is not None:
+            try:
+                saved['affinity'] = os.sched_getaffinity(0)
+                os.sched_setaffinity(0, {self.cpu})
+            except (AttributeError, OSError) as error:
+                self.message("Could not pin the control loop to CPU %d: %s" % (self.cpu, error))
+        if self.realtime_priority is not None:
+            try:
+                saved['scheduler'] = (os.sched_getscheduler(0), os.sched_getparam(0))
+                os.sched_setscheduler(0, os.SCHED_FIFO, os.sched_param(self.realtime_priority))
+            except (AttributeError, OSError) as error:
+                saved.pop('scheduler', None)
+                self.message("Could not set SCHED_FIFO priority %d, running at normal priority: %s" % (self.realtime_priority, error))
+        return saved
+
+    def _restore(self, saved):
+        if 'scheduler' in saved:
+            policy, param = saved['scheduler']
+            os.sched_setscheduler(0, policy, param)
+        if 'affinity' in saved:
+            os.sched_setaffinity(0, saved['affinity'])
+
+    # Loop
+
+    def run(self, tick, ticks=None):
+        # Call tick(index) once per period, ticks times or until it returns True. Returns stats().
+        self._reset()
+        saved = self._apply()
+        try:
+            period = self.period
+            start = time.monotonic()
+            deadline_index = 0
+            index = 0
+            while ticks is None or index < ticks:
+                deadline = start + deadline_index * period
+                now = time.monotonic()
+                if deadline - now > self.spin_margin:
+                    time.sleep(deadline - now - self.spin_margin)
+                while time.monotonic() < deadline:
+                    pass
+                now = time.monotonic()
+
+                lateness = now - deadline
+                if lateness >= period:
+                    self.missed += 1 if self.overrun == 'resync' else int(lateness // period)
+                    if self.overrun == 'resync':
+                        start += lateness
+                    else:
+                        deadline_index += int(lateness // period)
+                        lateness -= int(lateness // period) * period
+
+                self._record(now, lateness)
+                if tick(index):
+                    break
+                index += 1
+                deadline_index += 1
+        finally:
+            self._restore(saved)
+        return self.stats()
+
+    # Statistics
+
+    def _record(self, now, lateness):
+        if self.last_tick is None:
+            self.first_tick = now
+        else:
+            period = now - self.last_tick
+            self.period_sum += period
+            self.period_sum_sq += period * period
+        self.last_tick = now
+        self.ticks += 1
+        self.max_lateness = max(self.max_lateness, lateness)
+        self.lateness_histogram[min(int(lateness * 1000.0 / LATENESS_BIN_MS), LATENESS_BINS - 1)] += 1
+
+    def lateness_percentile(self, percent):
+        # Upper edge of the histogram bin holding the percentile, in ms (never above the maximum)
+        if not self.ticks:
+            return 0.0
+        count = np.cumsum(self.lateness_histogram)
+        index = int(np.searchsorted(count, percent / 100.0 * self.ticks))
+        return min((index + 1) * LATENESS_BIN_MS, self.max_lateness * 1000.0)
+
+    def stats(self):
+        # Tick period and jitter (lateness of a tick against its deadline) in ms, of the last run()
+        periods = self.ticks - 1
+        period = self.period_sum / periods if periods > 0 else 0.0
+        variance = self.period_sum_sq / periods - period * period if periods > 0 else 0.0
+        return {
+            'ticks': self.ticks,
+            'rate': self.rate,
+            'duration_s': self.last_tick - self.first_tick if self.ticks else 0.0,
+            'period_ms': period * 1000.0,
+            'period_std_ms': math.sqrt(max(variance, 0.0)) * 1000.0,
+            'jitter_p50_ms': self.lateness_percentile(50),
+            'jitter_p90_ms': self.lateness_percentile(90),
+            'jitter_p99_ms': self.lateness_percentile(99),
+            'max_lateness_ms': self.max_lateness * 1000.0,
+            'missed': self.missed,
+        }
+
+    def report(self):
+        stats = self.stats()
+        return ("%d ticks at %g Hz: period %.3f ms (std %.3f), jitter p50 %.3f / p90 %.3f / p99 %.3f / max %.3f ms, %d missed"
+                % (stats['ticks'], stats['rate'], stats['period_ms'], stats['period_std_ms'], stats['jitter_p50_ms'],
+                   stats['jitter_p90_ms'], stats['jitter_p99_ms'], stats['max_lateness_ms'], stats['missed']))
@@ -0,0 +1,63 @@
+# MX-64 (Protocol 1.0) control table
+# See the e-manual: https://emanual.robotis.com/docs/en/dxl/mx/mx-64/
+
+# EEPROM area
+ADDR_MX_MODEL_NUMBER = 0
+ADDR_MX_FIRMWARE_VERSION = 2
+ADDR_MX_ID = 3
+ADDR_MX_BAUD_RATE = 4
+ADDR_MX_RETURN_DELAY_TIME = 5
+ADDR_MX_CW_ANGLE_LIMIT = 6
+ADDR_MX_CCW_ANGLE_LIMIT = 8
+ADDR_MX_TEMPERATURE_LIMIT = 11
+ADDR_MX_MIN_VOLTAGE_LIMIT = 12
+ADDR_MX_MAX_VOLTAGE_LIMIT = 13
+ADDR_MX_TORQUE_MAX = 14                  # Max Torque, default for Torque Limit at power on
+ADDR_MX_STATUS_RETURN_LEVEL = 16
+ADDR_MX_ALARM_LED = 17
+ADDR_MX_SHUTDOWN = 18
+
+# RAM area
+ADDR_MX_TORQUE_ENABLE = 24
+ADDR_MX_LED = 25
+ADDR_MX_D_GAIN = 26
+ADDR_MX_I_GAIN = 27
+ADDR_MX_P_GAIN = 28
+ADDR_MX_GOAL_POSITION = 30
+ADDR_MX_MOVING_SPEED = 32
+ADDR_MX_TORQUE_LIMIT = 34
+ADDR_MX_PRESENT_POSITION = 36
+ADDR_MX_PRESENT_SPEED = 38
+ADDR_MX_PRESENT_LOAD = 40
+ADDR_MX_PRESENT_VOLTAGE = 42
+ADDR_MX_PRESENT_TEMPERATURE = 43
+ADDR_MX_REGISTERED = 44
+ADDR_MX_MOVING = 46
+ADDR_MX_LOCK = 47
+ADDR_MX_PUNCH = 48
+ADDR_MX_GOAL_ACCELERATION = 73
+
+# Data Byte Length
+LEN_MX_GOAL_POSITION = 2
+LEN_MX_MOVING_SPEED = 2
+LEN_MX_TORQUE_LIMIT = 2
+LEN_MX_PRESENT_POSITION = 2
+LEN_MX_PRESENT_SPEED = 2
+LEN_MX_PRESENT_LOAD = 2
+LEN_MX_PRESENT_VOLTAGE = 1
+LEN_MX_PRESENT_TEMPERATURE = 1
+LEN_MX_MOVING = 1
+
+# Values
+MX64_MODEL_NUMBER = 310                  # 0x0136
+TORQUE_ENABLE = 1                        # Value for enabling the torque
+TORQUE_DISABLE = 0                       # Value for disabling the torque
+STATUS_RETURN_PING_ONLY = 0              # Status Return Level: reply to PING only
+STATUS_RETURN_READ = 1                   # reply to PING and READ only
+STATUS_RETURN_ALL = 2                    # reply to every instruction (factory default)
+DXL_MAX_POSITION = 4095                  # 0.088 degree per tick
+DXL_MAX_TORQUE_VALUE = 1023              # 0-1023 for Max Torque / Torque Limit
+DXL_MAX_MOVING_SPEED = 1023              # Moving Speed 1-1023; 0 = no limit (fastest)
+SPEED_UNIT_TICKS = 0.114 * 4096 / 60.0   # Moving/present speed unit (0.114 rpm) in position ticks per second
+DXL_NO_LOAD_SPEED = 63 * 4096 / 60.0     # 63 rpm at 12 V in position ticks per second
+DXL_DIRECTION_BIT = 0x400                # Present speed/load: bit 10 set = CW, bits 0-9 = magnitude
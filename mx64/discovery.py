@@ -0,0 +1,191 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Bus discovery and high-baud negotiation
+#
+# At startup MX64Bus(..., baudrate=None) calls discover(): it tries the rate cached
+# for this serial adapter first and only scans the candidate rates when the cached
+# servos stop answering. From the command line the scan covers every ID and can
+# move the whole bus to the fastest rate that passes an error-rate test:
+#
+#   python3 -m mx64.discovery                    # scan and cache
+#   python3 -m mx64.discovery --migrate          # also move to the fastest reliable rate
+#
+# The cache lives in ~/.cache/mx64/bus_cache.json (MX64_CACHE_DIR overrides the folder).
+
+import argparse
+import glob
+import json
+import os
+import time
+
+from dynamixel_sdk import COMM_SUCCESS, MAX_ID
+
+from .bus import DEVICENAME, DXL_IDS, MX_BAUDRATES, MX64Bus
+from .control_table import *
+from .sim import SIM_PREFIX, is_simulated
+
+# Scan order: the factory/common rates first, then the rest
+SCAN_BAUDRATES = [1000000, 57600] + [b for b in MX_BAUDRATES if b not in (1000000, 57600)]
+# Fastest first; MX also supports 2.25 Mbps but the SDK PortHandler cannot open it
+MIGRATION_BAUDRATES = [3000000, 2500000, 2000000, 1000000]
+ERROR_TEST_TRANSACTIONS = 500
+MAX_ERROR_RATE = 0.001
+
+
+def cache_path():
+    cache_dir = os.environ.get('MX64_CACHE_DIR', os.path.join(os.path.expanduser('~'), '.cache', 'mx64'))
+    return os.path.join(cache_dir, 'bus_cache.json')
+
+
+def adapter_key(device_name):
+    # Identify the adapter, not the tty name: /dev/ttyUSB0 can be a different
+    # adapter after a replug, while /dev/serial/by-id/ carries its serial number.
+    # A simulated port gets its own sim:// entry, so MX64_SIM=1 runs never touch the real one.
+    if is_simulated(device_name):
+        return device_name if device_name.startswith(SIM_PREFIX) else SIM_PREFIX + device_name
+    real = os.path.realpath(device_name)
+    for link in sorted(glob.glob('/dev/serial/by-id/*')):
+        if os.path.realpath(link) == real:
+            return link
+    return real if os.path.exists(real) else device_name
+
+
+def load_cache():
+    try:
+        with open(cache_path()) as f:
+            return json.load(f)
+    except (IOError, OSError, ValueError):
+        return {}
+
+
+def save_cache_entry(device_name, entry):
+    cache = load_cache()
+    cache[adapter_key(device_name)] = entry
+    path = cache_path()
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def ping_ids(bus, dxl_ids):
+    # {dxl_id: model_number} of every ID that answers a PING at the port's current rate
+    found = {}
+    for dxl_id in dxl_ids:
+        model_number, dxl_comm_result, dxl_error = bus.packetHandler.ping(bus.portHandler, dxl_id)
+        if dxl_comm_result == COMM_SUCCESS:
+            found[dxl_id] = model_number
+    return found
+
+
+def scan(bus, baudrates=SCAN_BAUDRATES, probe_ids=None, scan_ids=None):
+    # Find the rate the bus runs at: try probe_ids at each candidate rate and stop at
+    # the first rate where one answers, then ping scan_ids (default: the probe IDs).
+    probe_ids = list(probe_ids or bus.dxl_ids)
+    for baudrate in baudrates:
+        if not bus.portHandler.setBaudRate(baudrate):
+            continue
+        bus.baudrate = baudrate
+        if not any(bus.packetHandler.ping(bus.portHandler, dxl_id)[1] == COMM_SUCCESS for dxl_id in probe_ids):
+            continue
+        found = ping_ids(bus, scan_ids if scan_ids is not None else probe_ids)
+        bus.message("Found %d Dynamixel(s) at %d bps" % (len(found), baudrate))
+        return baudrate, found
+    return None, {}
+
+
+def error_rate(bus, dxl_ids, transactions=ERROR_TEST_TRANSACTIONS):
+    # Fraction of failed or corrupt present-position reads at the current rate
+    failures = 0
+    for i in range(transactions):
+        dxl_id = dxl_ids[i % len(dxl_ids)]
+        _, dxl_comm_result, dxl_error = bus.packetHandler.read2ByteTxRx(bus.portHandler, dxl_id,
+                                                                         ADDR_MX_PRESENT_POSITION)
+        if dxl_comm_result != COMM_SUCCESS:
+            failures += 1
+    return failures / float(transactions)
+
+
+def migrate(bus, dxl_ids, baudrates=MIGRATION_BAUDRATES, max_error_rate=MAX_ERROR_RATE):
+    # Move every servo to the fastest candidate rate whose error rate stays below
+    # max_error_rate; a rate that fails the test is rolled back before trying the next.
+    # Returns (baudrate, measured error rate).
+    for baudrate in baudrates:
+        if baudrate == bus.baudrate:
+            rate = error_rate(bus, dxl_ids)
+            if rate <= max_error_rate:
+                return baudrate, rate
+            continue
+
+        previous = bus.baudrate
+        bus.message("Trying %d bps" % baudrate)
+        if not bus.set_baudrate_all(baudrate, dxl_ids):
+            continue
+        missing = [dxl_id for dxl_id in dxl_ids if dxl_id not in ping_ids(bus, dxl_ids)]
+        rate = 1.0 if missing else error_rate(bus, dxl_ids)
+        bus.message("  error rate %.4f%s" % (rate, " (no reply from %s)" % missing if missing else ""))
+        if rate <= max_error_rate:
+            return baudrate, rate
+
+        # Roll back: the writes still reach servos that cannot answer reliably at this rate
+        bus.set_baudrate_all(previous, dxl_ids)
+    return bus.baudrate, error_rate(bus, dxl_ids)
+
+
+def discover(bus, use_cache=True):
+    # Set bus.portHandler to the rate the servos run at. Returns {dxl_id: model_number}
+    # of the configured IDs that answered, or {} if nothing was found.
+    entry = load_cache().get(adapter_key(bus.device_name)) if use_cache else None
+    if entry and bus.portHandler.setBaudRate(entry['baudrate']):
+        bus.baudrate = entry['baudrate']
+        found = ping_ids(bus, bus.dxl_ids)
+        if found:
+            return found
+
+    baudrate, found = scan(bus)
+    if baudrate is None:
+        return {}
+    save_cache_entry(bus.device_name, {
+        'baudrate': baudrate,
+        'ids': {str(dxl_id): model for dxl_id, model in found.items()},
+        'scanned': time.strftime('%Y-%m-%dT%H:%M:%S'),
+    })
+    return found
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Discover MX-64 servos and negotiate the bus baud rate")
+    parser.add_argument('--device', default=DEVICENAME)
+    parser.add_argument('--ids', default=','.join(str(i) for i in DXL_IDS), help="IDs used to find the rate")
+    parser.add_argument('--full', action='store_true', help="ping every ID 0-%d once the rate is known" % MAX_ID)
+    parser.add_argument('--migrate', action='store_true', help="move the bus to the fastest reliable rate")
+    args = parser.parse_args(argv)
+
+    bus = MX64Bus(args.device, SCAN_BAUDRATES[0], [int(i) for i in args.ids.split(',')])
+    if not bus.portHandler.openPort():
+        print("Failed to open the port")
+        quit()
+
+    try:
+        baudrate, found = scan(bus, scan_ids=range(MAX_ID + 1) if args.full else None)
+        if baudrate is None:
+            print("No Dynamixel found on %s" % args.device)
+            return
+        for dxl_id, model_number in sorted(found.items()):
+            print("[ID:%03d] model %d%s" % (dxl_id, model_number, "" if model_number == MX64_MODEL_NUMBER else " (not MX-64)"))
+
+        entry = {'baudrate': baudrate, 'ids': {str(dxl_id): model for dxl_id, model in found.items()}}
+        if args.migrate:
+            baudrate, rate = migrate(bus, sorted(found))
+            print("Bus running at %d bps, error rate %.4f" % (baudrate, rate))
+            entry.update(baudrate=baudrate, error_rate=rate)
+        entry['scanned'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        save_cache_entry(args.device, entry)
+        print("Cached for %s in %s" % (adapter_key(args.device), cache_path()))
+    finally:
+        bus.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+# USB-serial latency timer check and tuning (Linux)
+#
+# FTDI adapters hold received bytes for up to 'latency_timer' ms (16 by default)
+# before handing them to the host, so every status packet costs at least that
+# much. The timer is exposed per tty in sysfs; writing it needs root or a udev
+# rule such as
+#   ACTION=="add", SUBSYSTEM=="usb-serial", DRIVERS=="ftdi_sio", ATTR{latency_timer}="1"
+# Without write access the ASYNC_LOW_LATENCY serial flag is tried instead, which the
+# ftdi_sio driver maps to a 1 ms timer.
+
+import os
+import time
+
+import numpy as np
+from dynamixel_sdk import COMM_SUCCESS
+
+from .control_table import *
+
+LATENCY_TIMER_TARGET = 1                 # ms
+ROUND_TRIP_SAMPLES = 20
+ROUND_TRIP_WARNING_MS = 5.0
+
+
+def latency_timer_path(device_name):
+    tty = os.path.basename(os.path.realpath(device_name))
+    return os.path.join('/sys/bus/usb-serial/devices', tty, 'latency_timer')
+
+
+def read_latency_timer(device_name):
+    # Latency timer in ms, or None when the device has none (not a USB-serial adapter)
+    try:
+        with open(latency_timer_path(device_name)) as f:
+            return int(f.read().strip())
+    except (IOError, OSError, ValueError):
+        return None
+
+
+def tune_latency_timer(device_name, port_handler=None, target=LATENCY_TIMER_TARGET, message=print):
+    # Lower the latency timer to target if it is above it. Returns the value in effect.
+    current = read_latency_timer(device_name)
+    if current is None or current <= target:
+        return current
+
+    try:
+        with open(latency_timer_path(device_name), 'w') as f:
+            f.write('%d\n' % target)
+    except (IOError, OSError):
+        ser = getattr(port_handler, 'ser', None)
+        if ser is not None and hasattr(ser, 'set_low_latency_mode'):
+            try:
+                ser.set_low_latency_mode(True)
+            except (IOError, OSError, ValueError):
+                pass
+
+    tuned = read_latency_timer(device_name)
+    if tuned is not None and tuned > target:
+        message("Warning: %s latency timer is %d ms, lower it with" % (device_name, tuned))
+        message("  echo %d | sudo tee %s" % (target, latency_timer_path(device_name)))
+    return tuned
+
+
+def measure_round_trip(bus, dxl_id, samples=ROUND_TRIP_SAMPLES):
+    # Median read2ByteTxRx round trip in ms, or None if the motor does not answer
+    times = []
+    for _ in range(samples):
+        t0 = time.perf_counter()
+        _, dxl_comm_result, _ = bus.packetHandler.read2ByteTxRx(bus.portHandler, dxl_id, ADDR_MX_PRESENT_POSITION)
+        if dxl_comm_result == COMM_SUCCESS:
+            times.append(time.perf_counter() - t0)
+    if not times:
+        return None
+    return float(np.median(times) * 1000.0)
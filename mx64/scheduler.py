@@ -0,0 +1,112 @@
+# Independent per-motor sweeps run together
+#
+# A sweep is one motor's goal sequence, each goal held until the motor is within
+# the threshold before the next is sent (move_motor() in the loop scripts). When
+# several motors sweep independently of each other, run_sweeps() moves them all at
+# once: a motor gets its next goal as soon as it reaches its current one, goals that
+# become due together go out as one SyncWrite, and one BulkRead per poll watches
+# every motor still moving. Each motor's arrivals are reported in its own order,
+# so its goal/present log is the same as when the sweeps run one after another.
+#
+#   sweeps = {dxl_id: sweep_steps(dxl_id, 2048, 2557, 5) for dxl_id in (2, 4, 6)}
+#   run_sweeps(bus, sweeps, on_arrival=lambda dxl_id, label, goal, present: ...)
+#
+# Grids (main motor steps x secondary sweeps) are planned by plan_grid(). In 'naive'
+# order every secondary sweep returns home before the next main step, collecting
+# nothing on the way back. In 'serpentine' (boustrophedon) order the secondaries
+# sweep back through the same goals on the next main step instead, so the same grid
+# points are sampled with the return travel left out. estimate_grid_time() compares
+# the two.
+
+from .bus import ARRIVAL_TIMEOUT, DXL_MOVING_STATUS_THRESHOLD
+from .control_table import DXL_NO_LOAD_SPEED
+
+SWEEP_ORDERS = ['naive', 'serpentine']
+GOAL_OVERHEAD = 0.012                    # s per goal on top of the travel: SyncWrite, arrival polls, settling
+
+
+def sweep_steps(dxl_id, start_position, end_position, step_size):
+    # move_motor()'s goals as (label, goal) pairs: start to end inclusive, then back to start
+    return ([('GoalPos', goal_position) for goal_position in sweep_goals(start_position, end_position, step_size)]
+            + [('ResetPos', start_position)])
+
+
+def sweep_goals(start_position, end_position, step_size):
+    # Goal positions of one sweep, start to end inclusive (the goals compile_sweep() builds frames for)
+    stop = end_position + (1 if step_size > 0 else -1)
+    return list(range(start_position, stop, step_size))
+
+
+def plan_grid(main_goals, secondary_goals, home_positions, order='serpentine'):
+    # main_goals: the main motor's goals; secondary_goals: {dxl_id: [goal, ...]} swept at
+    # every main goal; home_positions: {dxl_id: position} the secondaries start and end at.
+    # Returns (rows, finish): rows is [(main_goal, sweeps)] with sweeps as for run_sweeps(),
+    # finish the sweeps that bring the secondaries home after the last row ({} if none).
+    if order not in SWEEP_ORDERS:
+        raise ValueError("Unknown sweep order %r, expected one of %s" % (order, SWEEP_ORDERS))
+    rows = []
+    for index, main_goal in enumerate(main_goals):
+        sweeps = {}
+        for dxl_id, goals in secondary_goals.items():
+            if order == 'naive':
+                sweeps[dxl_id] = [('GoalPos', goal) for goal in goals] + [('ResetPos', home_positions[dxl_id])]
+            else:
+                sweeps[dxl_id] = [('GoalPos', goal) for goal in (goals if index % 2 == 0 else goals[::-1])]
+        rows.append((main_goal, sweeps))
+
+    finish = {}
+    for dxl_id in secondary_goals:
+        last = rows[-1][1][dxl_id][-1][1] if rows else home_positions[dxl_id]
+        if last != home_positions[dxl_id]:
+            finish[dxl_id] = [('ResetPos', home_positions[dxl_id])]
+    return rows, finish
+
+
+def sweeps_time(sweeps, positions, speed=DXL_NO_LOAD_SPEED, overhead=GOAL_OVERHEAD):
+    # Estimated time of run_sweeps(sweeps) from {dxl_id: position}: the longest motor's
+    # travel plus GOAL_OVERHEAD per goal. Updates positions to where the sweeps end.
+    longest = 0.0
+    for dxl_id, steps in sweeps.items():
+        duration = 0.0
+        for label, goal_position in steps:
+            duration += abs(goal_position - positions[dxl_id]) / float(speed) + overhead
+            positions[dxl_id] = goal_position
+        longest = max(longest, duration)
+    return longest
+
+
+def estimate_grid_time(main_id, rows, finish, start_positions, speed=DXL_NO_LOAD_SPEED, overhead=GOAL_OVERHEAD):
+    # Estimated duration in seconds of a plan_grid() plan run from {dxl_id: position}, the
+    # main motor stepping first and the secondaries sweeping together at every step
+    positions = dict(start_positions)
+    duration = 0.0
+    for main_goal, sweeps in rows:
+        duration += sweeps_time({main_id: [('GoalPos', main_goal)]}, positions, speed, overhead)
+        duration += sweeps_time(sweeps, positions, speed, overhead)
+    return duration + sweeps_time(finish, positions, speed, overhead)
+
+
+def run_sweeps(bus, sweeps, threshold=DXL_MOVING_STATUS_THRESHOLD, on_arrival=None, timeout=ARRIVAL_TIMEOUT):
+    # sweeps: {dxl_id: [(label, goal_position), ...]}. on_arrival(dxl_id, label, goal_position,
+    # present_position) runs once per goal reached, in that motor's goal order.
+    # Returns the number of bus polls taken.
+    cursors = dict((dxl_id, 0) for dxl_id, steps in sweeps.items() if steps)
+    due = dict((dxl_id, sweeps[dxl_id][0][1]) for dxl_id in cursors)
+    active = dict(due)
+    polls = 0
+    while active:
+        if due:
+            bus.set_goal_positions(due)
+            due = {}
+        arrived = bus.wait_arrived_any(active, threshold, timeout)
+        polls += 1
+        for dxl_id, present_position in arrived.items():
+            label, goal_position = sweeps[dxl_id][cursors[dxl_id]]
+            if on_arrival is not None:
+                on_arrival(dxl_id, label, goal_position, present_position)
+            cursors[dxl_id] += 1
+            if cursors[dxl_id] < len(sweeps[dxl_id]):
+                due[dxl_id] = active[dxl_id] = sweeps[dxl_id][cursors[dxl_id]][1]
+            else:
+                del active[dxl_id]
+    return polls
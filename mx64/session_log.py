@@ -0,0 +1,84 @@
+# Per-run CSV session logs
+#
+# Each run writes a new file named after the log and the start time, e.g.
+# motor_positions_20240131-142501.csv, so earlier runs are never overwritten. The
+# file is opened once; rows collect in its buffer and reach the OS after
+# SESSION_FLUSH_ROWS rows or SESSION_FLUSH_INTERVAL seconds, whichever comes first.
+# checkpoint() also fsyncs, so what was written survives a power cut; close() does
+# a final checkpoint.
+#
+#   with SessionLog('motor_positions.csv', ['Iteration', 'Motor1', ...]) as log:
+#       log.writerow([iteration] + positions)
+#       log.checkpoint()
+
+import csv
+import os
+import time
+
+SESSION_FLUSH_ROWS = 64                  # Rows buffered before they are handed to the OS
+SESSION_FLUSH_INTERVAL = 5.0             # s a row may sit in the buffer
+SESSION_BUFFER_SIZE = 1 << 16            # bytes
+SESSION_TIME_FORMAT = '%Y%m%d-%H%M%S'
+
+
+def session_path(path, started=None):
+    # 'dir/name.csv' -> 'dir/name_<start time>.csv', with -1, -2, ... if that exists already
+    stem, extension = os.path.splitext(path)
+    stamp = time.strftime(SESSION_TIME_FORMAT, time.localtime(started))
+    candidate = '%s_%s%s' % (stem, stamp, extension)
+    suffix = 1
+    while os.path.exists(candidate):
+        candidate = '%s_%s-%d%s' % (stem, stamp, suffix, extension)
+        suffix += 1
+    return candidate
+
+
+class SessionLog(object):
+
+    def __init__(self, path, header=None, flush_rows=SESSION_FLUSH_ROWS, flush_interval=SESSION_FLUSH_INTERVAL,
+                 message=print):
+        self.path = session_path(path)
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.rows = 0
+        self.checkpoints = 0
+        self._pending = 0
+        self._last_flush = time.monotonic()
+        # 'x': never open a file another run has just created
+        self._file = open(self.path, 'x', newline='', buffering=SESSION_BUFFER_SIZE)
+        self._writer = csv.writer(self._file)
+        if header is not None:
+            self._writer.writerow(header)
+            self._pending += 1
+        message("Logging to %s" % self.path)
+
+    def writerow(self, row):
+        self._writer.writerow(row)
+        self.rows += 1
+        self._pending += 1
+        if self._pending >= self.flush_rows or time.monotonic() - self._last_flush >= self.flush_interval:
+            self.flush()
+
+    def flush(self):
+        # Hand the buffered rows to the OS (no fsync)
+        self._file.flush()
+        self._pending = 0
+        self._last_flush = time.monotonic()
+
+    def checkpoint(self):
+        # Flush and fsync: everything written so far is on the disk
+        self.flush()
+        os.fsync(self._file.fileno())
+        self.checkpoints += 1
+
+    def close(self):
+        if self._file.closed:
+            return
+        self.checkpoint()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,290 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from .bus import ARRIVAL_TIMEOUT, BAUDRATE, DEVICENAME, DXL_IDS, DXL_MOVING_STATUS_THRESHOLD, SNAPSHOT_DTYPE, MX64Bus
+
+# Several serial buses driven as one.
+#
+# With the legs split across adapters, e.g.
+#   DEVICENAME = {1: '/dev/ttyUSB0', 3: '/dev/ttyUSB0', 5: '/dev/ttyUSB0',
+#                 2: '/dev/ttyUSB1', 4: '/dev/ttyUSB1', 6: '/dev/ttyUSB1'}
+# make_bus() returns a ShardedBus with the MX64Bus API: every plural call is split
+# per port and the parts run at the same time, one I/O thread per port (pyserial
+# releases the GIL while it waits on the tty), then merged back in ID order.
+
+PORT_READ_TIMEOUT = 0.001                # s; blocking reads so the port threads do not spin on the GIL
+
+
+def make_bus(device_name=DEVICENAME, baudrate=BAUDRATE, dxl_ids=DXL_IDS):
+    # MX64Bus for one port name, ShardedBus for a {dxl_id: port name} mapping
+    if isinstance(device_name, dict):
+        return ShardedBus(device_name, baudrate, dxl_ids)
+    return MX64Bus(device_name, baudrate, dxl_ids)
+
+
+class ShardedBus(object):
+    # One MX64Bus per serial port, each with its own single-thread executor so a
+    # port is only ever used by one thread and transactions on it stay in order.
+
+    def __init__(self, port_map, baudrate=BAUDRATE, dxl_ids=None):
+        self.dxl_ids = list(port_map) if dxl_ids is None else list(dxl_ids)
+        missing = [dxl_id for dxl_id in self.dxl_ids if dxl_id not in port_map]
+        if missing:
+            raise ValueError("No serial port given for Dynamixel ID(s) %s" % missing)
+
+        ports = {}
+        for dxl_id in self.dxl_ids:
+            ports.setdefault(port_map[dxl_id], []).append(dxl_id)
+
+        self.device_name = dict((dxl_id, port_map[dxl_id]) for dxl_id in self.dxl_ids)
+        self.buses = dict((device, MX64Bus(device, baudrate, ids, PORT_READ_TIMEOUT)) for device, ids in ports.items())
+        self.executors = dict((device, ThreadPoolExecutor(max_workers=1)) for device in self.buses)
+        self.bus_for_id = dict((dxl_id, self.buses[port_map[dxl_id]]) for dxl_id in self.dxl_ids)
+
+        # Per-port measurements from open(), keyed by port name
+        self.metrics = {}
+        self._message = print
+
+    @property
+    def baudrate(self):
+        # The common rate, or None while the ports run at different rates
+        rates = set(bus.baudrate for bus in self.buses.values())
+        return rates.pop() if len(rates) == 1 else None
+
+    @property
+    def message(self):
+        return self._message
+
+    @message.setter
+    def message(self, message):
+        # Status and warning lines of every port go to the same place (see MX64Bus.message)
+        self._message = message
+        for bus in self.buses.values():
+            bus.message = message
+
+    @property
+    def status_return_levels(self):
+        levels = {}
+        for bus in self.buses.values():
+            levels.update(bus.status_return_levels)
+        return levels
+
+    @property
+    def present_states(self):
+        states = {}
+        for bus in self.buses.values():
+            states.update(bus.present_states)
+        return states
+
+    def open(self):
+        # Ports are opened one after the other so their discovery output does not interleave
+        for device, bus in self.buses.items():
+            self.message("Port %s: Dynamixel ID(s) %s" % (device, bus.dxl_ids))
+            if not bus.open():
+                self.close()
+                return False
+            self.metrics[device] = bus.metrics
+        return True
+
+    def close(self):
+        for bus in self.buses.values():
+            bus.close()
+
+    def shutdown(self):
+        self.close()
+        for executor in self.executors.values():
+            executor.shutdown()
+
+    # Dispatch
+
+    def _call(self, bus, method, *args):
+        return self.executors[bus.device_name].submit(getattr(bus, method), *args).result()
+
+    def _split(self, dxl_ids):
+        # {bus: [dxl_id, ...]} in the order the IDs were given
+        parts = {}
+        for dxl_id in self._ids(dxl_ids):
+            parts.setdefault(self.bus_for_id[dxl_id], []).append(dxl_id)
+        return parts
+
+    def _run(self, calls):
+        # calls: [(bus, method, args)]; starts all of them, then waits for each
+        futures = [self.executors[bus.device_name].submit(getattr(bus, method), *args)
+                   for bus, method, args in calls]
+        return [future.result() for future in futures]
+
+    def _ids(self, dxl_ids):
+        return self.dxl_ids if dxl_ids is None else dxl_ids
+
+    # Per-motor operations
+
+    def write1(self, dxl_id, address, value, ack=True, force=False):
+        return self._call(self.bus_for_id[dxl_id], 'write1', dxl_id, address, value, ack, force)
+
+    def write2(self, dxl_id, address, value, ack=True, force=False):
+        return self._call(self.bus_for_id[dxl_id], 'write2', dxl_id, address, value, ack, force)
+
+    def read1(self, dxl_id, address):
+        return self._call(self.bus_for_id[dxl_id], 'read1', dxl_id, address)
+
+    def read2(self, dxl_id, address):
+        return self._call(self.bus_for_id[dxl_id], 'read2', dxl_id, address)
+
+    def enable_torque(self, dxl_id):
+        self._call(self.bus_for_id[dxl_id], 'enable_torque', dxl_id)
+
+    def disable_torque(self, dxl_id):
+        self._call(self.bus_for_id[dxl_id], 'disable_torque', dxl_id)
+
+    def persist_max_torque(self, dxl_id, max_torque):
+        self._call(self.bus_for_id[dxl_id], 'persist_max_torque', dxl_id, max_torque)
+
+    def set_torque_limit(self, dxl_id, torque_limit):
+        self._call(self.bus_for_id[dxl_id], 'set_torque_limit', dxl_id, torque_limit)
+
+    def set_goal_position(self, dxl_id, goal_position):
+        return self._call(self.bus_for_id[dxl_id], 'set_goal_position', dxl_id, goal_position)
+
+    def read_present_position(self, dxl_id):
+        return self._call(self.bus_for_id[dxl_id], 'read_present_position', dxl_id)
+
+    def read_present_load(self, dxl_id):
+        return self._call(self.bus_for_id[dxl_id], 'read_present_load', dxl_id)
+
+    def read_snapshot1(self, dxl_id):
+        return self._call(self.bus_for_id[dxl_id], 'read_snapshot1', dxl_id)
+
+    # Per-tick operations, one part per port running concurrently
+
+    def set_baudrate_all(self, baudrate, dxl_ids=None):
+        return all(self._run([(bus, 'set_baudrate_all', (baudrate, ids)) for bus, ids in self._split(dxl_ids).items()]))
+
+    def read_status_return_levels(self, dxl_ids=None):
+        self._run([(bus, 'read_status_return_levels', (ids,)) for bus, ids in self._split(dxl_ids).items()])
+        return self.status_return_levels
+
+    def set_status_return_level(self, level, dxl_ids=None):
+        self._run([(bus, 'set_status_return_level', (level, ids)) for bus, ids in self._split(dxl_ids).items()])
+
+    def enable_torque_all(self, dxl_ids=None):
+        self._run([(bus, 'enable_torque_all', (ids,)) for bus, ids in self._split(dxl_ids).items()])
+
+    def disable_torque_all(self, dxl_ids=None):
+        self._run([(bus, 'disable_torque_all', (ids,)) for bus, ids in self._split(dxl_ids).items()])
+
+    def set_goal_positions(self, goal_positions, force=False):
+        parts = {}
+        for dxl_id, goal_position in goal_positions.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = goal_position
+        return all(self._run([(bus, 'set_goal_positions', (goals, force)) for bus, goals in parts.items()]))
+
+    def set_torque_limits(self, torque_limits, force=False):
+        parts = {}
+        for dxl_id, torque_limit in torque_limits.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = torque_limit
+        return all(self._run([(bus, 'set_torque_limits', (limits, force)) for bus, limits in parts.items()]))
+
+    def set_goals_with_speed(self, goal_speeds):
+        parts = {}
+        for dxl_id, goal_speed in goal_speeds.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = goal_speed
+        return all(self._run([(bus, 'set_goals_with_speed', (part,)) for bus, part in parts.items()]))
+
+    def move_timed(self, goal_positions, duration, present_positions=None):
+        if present_positions is None:
+            present_positions = self.read_present_positions(list(goal_positions))
+        speeds = {}
+        parts = {}
+        for dxl_id, goal_position in goal_positions.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = goal_position
+        for part in self._run([(bus, 'move_timed', (goals, duration, present_positions)) for bus, goals in parts.items()]):
+            speeds.update(part)
+        return speeds
+
+    def clear_moving_speed(self, dxl_ids=None):
+        return all(self._run([(bus, 'clear_moving_speed', (ids,)) for bus, ids in self._split(dxl_ids).items()]))
+
+    def read_moving(self, dxl_ids=None):
+        moving = {}
+        for part in self._run([(bus, 'read_moving', (ids,)) for bus, ids in self._split(dxl_ids).items()]):
+            moving.update(part)
+        return moving
+
+    def read_arrival(self, dxl_ids=None):
+        arrival = {}
+        for part in self._run([(bus, 'read_arrival', (ids,)) for bus, ids in self._split(dxl_ids).items()]):
+            arrival.update(part)
+        return arrival
+
+    def wait_stopped(self, dxl_ids=None, timeout=ARRIVAL_TIMEOUT, poll_interval=0.01, goal_positions=None,
+                     threshold=DXL_MOVING_STATUS_THRESHOLD):
+        return all(self._run([(bus, 'wait_stopped', (ids, timeout, poll_interval, goal_positions, threshold))
+                              for bus, ids in self._split(dxl_ids).items()]))
+
+    def wait_arrived(self, dxl_id, goal_position, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        return self._call(self.bus_for_id[dxl_id], 'wait_arrived', dxl_id, goal_position, threshold, timeout)
+
+    def wait_arrived_all(self, goal_positions, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        parts = {}
+        for dxl_id, goal_position in goal_positions.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = goal_position
+        positions = {}
+        for part in self._run([(bus, 'wait_arrived_all', (goals, threshold, timeout)) for bus, goals in parts.items()]):
+            positions.update(part)
+        return dict((dxl_id, positions[dxl_id]) for dxl_id in goal_positions if dxl_id in positions)
+
+    def wait_arrived_any(self, goal_positions, threshold=DXL_MOVING_STATUS_THRESHOLD, timeout=ARRIVAL_TIMEOUT):
+        # Each port waits for its own first arrival, so this returns once every port has one
+        parts = {}
+        for dxl_id, goal_position in goal_positions.items():
+            parts.setdefault(self.bus_for_id[dxl_id], {})[dxl_id] = goal_position
+        positions = {}
+        for part in self._run([(bus, 'wait_arrived_any', (goals, threshold, timeout)) for bus, goals in parts.items()]):
+            positions.update(part)
+        return dict((dxl_id, positions[dxl_id]) for dxl_id in goal_positions if dxl_id in positions)
+
+    def invalidate_shadow(self, dxl_ids=None, address=None):
+        self._run([(bus, 'invalidate_shadow', (ids, address)) for bus, ids in self._split(dxl_ids).items()])
+
+    def verify_shadow(self, dxl_ids=None):
+        mismatches = {}
+        for part in self._run([(bus, 'verify_shadow', (ids,)) for bus, ids in self._split(dxl_ids).items()]):
+            mismatches.update(part)
+        return mismatches
+
+    def send_step(self, trajectory, step):
+        # Each port sends the frame of the trajectory part for its own motors
+        return all(self._run([(bus, 'send_step', (trajectory.part(ids), step))
+                              for bus, ids in self._split(trajectory.dxl_ids).items()]))
+
+    def read_present_positions(self, dxl_ids=None):
+        positions = {}
+        for part in self._run([(bus, 'read_present_positions', (ids,)) for bus, ids in self._split(dxl_ids).items()]):
+            positions.update(part)
+        return dict((dxl_id, positions[dxl_id]) for dxl_id in self._ids(dxl_ids))
+
+    def read_states(self, dxl_ids=None):
+        # One BulkRead per port at the same time, merged into the MX64Bus.read_states() layout
+        dxl_ids = list(self._ids(dxl_ids))
+        parts = self._split(dxl_ids)
+        results = self._run([(bus, 'read_states', (ids,)) for bus, ids in parts.items()])
+
+        rows = {}
+        for ids, states in zip(parts.values(), results):
+            for dxl_id, row in zip(ids, states):
+                rows[dxl_id] = row
+        if not dxl_ids:
+            return np.zeros((0, 3), dtype=np.int32)
+        return np.array([rows[dxl_id] for dxl_id in dxl_ids], dtype=np.int32)
+
+    def read_snapshot(self, dxl_ids=None):
+        dxl_ids = list(self._ids(dxl_ids))
+        parts = self._split(dxl_ids)
+        results = self._run([(bus, 'read_snapshot', (ids,)) for bus, ids in parts.items()])
+
+        records = {}
+        for snapshot in results:
+            for record in snapshot:
+                records[int(record['id'])] = record
+        return np.array([records[dxl_id] for dxl_id in dxl_ids], dtype=SNAPSHOT_DTYPE)
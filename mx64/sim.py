@@ -0,0 +1,399 @@
+import math
+import os
+import random
+import time
+
+from dynamixel_sdk import (BROADCAST_ID, INST_ACTION, INST_BULK_READ, INST_PING, INST_READ, INST_REG_WRITE,
+                           INST_SYNC_WRITE, INST_WRITE, PortHandler)
+
+from .control_table import *
+
+# Software-in-the-loop MX-64 bus.
+#
+# SimPortHandler stands in for dynamixel_sdk.PortHandler: the SDK packet handler
+# writes real Protocol 1.0 instruction packets into it and reads status packets
+# back, so every script and every MX64Bus code path runs unchanged. Status
+# bytes only become readable once the simulated bus time for the instruction,
+# the servo's Return Delay Time and the reply itself has passed at the port
+# baudrate, which keeps timing numbers from the simulator meaningful.
+#
+# Select it with DEVICENAME = 'sim://...' or by exporting MX64_SIM=1, which
+# swaps every port for a simulated one without editing the scripts.
+# Tunables (environment): MX64_SIM_IDS="1,2,3", MX64_SIM_SPEED (ticks/s),
+# MX64_SIM_TAU (s), MX64_SIM_NOISE (ticks), MX64_SIM_LATENCY_MS, MX64_SIM_SEED.
+
+SIM_PREFIX = 'sim://'
+
+SIM_MAX_SPEED = 4300.0                   # No-load speed, 63 rpm in position ticks per second
+SIM_TAU = 0.05                           # First-order time constant of the position loop (s)
+SIM_NOISE = 1.0                          # Standard deviation of present position noise (ticks)
+SIM_LATENCY_MS = 1.0                     # USB-serial adapter latency added to every reply
+SIM_LOAD_GAIN = 4.0                      # Load units per tick of position error
+
+BITS_PER_BYTE = 10                       # 8N1 framing
+
+ERRBIT_RANGE = 8
+ERRBIT_CHECKSUM = 16
+ERRBIT_INSTRUCTION = 64
+
+
+def mx_baudrate(register_value):
+    # Baud Rate register (address 4) to bits per second
+    if register_value == 250:
+        return 2250000
+    if register_value == 251:
+        return 2500000
+    if register_value == 252:
+        return 3000000
+    return 2000000.0 / (register_value + 1)
+
+
+def checksum(packet_body):
+    return ~sum(packet_body) & 0xFF
+
+
+def status_packet(dxl_id, error, params=()):
+    body = [dxl_id, len(params) + 2, error] + list(params)
+    return bytes([0xFF, 0xFF] + body + [checksum(body)])
+
+
+class SimulatedMX64(object):
+    # Control table and first-order motion model of one servo
+
+    def __init__(self, dxl_id, max_speed=SIM_MAX_SPEED, tau=SIM_TAU, noise=SIM_NOISE, rng=None,
+                 position=2048):
+        self.max_speed = max_speed
+        self.tau = tau
+        self.noise = noise
+        self.rng = rng or random.Random()
+
+        self.table = bytearray(74)
+        self._set2(ADDR_MX_MODEL_NUMBER, MX64_MODEL_NUMBER)
+        self.table[ADDR_MX_FIRMWARE_VERSION] = 39
+        self.table[ADDR_MX_ID] = dxl_id
+        self.table[ADDR_MX_BAUD_RATE] = 1            # 1 Mbps
+        self.table[ADDR_MX_RETURN_DELAY_TIME] = 250  # 500 us
+        self._set2(ADDR_MX_CCW_ANGLE_LIMIT, DXL_MAX_POSITION)
+        self.table[ADDR_MX_TEMPERATURE_LIMIT] = 80
+        self.table[ADDR_MX_MIN_VOLTAGE_LIMIT] = 60
+        self.table[ADDR_MX_MAX_VOLTAGE_LIMIT] = 160
+        self._set2(ADDR_MX_TORQUE_MAX, DXL_MAX_TORQUE_VALUE)
+        self.table[ADDR_MX_STATUS_RETURN_LEVEL] = STATUS_RETURN_ALL
+        self.table[ADDR_MX_P_GAIN] = 32
+        self._set2(ADDR_MX_GOAL_POSITION, position)
+        self._set2(ADDR_MX_TORQUE_LIMIT, DXL_MAX_TORQUE_VALUE)
+        self.table[ADDR_MX_PRESENT_VOLTAGE] = 120
+        self.table[ADDR_MX_PRESENT_TEMPERATURE] = 35
+        self._set2(ADDR_MX_PUNCH, 32)
+
+        self.position = float(position)
+        self.velocity = 0.0
+        self.last_update = None
+        self.registered = None                       # Pending REG_WRITE (address, data)
+
+    @property
+    def dxl_id(self):
+        return self.table[ADDR_MX_ID]
+
+    @property
+    def baudrate(self):
+        return mx_baudrate(self.table[ADDR_MX_BAUD_RATE])
+
+    @property
+    def return_delay(self):
+        return self.table[ADDR_MX_RETURN_DELAY_TIME] * 2e-6
+
+    @property
+    def status_return_level(self):
+        return self.table[ADDR_MX_STATUS_RETURN_LEVEL]
+
+    def _get2(self, address):
+        return self.table[address] | (self.table[address + 1] << 8)
+
+    def _set2(self, address, value):
+        self.table[address] = value & 0xFF
+        self.table[address + 1] = (value >> 8) & 0xFF
+
+    def speed_limit(self):
+        moving_speed = self._get2(ADDR_MX_MOVING_SPEED) & 0x3FF
+        if moving_speed == 0:
+            return self.max_speed
+        return min(self.max_speed, moving_speed * SPEED_UNIT_TICKS)
+
+    def update(self, now):
+        # Advance the motion model to 'now': rate-limited first-order approach to the goal
+        if self.last_update is None:
+            self.last_update = now
+        dt = now - self.last_update
+        self.last_update = now
+        if dt <= 0:
+            return
+        if not self.table[ADDR_MX_TORQUE_ENABLE]:
+            self.velocity = 0.0
+            return
+
+        goal = float(self._get2(ADDR_MX_GOAL_POSITION))
+        error = goal - self.position
+        direction = 1.0 if error >= 0 else -1.0
+        vmax = self.speed_limit()
+
+        # Saturated phase: constant speed until the first-order region is reached
+        saturated_error = vmax * self.tau
+        if abs(error) > saturated_error:
+            t_saturated = (abs(error) - saturated_error) / vmax
+            if dt <= t_saturated:
+                self.position += direction * vmax * dt
+                self.velocity = direction * vmax
+                return
+            dt -= t_saturated
+            error = direction * saturated_error
+        error *= math.exp(-dt / self.tau)
+        self.position = goal - error
+        self.velocity = error / self.tau
+
+    def refresh_present(self, now):
+        self.update(now)
+        position = int(round(self.position + self.rng.gauss(0.0, self.noise))) if self.noise else int(round(self.position))
+        self._set2(ADDR_MX_PRESENT_POSITION, min(max(position, 0), DXL_MAX_POSITION))
+
+        speed = min(int(abs(self.velocity) / SPEED_UNIT_TICKS), 1023)
+        self._set2(ADDR_MX_PRESENT_SPEED, speed | (0x400 if self.velocity < 0 else 0))
+
+        error = self._get2(ADDR_MX_GOAL_POSITION) - self.position
+        load = 0
+        if self.table[ADDR_MX_TORQUE_ENABLE]:
+            load = min(int(abs(error) * SIM_LOAD_GAIN), self._get2(ADDR_MX_TORQUE_LIMIT))
+        self._set2(ADDR_MX_PRESENT_LOAD, load | (0x400 if error < 0 else 0))
+
+        self.table[ADDR_MX_MOVING] = 1 if abs(error) > 1.0 else 0
+
+    def read(self, now, address, length):
+        self.refresh_present(now)
+        if address + length > len(self.table):
+            return None
+        return bytes(self.table[address:address + length])
+
+    def write(self, now, address, data):
+        if address + len(data) > len(self.table):
+            return ERRBIT_RANGE
+        self.update(now)
+        for offset, value in enumerate(data):
+            register = address + offset
+            if register in (ADDR_MX_MODEL_NUMBER, ADDR_MX_MODEL_NUMBER + 1, ADDR_MX_FIRMWARE_VERSION):
+                continue
+            self.table[register] = value
+        # Writing a goal position turns the torque on, as on the real servo
+        if address <= ADDR_MX_GOAL_POSITION < address + len(data):
+            self.table[ADDR_MX_TORQUE_ENABLE] = 1
+        return 0
+
+
+class SimulatedBus(object):
+    # Half-duplex Protocol 1.0 bus with a set of simulated servos.
+    # handle() takes one instruction packet and returns [(time_available, status_packet), ...].
+
+    def __init__(self, dxl_ids=(1, 2, 3, 4, 5, 6), max_speed=SIM_MAX_SPEED, tau=SIM_TAU, noise=SIM_NOISE,
+                 latency_ms=SIM_LATENCY_MS, seed=None):
+        rng = random.Random(seed)
+        self.servos = {dxl_id: SimulatedMX64(dxl_id, max_speed, tau, noise, rng) for dxl_id in dxl_ids}
+        self.latency = latency_ms / 1000.0
+        self.bus_free_at = 0.0
+        self.tx_done_at = 0.0                        # When the last instruction packet left the adapter
+        self.packets = 0                             # Instruction packets seen, for tests and benchmarks
+
+    def handle(self, packet, now, baudrate):
+        byte_time = BITS_PER_BYTE / float(baudrate)
+        start = max(now, self.bus_free_at)
+        t = start + len(packet) * byte_time
+        self.bus_free_at = t
+        self.tx_done_at = t
+        self.packets += 1
+
+        if len(packet) < 6 or packet[0] != 0xFF or packet[1] != 0xFF:
+            return []
+        dxl_id, length, instruction = packet[2], packet[3], packet[4]
+        if len(packet) != length + 4:
+            return []
+        params = list(packet[5:-1])
+        listening = [servo for servo in self.servos.values()
+                     if abs(servo.baudrate - baudrate) / float(baudrate) < 0.03]
+        if checksum(packet[2:-1]) != packet[-1]:
+            target = [servo for servo in listening if servo.dxl_id == dxl_id]
+            return self._reply(target, t, byte_time, lambda servo: (ERRBIT_CHECKSUM, ()))
+
+        if instruction == INST_SYNC_WRITE:
+            address, data_length = params[0], params[1]
+            for i in range(2, len(params), data_length + 1):
+                for servo in listening:
+                    if servo.dxl_id == params[i]:
+                        servo.write(t, address, params[i + 1:i + 1 + data_length])
+            return []
+
+        if instruction == INST_BULK_READ:
+            replies = []
+            for i in range(1, len(params), 3):
+                data_length, read_id, address = params[i], params[i + 1], params[i + 2]
+                for servo in listening:
+                    if servo.dxl_id == read_id and servo.status_return_level >= STATUS_RETURN_READ:
+                        data = servo.read(t, address, data_length)
+                        status = status_packet(read_id, 0 if data is not None else ERRBIT_RANGE, data or ())
+                        t += servo.return_delay + len(status) * byte_time
+                        replies.append((t + self.latency, status))
+            self.bus_free_at = t
+            return replies
+
+        if instruction == INST_ACTION:
+            for servo in listening:
+                if (dxl_id == BROADCAST_ID or servo.dxl_id == dxl_id) and servo.registered:
+                    servo.write(t, *servo.registered)
+                    servo.registered = None
+            return []
+
+        target = [servo for servo in listening if servo.dxl_id == dxl_id or dxl_id == BROADCAST_ID]
+        if instruction == INST_PING:
+            return self._reply(target, t, byte_time, lambda servo: (0, ()))
+        if instruction == INST_READ:
+            def read(servo):
+                data = servo.read(t, params[0], params[1])
+                return (0, data) if data is not None else (ERRBIT_RANGE, ())
+            return self._reply([s for s in target if s.status_return_level >= STATUS_RETURN_READ], t, byte_time, read)
+        if instruction == INST_WRITE:
+            replies = [s for s in target if s.status_return_level >= STATUS_RETURN_ALL]
+            errors = {servo.dxl_id: servo.write(t, params[0], params[1:]) for servo in target}
+            return self._reply(replies, t, byte_time, lambda servo: (errors[servo.dxl_id], ()))
+        if instruction == INST_REG_WRITE:
+            for servo in target:
+                servo.registered = (params[0], params[1:])
+            replies = [s for s in target if s.status_return_level >= STATUS_RETURN_ALL]
+            return self._reply(replies, t, byte_time, lambda servo: (0, ()))
+        return self._reply(target, t, byte_time, lambda servo: (ERRBIT_INSTRUCTION, ()))
+
+    def _reply(self, servos, t, byte_time, make_status):
+        # Broadcast instructions never get a status packet
+        if len(servos) != 1 or servos[0].dxl_id == BROADCAST_ID:
+            return []
+        servo = servos[0]
+        error, params = make_status(servo)
+        status = status_packet(servo.dxl_id, error, params)
+        t += servo.return_delay + len(status) * byte_time
+        self.bus_free_at = t
+        return [(t + self.latency, status)]
+
+
+def sim_bus_from_env(environ=None):
+    environ = os.environ if environ is None else environ
+    dxl_ids = [int(dxl_id) for dxl_id in environ.get('MX64_SIM_IDS', '1,2,3,4,5,6').split(',') if dxl_id.strip()]
+    seed = environ.get('MX64_SIM_SEED')
+    return SimulatedBus(dxl_ids,
+                        max_speed=float(environ.get('MX64_SIM_SPEED', SIM_MAX_SPEED)),
+                        tau=float(environ.get('MX64_SIM_TAU', SIM_TAU)),
+                        noise=float(environ.get('MX64_SIM_NOISE', SIM_NOISE)),
+                        latency_ms=float(environ.get('MX64_SIM_LATENCY_MS', SIM_LATENCY_MS)),
+                        seed=int(seed) if seed is not None else None)
+
+
+# One simulated bus per port name, so reopening a port finds the same servos
+SIM_BUSES = {}
+
+
+def get_sim_bus(port_name):
+    if port_name not in SIM_BUSES:
+        SIM_BUSES[port_name] = sim_bus_from_env()
+    return SIM_BUSES[port_name]
+
+
+class SimPortHandler(PortHandler):
+    # dynamixel_sdk.PortHandler backed by a SimulatedBus instead of pyserial
+
+    def __init__(self, port_name, sim_bus=None, read_timeout=0):
+        PortHandler.__init__(self, port_name)
+        self.sim_bus = sim_bus if sim_bus is not None else get_sim_bus(port_name)
+        self.read_timeout = read_timeout             # s, as in BlockingPortHandler
+        self._pending = []                           # [(time_available, bytes)] in arrival order
+
+    def setupPort(self, cflag_baud):
+        self.is_open = True
+        self._pending = []
+        self.tx_time_per_byte = (1000.0 / self.baudrate) * 10.0
+        return True
+
+    def closePort(self):
+        self.is_open = False
+
+    def clearPort(self):
+        # Like reset_input_buffer(): drops what has arrived, bytes still on the wire arrive later
+        now = time.perf_counter()
+        self._pending = [chunk for chunk in self._pending if chunk[0] > now]
+
+    def getBytesAvailable(self):
+        now = time.perf_counter()
+        return sum(len(data) for available, data in self._pending if available <= now)
+
+    def readPort(self, length):
+        now = time.perf_counter()
+        if self.read_timeout:
+            # Sleep (releasing the GIL) until the bytes are due or the timeout passes
+            deadline = now + self.read_timeout
+            arrived = 0
+            for available, data in self._pending:
+                arrived += len(data)
+                if arrived >= length:
+                    deadline = min(deadline, available)
+                    break
+            if deadline > now:
+                time.sleep(deadline - now)
+            now = time.perf_counter()
+
+        out = bytearray()
+        while self._pending and self._pending[0][0] <= now and len(out) < length:
+            available, data = self._pending[0]
+            take = length - len(out)
+            out.extend(data[:take])
+            if take < len(data):
+                self._pending[0] = (available, data[take:])
+            else:
+                self._pending.pop(0)
+        return bytes(out)
+
+    def writePort(self, packet):
+        # Returns once the packet is on the wire, so back-to-back TxOnly writes are paced
+        # by the baudrate the way a full adapter transmit buffer paces them
+        packet = bytes(packet)
+        self._pending.extend(self.sim_bus.handle(packet, time.perf_counter(), self.baudrate))
+        if self.read_timeout:
+            # Threaded use: block like a tty write does, without holding the GIL
+            time.sleep(max(0.0, self.sim_bus.tx_done_at - time.perf_counter()))
+        while time.perf_counter() < self.sim_bus.tx_done_at:
+            pass
+        return len(packet)
+
+
+class BlockingPortHandler(PortHandler):
+    # PortHandler whose reads wait up to read_timeout seconds for the requested bytes.
+    # The SDK polls readPort in a loop; with the stock timeout=0 that loop holds the GIL,
+    # a blocking read sleeps in select() instead so other port threads can run.
+
+    def __init__(self, port_name, read_timeout):
+        PortHandler.__init__(self, port_name)
+        self.read_timeout = read_timeout
+
+    def setupPort(self, cflag_baud):
+        if not PortHandler.setupPort(self, cflag_baud):
+            return False
+        self.ser.timeout = self.read_timeout
+        return True
+
+
+def is_simulated(device_name):
+    # 'sim://...' names, and every name while MX64_SIM=1 is exported
+    return device_name.startswith(SIM_PREFIX) or os.environ.get('MX64_SIM', '') not in ('', '0')
+
+
+def port_handler_for(device_name, read_timeout=0):
+    # PortHandler for a device name; 'sim://...' names or MX64_SIM=1 give a simulated bus.
+    # read_timeout > 0 makes reads block (see BlockingPortHandler), for ports used from threads.
+    if is_simulated(device_name):
+        return SimPortHandler(device_name, read_timeout=read_timeout)
+    if read_timeout:
+        return BlockingPortHandler(device_name, read_timeout)
+    return PortHandler(device_name)
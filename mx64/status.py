@@ -0,0 +1,144 @@
+# Rate-limited console status
+#
+# Printing a line per sample makes the terminal (worse, an SSH session) part of the
+# control loop. StatusDisplay keeps only the latest state of each motor; a display
+# thread redraws it as one table in place STATUS_RATE times a second, so
+# update() is a dict store however slow the terminal is.
+#
+#   display = StatusDisplay(DXL_IDS, verbosity=VERBOSITY_TABLE)
+#   display.update(dxl_id, 'GoalPos', goal_position, present_position)
+#   display.message("Iteration 2 done")
+#   display.close()
+#
+# Verbosity:
+#   VERBOSITY_QUIET    nothing
+#   VERBOSITY_EVENTS   message() lines only
+#   VERBOSITY_TABLE    messages and the in-place table (a plain status line when not a terminal)
+#   VERBOSITY_SAMPLES  messages and one "[ID:...] GoalPos:... PresPos:..." line per update, as before
+
+import collections
+import sys
+import threading
+import time
+
+VERBOSITY_QUIET = 0
+VERBOSITY_EVENTS = 1
+VERBOSITY_TABLE = 2
+VERBOSITY_SAMPLES = 3
+
+STATUS_RATE = 10                         # Redraws per second
+STATUS_LINE_CAPACITY = 1 << 14           # Message/sample lines waiting for the display thread
+
+CURSOR_UP = '\x1b[%dA'
+CLEAR_TO_END = '\x1b[J'
+
+
+class StatusDisplay(object):
+
+    def __init__(self, dxl_ids, verbosity=VERBOSITY_TABLE, rate=STATUS_RATE, stream=None):
+        self.dxl_ids = list(dxl_ids)
+        self.verbosity = verbosity
+        self.period = 1.0 / rate
+        self.stream = sys.stdout if stream is None else stream
+        self.in_place = hasattr(self.stream, 'isatty') and self.stream.isatty()
+
+        self.states = {}                 # {dxl_id: (label, goal, present, updates)}
+        self.status = ''
+        self.dropped_lines = 0
+        self._lines = collections.deque()
+        self._drawn_height = 0
+        self._changed = False
+        self._started = time.monotonic()
+
+        self._stop = threading.Event()
+        self._thread = None
+        if verbosity > VERBOSITY_QUIET:
+            self._thread = threading.Thread(target=self._run, name='status-display', daemon=True)
+            self._thread.start()
+
+    # Control loop side
+
+    def update(self, dxl_id, label, goal_position, present_position):
+        updates = self.states[dxl_id][3] + 1 if dxl_id in self.states else 1
+        self.states[dxl_id] = (label, goal_position, present_position, updates)
+        self._changed = True
+        if self.verbosity >= VERBOSITY_SAMPLES:
+            self._queue("[ID:%03d] %s:%03d  PresPos:%03d" % (dxl_id, label, goal_position, present_position))
+
+    def set_status(self, text):
+        # Title line of the table, e.g. the iteration and main motor step
+        self.status = text
+        self._changed = True
+
+    def message(self, text):
+        if self.verbosity >= VERBOSITY_EVENTS:
+            self._queue(text)
+
+    def _queue(self, line):
+        if len(self._lines) >= STATUS_LINE_CAPACITY:
+            self.dropped_lines += 1
+            return
+        self._lines.append(line)
+
+    # Display thread side
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            self._draw()
+
+    def _table(self):
+        elapsed = max(time.monotonic() - self._started, 1e-9)
+        rows = [self.status or 'Status',
+                '  ID  Target      Goal  Present  Error  Arrivals/s']
+        for dxl_id in self.dxl_ids:
+            if dxl_id not in self.states:
+                rows.append('  %02d  -' % dxl_id)
+                continue
+            label, goal_position, present_position, updates = self.states[dxl_id]
+            rows.append('  %02d  %-8s  %4d  %7d  %5d  %10.1f' % (dxl_id, label, goal_position, present_position,
+                                                                   present_position - goal_position, updates / elapsed))
+        return rows
+
+    def _draw(self):
+        lines = []
+        while self._lines:
+            lines.append(self._lines.popleft())
+        show_table = self.verbosity == VERBOSITY_TABLE and self._changed
+        if not lines and not show_table:
+            return
+        self._changed = False
+
+        text = ''
+        if self.in_place and self._drawn_height and (lines or show_table):
+            text += CURSOR_UP % self._drawn_height + CLEAR_TO_END      # Back to the top of the old table
+            self._drawn_height = 0
+            show_table = self.verbosity == VERBOSITY_TABLE
+        if lines:
+            text += '\n'.join(lines) + '\n'
+        if show_table:
+            if self.in_place:
+                table = self._table()
+                text += '\n'.join(table) + '\n'
+                self._drawn_height = len(table)
+            else:
+                # Not a terminal: one compact line per redraw
+                text += (self.status + ' ' if self.status else '') + ' '.join(
+                    '%d:%d/%d' % (dxl_id, state[2], state[1]) for dxl_id, state in sorted(self.states.items())) + '\n'
+        self.stream.write(text)
+        self.stream.flush()
+
+    def close(self):
+        # Final redraw, so the table shows where every motor ended up
+        if self._thread is None:
+            return
+        self._stop.set()
+        self._thread.join()
+        self._changed = True
+        self._draw()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,115 @@
+# Time-parameterised trajectory streaming
+#
+# Instead of stepping a goal and polling until the servo is within the moving
+# threshold, a path through goal waypoints is sampled at a fixed control rate
+# with a velocity profile, compiled into SyncWrite frames (mx64/trajectory.py)
+# and sent on a deadline-driven clock without waiting for arrival:
+#
+#   trajectory, segment_of_step = plan_path(DXL_IDS, waypoints, max_speed=1500, rate=100)
+#   stream(bus, trajectory, rate=100)
+#
+# Profiles, for a segment normalised to s(tau), tau in [0, 1]:
+#   'linear'     constant speed (speed steps at the waypoints)
+#   'trapezoid'  constant acceleration over the first/last TRAPEZOID_RAMP of the segment
+#   'scurve'     minimum-jerk quintic 10t^3 - 15t^4 + 6t^5, zero speed and acceleration at the ends
+
+import math
+
+import numpy as np
+
+from .control_loop import ControlLoop
+from .trajectory import compile_trajectory
+
+STREAM_RATE = 100                        # Hz
+TRAPEZOID_RAMP = 0.25                    # Fraction of a trapezoid segment spent accelerating (and decelerating)
+PROFILES = ['linear', 'trapezoid', 'scurve']
+
+
+def profile_position(profile, tau):
+    # Normalised position s(tau) of a profile, tau an array in [0, 1]
+    if profile == 'linear':
+        return tau
+    if profile == 'trapezoid':
+        ramp = TRAPEZOID_RAMP
+        peak = 1.0 / (1.0 - ramp)
+        return np.where(tau < ramp, 0.5 * peak / ramp * tau ** 2,
+                        np.where(tau > 1.0 - ramp, 1.0 - 0.5 * peak / ramp * (1.0 - tau) ** 2,
+                                 peak * (tau - 0.5 * ramp)))
+    if profile == 'scurve':
+        return tau ** 3 * (10.0 - 15.0 * tau + 6.0 * tau ** 2)
+    raise ValueError("Unknown profile %r, expected one of %s" % (profile, PROFILES))
+
+
+def profile_peak_speed(profile):
+    # Peak of ds/dtau: how much faster than the average speed the profile moves at its fastest
+    if profile == 'linear':
+        return 1.0
+    if profile == 'trapezoid':
+        return 1.0 / (1.0 - TRAPEZOID_RAMP)
+    if profile == 'scurve':
+        return 1.875
+    raise ValueError("Unknown profile %r, expected one of %s" % (profile, PROFILES))
+
+
+def sample_segment(start, end, max_speed, rate=STREAM_RATE, profile='scurve'):
+    # Goal rows from start to end (motor vectors), the fastest motor peaking at max_speed
+    # ticks/s. The first row is one period after start, the last row is end.
+    start = np.asarray(start, dtype=float)
+    end = np.asarray(end, dtype=float)
+    distance = np.abs(end - start).max()
+    duration = distance * profile_peak_speed(profile) / float(max_speed)
+    steps = max(1, int(math.ceil(duration * rate)))
+    tau = np.arange(1, steps + 1) / float(steps)
+    return np.rint(start + np.outer(profile_position(profile, tau), end - start)).astype(np.int64)
+
+
+def plan_path(dxl_ids, waypoints, max_speed, rate=STREAM_RATE, profile='scurve'):
+    # Trajectory through goal waypoints (one {dxl_id: goal} or row per waypoint; a dict
+    # only needs the motors that change, the rest keep their previous goal). The first
+    # waypoint must give every motor. Returns (Trajectory, segment_of_step), where
+    # segment_of_step[i] is the index of the waypoint step i is heading for.
+    rows = []
+    segment_of_step = []
+    previous = None
+    for index, waypoint in enumerate(waypoints):
+        if isinstance(waypoint, dict):
+            row = list(previous) if previous is not None else [None] * len(dxl_ids)
+            for column, dxl_id in enumerate(dxl_ids):
+                if dxl_id in waypoint:
+                    row[column] = waypoint[dxl_id]
+            if None in row:
+                raise ValueError("First waypoint must give a goal for every motor")
+        else:
+            row = list(waypoint)
+
+        if previous is None:
+            rows.append(np.asarray([row], dtype=np.int64))
+            segment_of_step.append(index)
+        elif row != previous:
+            segment = sample_segment(previous, row, max_speed, rate, profile)
+            rows.append(segment)
+            segment_of_step.extend([index] * len(segment))
+        previous = row
+
+    goals = np.concatenate(rows) if rows else np.zeros((0, len(dxl_ids)), dtype=np.int64)
+    return compile_trajectory(dxl_ids, goals), np.asarray(segment_of_step)
+
+
+def stream(bus, trajectory, rate=STREAM_RATE, on_step=None, loop=None):
+    # Send one trajectory step per period on a fixed schedule, without waiting for arrival.
+    # on_step(step) runs after each send (e.g. to read and log the present position). The
+    # schedule is a ControlLoop (mx64/control_loop.py) that restarts from now after a step
+    # more than one period late instead of bursting the missed frames; pass loop to pin it
+    # to a CPU or give it real-time priority. Returns timing stats.
+    if loop is None:
+        loop = ControlLoop(rate, overrun='resync')
+
+    def tick(step):
+        bus.send_step(trajectory, step)
+        if on_step is not None:
+            on_step(step)
+
+    stats = loop.run(tick, len(trajectory))
+    stats['steps'] = stats['ticks']
+    stats['late_steps'] = stats['missed']
+    return stats
@@ -0,0 +1,400 @@
+# Binary columnar telemetry
+#
+# A recording is a directory with one preallocated, memory-mapped file per column
+# (fixed-width little-endian values, record i at offset i * itemsize) and a small
+# header.json giving the schema, the number of records and the clock origin. An
+# append stores a few numbers straight into the mapped pages, with no text
+# formatting and no write call; the reader maps the same files without copying.
+#
+#   with TelemetryRecorder('sweep.telemetry') as recorder:
+#       recorder.append(iteration, dxl_id, goal_position, present_position, load, speed)
+#   data = read_telemetry('sweep.telemetry')     # {column: read-only array}
+#   export_csv('sweep.telemetry', 'sweep.csv')
+#
+# Export from the command line:
+#   python3 -m mx64.telemetry sweep.telemetry sweep.csv
+#
+# BackgroundRecorder takes the disk (and console) writes off the control loop: append()
+# stores the sample in a preallocated ring buffer and returns, and a writer thread
+# drains the ring into the recorder in large batches. When the ring is full (the disk
+# has stalled for longer than it covers) new samples are dropped and counted rather
+# than making the loop wait. An error in the recorder (disk full, closed file) stops
+# the writer thread; report() names it and flush()/close() raise it again.
+#
+#   with BackgroundRecorder(TelemetryRecorder('sweep.telemetry')) as recorder:
+#       recorder.append(iteration, dxl_id, goal_position, present_position, load, speed)
+#       recorder.log("[ID:%03d] ..." % dxl_id)      # printed by the writer thread
+#   print(recorder.report())
+
+import argparse
+import collections
+import csv
+import json
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+TELEMETRY_VERSION = 1
+TELEMETRY_COLUMNS = [
+    ('time', '<f8'),                     # s, time.monotonic()
+    ('iteration', '<u4'),
+    ('id', 'u1'),
+    ('goal', '<u2'),
+    ('position', '<u2'),
+    ('load', '<i2'),                     # signed, CCW positive
+    ('speed', '<i2'),                    # signed, CCW positive
+]
+TELEMETRY_CAPACITY = 1 << 20             # Records preallocated; doubled whenever full
+HEADER_NAME = 'header.json'
+RECORD_DTYPE = np.dtype(TELEMETRY_COLUMNS)
+
+RING_CAPACITY = 1 << 16                  # Samples the ring holds: about 10 min of arrivals, 30 s at 2 kHz
+LOG_CAPACITY = 1 << 14                   # Console lines held for the writer thread
+DRAIN_INTERVAL = 0.05                    # s between writer thread passes
+SINK_FLUSH_INTERVAL = 1.0                # s between flushes of the recorder behind the ring
+
+# CSV export: the columns of the old per-sample CSV first, then the rest
+CSV_COLUMNS = [('iteration', 'Iteration'), ('id', 'Motor ID'), ('goal', 'Goal Position'), ('position', 'Present Position'),
+               ('load', 'Present Load'), ('speed', 'Present Speed'), ('time', 'Time')]
+CSV_HEADER = [title for name, title in CSV_COLUMNS[:4]]
+EXPORT_CHUNK = 65536                     # Records converted to text at a time
+
+
+def column_path(path, name):
+    return os.path.join(path, name + '.bin')
+
+
+def read_header(path):
+    with open(os.path.join(path, HEADER_NAME)) as header_file:
+        return json.load(header_file)
+
+
+class TelemetryRecorder(object):
+
+    def __init__(self, path, capacity=TELEMETRY_CAPACITY, message=print):
+        self.path = path
+        self.capacity = capacity
+        self.message = message           # Where log() lines go, e.g. a StatusDisplay's message()
+        self.count = 0
+        self.header = {
+            'version': TELEMETRY_VERSION,
+            'columns': TELEMETRY_COLUMNS,
+            'count': 0,
+            'started_monotonic': time.monotonic(),
+            'started_wall': time.time(),
+        }
+        os.makedirs(path, exist_ok=True)
+        self._columns = {}
+        for name, dtype in TELEMETRY_COLUMNS:
+            with open(column_path(path, name), 'wb') as column_file:
+                column_file.truncate(capacity * np.dtype(dtype).itemsize)
+        self._map()
+        self._write_header()
+
+    def _map(self):
+        self._columns = dict((name, np.memmap(column_path(self.path, name), dtype=dtype, mode='r+', shape=(self.capacity,)))
+                             for name, dtype in TELEMETRY_COLUMNS)
+        # Bound per-column views so append() does not look them up by name
+        self._time, self._iteration, self._id, self._goal, self._position, self._load, self._speed = \
+            [self._columns[name] for name, dtype in TELEMETRY_COLUMNS]
+
+    def _resize(self, capacity):
+        for column in self._columns.values():
+            column.flush()
+        self._columns = {}
+        self._time = self._iteration = self._id = self._goal = self._position = self._load = self._speed = None
+        for name, dtype in TELEMETRY_COLUMNS:
+            with open(column_path(self.path, name), 'r+b') as column_file:
+                column_file.truncate(capacity * np.dtype(dtype).itemsize)
+        self.capacity = capacity
+
+    def _write_header(self):
+        self.header['count'] = self.count
+        temporary = os.path.join(self.path, HEADER_NAME + '.tmp')
+        with open(temporary, 'w') as header_file:
+            json.dump(self.header, header_file, indent=1)
+        os.replace(temporary, os.path.join(self.path, HEADER_NAME))
+
+    def append(self, iteration, dxl_id, goal_position, present_position, load=0, speed=0, timestamp=None):
+        if self.count == self.capacity:
+            self._resize(self.capacity * 2)
+            self._map()
+        index = self.count
+        self._time[index] = time.monotonic() if timestamp is None else timestamp
+        self._iteration[index] = iteration
+        self._id[index] = dxl_id
+        self._goal[index] = goal_position
+        self._position[index] = present_position
+        self._load[index] = load
+        self._speed[index] = speed
+        self.count = index + 1
+
+    def log(self, line):
+        # Console line; printed right away (BackgroundRecorder prints from its writer thread)
+        self.message(line)
+
+    def append_many(self, records):
+        # RECORD_DTYPE array of records, copied column by column into the mapped files
+        count = len(records)
+        capacity = self.capacity
+        while self.count + count > capacity:
+            capacity *= 2
+        if capacity != self.capacity:
+            self._resize(capacity)
+            self._map()
+        for name, dtype in TELEMETRY_COLUMNS:
+            self._columns[name][self.count:self.count + count] = records[name]
+        self.count += count
+
+    def flush(self):
+        # Write the mapped pages back and record the count, so a reader (or a crash) sees them
+        for column in self._columns.values():
+            column.flush()
+        self._write_header()
+
+    def close(self):
+        if not self._columns:
+            return
+        self.flush()
+        self._resize(self.count)         # Trim the unused preallocation
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_telemetry(path):
+    # {column: read-only array of the records written}, mapped from the column files without copying
+    header = read_header(path)
+    count = header['count']
+    columns = {}
+    for name, dtype in header['columns']:
+        if count == 0:
+            columns[name] = np.zeros(0, dtype=dtype)
+        else:
+            columns[name] = np.memmap(column_path(path, name), dtype=dtype, mode='r', shape=(count,))
+    return columns
+
+
+def export_csv(path, csv_path, full=True):
+    # Write a recording as CSV: every column, or only those of the old per-sample CSV (full=False)
+    return write_csv(read_telemetry(path), csv_path, full)
+
+
+def write_csv(columns, csv_path, full=True):
+    # columns: {column: array} or a RECORD_DTYPE array
+    export = CSV_COLUMNS if full else CSV_COLUMNS[:4]
+    count = len(columns['id'])
+    with open(csv_path, 'w', newline='') as csv_file:
+        writer = csv.writer(csv_file)
+        writer.writerow([title for name, title in export])
+        for start in range(0, count, EXPORT_CHUNK):
+            chunk = [columns[name][start:start + EXPORT_CHUNK].tolist() for name, title in export]
+            writer.writerows(zip(*chunk))
+    return count
+
+
+class CsvRecorder(object):
+    # TelemetryRecorder interface writing the old per-sample CSV rows
+
+    def __init__(self, path, message=print):
+        self.path = path
+        self.message = message
+        self.count = 0
+        self._file = open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(CSV_HEADER)
+
+    def append(self, iteration, dxl_id, goal_position, present_position, load=0, speed=0, timestamp=None):
+        self._writer.writerow([iteration, dxl_id, goal_position, present_position])
+        self.count += 1
+
+    def log(self, line):
+        self.message(line)
+
+    def append_many(self, records):
+        self._writer.writerows(zip(records['iteration'].tolist(), records['id'].tolist(),
+                                   records['goal'].tolist(), records['position'].tolist()))
+        self.count += len(records)
+
+    def flush(self):
+        self._file.flush()
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class BackgroundRecorder(object):
+    # Single-producer ring in front of a recorder. The control loop only writes a ring
+    # slot and moves the head; the writer thread only reads up to the head and moves
+    # the tail, so neither side takes a lock (each index has one writer, and the GIL
+    # makes the int stores atomic).
+
+    def __init__(self, sink, capacity=RING_CAPACITY, log_capacity=LOG_CAPACITY, drain_interval=DRAIN_INTERVAL,
+                 message=None):
+        self.sink = sink
+        self.message = message           # None: lines are written to stdout in batches
+        self.capacity = capacity
+        self.drain_interval = drain_interval
+        self._ring = np.zeros(capacity, dtype=RECORD_DTYPE)
+        self._head = 0                   # Samples appended (next slot to fill)
+        self._tail = 0                   # Samples handed to the sink
+        self._lines = collections.deque()
+        self.log_capacity = log_capacity
+
+        self.dropped = 0                 # Samples not stored because the ring was full
+        self.dropped_lines = 0
+        self.high_water = 0              # Most samples waiting at once
+        self.batches = 0
+        self.error = None                # Exception that stopped the writer thread (e.g. disk full), raised again by flush()/close()
+
+        self._stop = threading.Event()
+        self._flush_request = threading.Event()
+        self._flushed = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='telemetry-writer', daemon=True)
+        self._thread.start()
+
+    # Control loop side
+
+    def append(self, iteration, dxl_id, goal_position, present_position, load=0, speed=0, timestamp=None):
+        head = self._head
+        waiting = head - self._tail
+        if waiting >= self.capacity:
+            self.dropped += 1
+            return False
+        self._ring[head % self.capacity] = (time.monotonic() if timestamp is None else timestamp,
+                                            iteration, dxl_id, goal_position, present_position, load, speed)
+        self._head = head + 1
+        if waiting >= self.high_water:
+            self.high_water = waiting + 1
+        return True
+
+    def log(self, line):
+        # Print a console line from the writer thread
+        if len(self._lines) >= self.log_capacity:
+            self.dropped_lines += 1
+            return
+        self._lines.append(line)
+
+    # Writer thread side
+
+    def _run(self):
+        # A sink error ends the thread; it is kept in self.error for report(), flush() and close()
+        try:
+            self._write_loop()
+        except Exception as error:
+            self.error = error
+            self._flushed.set()
+
+    def _write_loop(self):
+        last_flush = time.monotonic()
+        while True:
+            stopping = self._stop.is_set()
+            requested = self._flush_request.is_set()
+            self._drain()
+            if stopping:
+                break
+            if requested or time.monotonic() - last_flush >= SINK_FLUSH_INTERVAL:
+                self.sink.flush()
+                last_flush = time.monotonic()
+                if requested:
+                    self._flush_request.clear()
+                    self._flushed.set()
+            self._stop.wait(self.drain_interval)
+
+    def _drain(self):
+        head = self._head
+        tail = self._tail
+        while tail < head:
+            start = tail % self.capacity
+            end = min(start + head - tail, self.capacity)     # Up to the head or the end of the ring
+            self.sink.append_many(self._ring[start:end])
+            self.batches += 1
+            tail += end - start
+            self._tail = tail
+
+        if self._lines:
+            lines = []
+            while self._lines:
+                lines.append(self._lines.popleft())
+            if self.message is not None:
+                for line in lines:
+                    self.message(line)
+                return
+            sys.stdout.write('\n'.join(lines) + '\n')
+            sys.stdout.flush()
+
+    def flush(self):
+        # Wait until the writer thread has passed the samples appended so far to the sink and
+        # flushed it (the sink is only ever used from that thread)
+        self._flushed.clear()
+        self._flush_request.set()
+        while not self._flushed.wait(self.drain_interval) and self._thread.is_alive():
+            pass
+        self._raise_error()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.sink.close()
+        finally:
+            self._raise_error()
+
+    def _raise_error(self):
+        if self.error is not None:
+            raise self.error
+
+    def stats(self):
+        return {
+            'appended': self._head,
+            'written': self._tail,
+            'waiting': self._head - self._tail,
+            'dropped': self.dropped,
+            'dropped_lines': self.dropped_lines,
+            'high_water': self.high_water,
+            'capacity': self.capacity,
+            'batches': self.batches,
+            'error': None if self.error is None else repr(self.error),
+        }
+
+    def report(self):
+        stats = self.stats()
+        line = ("%d samples written in %d batches, %d waiting, %d dropped (ring peak %d of %d), %d console lines dropped"
+                % (stats['written'], stats['batches'], stats['waiting'], stats['dropped'], stats['high_water'],
+                   stats['capacity'], stats['dropped_lines']))
+        if self.error is not None:
+            line += ", writer stopped by %s" % stats['error']
+        return line
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export a telemetry recording to CSV")
+    parser.add_argument('recording', help="telemetry directory")
+    parser.add_argument('csv', help="CSV file to write")
+    parser.add_argument('--short', action='store_true', help="only the iteration, ID, goal and present position columns")
+    args = parser.parse_args(argv)
+
+    count = export_csv(args.recording, args.csv, not args.short)
+    print("%d records written to %s" % (count, args.csv))
+
+
+if __name__ == "__main__":
+    main()
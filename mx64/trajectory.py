@@ -0,0 +1,87 @@
+# Precompiled goal-position trajectories
+#
+# A sweep plan that is known before motion starts is turned into one contiguous
+# buffer of ready-to-send SyncWrite instruction packets (header, IDs, goal bytes
+# and checksum all filled in), one fixed-length frame per step. Playback with
+# bus.send_step(trajectory, step) writes a prebuilt slice of that buffer, so the
+# control loop does no parameter packing, checksumming or allocation per tick.
+#
+#   trajectory = compile_trajectory(DXL_IDS, goal_rows)   # goal_rows[step][motor]
+#   for step in range(len(trajectory)):
+#       bus.send_step(trajectory, step)
+
+import functools
+
+import numpy as np
+from dynamixel_sdk import BROADCAST_ID, INST_SYNC_WRITE
+
+from .control_table import *
+
+SYNC_WRITE_HEADER_LENGTH = 7             # FF FF ID LENGTH INSTRUCTION START_ADDRESS DATA_LENGTH
+
+
+class Trajectory(object):
+    # goals: (steps, motors) array of goal positions, column order = dxl_ids
+    # frames: (steps, frame_length) uint8 array of SyncWrite packets, C-contiguous
+
+    def __init__(self, dxl_ids, goals, frames):
+        self.dxl_ids = list(dxl_ids)
+        self.goals = goals
+        self.frames = frames
+        self.frame_length = frames.shape[1]
+        # One memoryview per step, made here so playback only indexes a list
+        buffer = memoryview(frames.reshape(-1))
+        self._views = [buffer[step * self.frame_length:(step + 1) * self.frame_length]
+                       for step in range(len(frames))]
+        self._parts = {}
+
+    def __len__(self):
+        return len(self._views)
+
+    def frame(self, step):
+        return self._views[step]
+
+    def goal_positions(self, step):
+        return dict(zip(self.dxl_ids, self.goals[step].tolist()))
+
+    def part(self, dxl_ids):
+        # Trajectory of a subset of the motors (one per serial port for ShardedBus), compiled once
+        dxl_ids = tuple(dxl_ids)
+        if dxl_ids not in self._parts:
+            columns = [self.dxl_ids.index(dxl_id) for dxl_id in dxl_ids]
+            self._parts[dxl_ids] = compile_trajectory(dxl_ids, self.goals[:, columns])
+        return self._parts[dxl_ids]
+
+
+def compile_trajectory(dxl_ids, goal_rows):
+    # goal_rows: one row of goal positions per step, in dxl_ids order
+    goals = np.asarray(goal_rows, dtype=np.int64).reshape(-1, len(dxl_ids))
+    if goals.min(initial=0) < 0 or goals.max(initial=0) > DXL_MAX_POSITION:
+        raise ValueError("Goal positions must be within 0-%d" % DXL_MAX_POSITION)
+
+    steps, motors = goals.shape
+    block = 1 + LEN_MX_GOAL_POSITION
+    frame_length = SYNC_WRITE_HEADER_LENGTH + block * motors + 1
+    frames = np.zeros((steps, frame_length), dtype=np.uint8)
+
+    frames[:, 0] = 0xFF
+    frames[:, 1] = 0xFF
+    frames[:, 2] = BROADCAST_ID
+    frames[:, 3] = block * motors + 4
+    frames[:, 4] = INST_SYNC_WRITE
+    frames[:, 5] = ADDR_MX_GOAL_POSITION
+    frames[:, 6] = LEN_MX_GOAL_POSITION
+    params = frames[:, SYNC_WRITE_HEADER_LENGTH:-1].reshape(steps, motors, block)
+    params[:, :, 0] = dxl_ids
+    params[:, :, 1] = goals & 0xFF
+    params[:, :, 2] = goals >> 8
+    frames[:, -1] = ~(frames[:, 2:-1].sum(axis=1, dtype=np.int64)) & 0xFF
+
+    return Trajectory(dxl_ids, goals, frames)
+
+
+@functools.lru_cache(maxsize=None)
+def compile_sweep(dxl_id, start_position, end_position, step_size):
+    # One motor stepping from start to end inclusive, the goal sequence of move_motor()
+    stop = end_position + (1 if step_size > 0 else -1)
+    return compile_trajectory([dxl_id], [[goal_position] for goal_position in range(start_position, stop, step_size)])